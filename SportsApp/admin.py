@@ -1,10 +1,11 @@
 from django.conf.urls import url
 from django.contrib import admin
 from django.db.models import Sum, Count
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.template.response import TemplateResponse
 from django.urls import reverse
 from django.utils.html import format_html
+from . import ingest, profiler, standings, writer
 from .forms import AddEventForm
 from .models import *
 from datetime import datetime, timedelta
@@ -22,6 +23,12 @@ class MatchStatsInline(admin.StackedInline):
     model = MatchStats
 
 
+class MatchLineupInline(admin.TabularInline):
+    model = MatchLineup
+    fields = ('side', 'role', 'order', 'shirt_number', 'team_position')
+    autocomplete_fields = ('team_position',)
+
+
 class TypeFilter(admin.SimpleListFilter):
     title = 'type'
     parameter_name = 'type'
@@ -35,9 +42,9 @@ class TypeFilter(admin.SimpleListFilter):
     def queryset(self, request, queryset):
         value = self.value()
         if value == 'Football':
-            return queryset.filter(type='فوتبال')
+            return queryset.filter(type=FOOTBALL)
         elif value == 'Basketball':
-            return queryset.exclude(type='فوتبال')
+            return queryset.filter(type=BASKETBALL)
         return queryset
 
 
@@ -60,7 +67,7 @@ class MatchOngoingFilter(admin.SimpleListFilter):
 class MatchAdmin(admin.ModelAdmin):
     list_display = ['name', 'increase_score_one', 'team1_name', 'score1', 'score2', 'team2_name', 'increase_score_two',
                     'event_actions']
-    inlines = [MatchEventInline, MatchStatsInline]
+    inlines = [MatchLineupInline, MatchEventInline, MatchStatsInline]
     list_filter = [TypeFilter, MatchOngoingFilter, 'date']
     search_fields = ['team1_name', 'team2_name']
 
@@ -140,7 +147,7 @@ class MatchAdmin(admin.ModelAdmin):
             if form.is_valid():
                 event = form.save(commit=False)
                 event.match = match
-                event.save()
+                writer.run(event.save)
                 self.message_user(request, 'Event Added Successfuly')
                 return HttpResponseRedirect('/admin/SportsApp/match')
 
@@ -156,7 +163,7 @@ class MatchAdmin(admin.ModelAdmin):
         )
 
     def increase_score_one(self, obj):
-        if obj.type == 'بسکتبال':
+        if obj.type == BASKETBALL:
             return format_html(
                 '<a class="button" href="{}">Add 1</a>&nbsp;'
                 '<a class="button" href="{}">Add 2</a>&nbsp;'
@@ -165,7 +172,7 @@ class MatchAdmin(admin.ModelAdmin):
                 reverse('admin:add_scoreOne_two', args=[obj.pk]),
                 reverse('admin:add_scoreOne_three', args=[obj.pk])
             )
-        elif obj.type == 'فوتبال':
+        elif obj.type == FOOTBALL:
             return format_html(
                 '<a class="button" href="{}">Add 1</a>&nbsp;',
                 reverse('admin:add_scoreOne_one', args=[obj.pk]),
@@ -175,7 +182,7 @@ class MatchAdmin(admin.ModelAdmin):
     increase_score_one.allow_tags = True
 
     def increase_score_two(self, obj):
-        if obj.type == 'بسکتبال':
+        if obj.type == BASKETBALL:
             return format_html(
                 '<a class="button" href="{}">Add 1</a>&nbsp;'
                 '<a class="button" href="{}">Add 2</a>&nbsp;'
@@ -184,7 +191,7 @@ class MatchAdmin(admin.ModelAdmin):
                 reverse('admin:add_scoreTwo_two', args=[obj.pk]),
                 reverse('admin:add_scoreTwo_three', args=[obj.pk])
             )
-        elif obj.type == 'فوتبال':
+        elif obj.type == FOOTBALL:
             return format_html(
                 '<a class="button" href="{}">Add 1</a>&nbsp;',
                 reverse('admin:add_scoreTwo_one', args=[obj.pk]),
@@ -235,21 +242,19 @@ class MatchAdmin(admin.ModelAdmin):
             action_title='Add Three ScoreTwo',
         )
 
+    SCORE_ACTIONS = {
+        'Add One ScoreOne': (1, 0),
+        'Add Two ScoreOne': (2, 0),
+        'Add Three ScoreOne': (3, 0),
+        'Add One ScoreTwo': (0, 1),
+        'Add Two ScoreTwo': (0, 2),
+        'Add Three ScoreTwo': (0, 3),
+    }
+
     def process_action_add(self, request, match_id, action_title):
         match = self.get_object(request, match_id)
-        if action_title == 'Add One ScoreOne':
-            match.score1 += 1
-        if action_title == 'Add Two ScoreOne':
-            match.score1 += 2
-        if action_title == 'Add Three ScoreOne':
-            match.score1 += 3
-        if action_title == 'Add One ScoreTwo':
-            match.score2 += 1
-        if action_title == 'Add Two ScoreTwo':
-            match.score2 += 2
-        if action_title == 'Add Three ScoreTwo':
-            match.score2 += 3
-        match.save()
+        score1, score2 = self.SCORE_ACTIONS[action_title]
+        writer.run(ingest.add_score, match.pk, score1, score2)
         return HttpResponseRedirect('/admin/SportsApp/match')
 
 
@@ -313,14 +318,27 @@ class PlayerStatsAdmin(admin.ModelAdmin):
 
     def process_action(self, request, player_stat_id, action_title):
         player_stat = self.get_object(request, player_stat_id)
-        player_stat.value += 1
-        player_stat.save()
+        writer.run(ingest.add_player_stat, player_stat.pk)
         return HttpResponseRedirect('/admin/SportsApp/playerstat')
 
 
 class LeagueAdmin(admin.ModelAdmin):
     list_display = ['name', 'type', 'is_ongoing', 'start_date']
     list_filter = ['start_date', 'is_ongoing']
+    actions = ['rebuild_standings']
+
+    def rebuild_standings(self, request, queryset):
+        for league in queryset:
+            standings.rebuild_league(league.pk)
+        self.message_user(request, 'Standings Rebuilt Successfuly')
+
+    rebuild_standings.short_description = 'Rebuild standings from matches'
+
+
+class LeagueStandingAdmin(admin.ModelAdmin):
+    list_display = ['team', 'league', 'played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'score']
+    list_filter = ['league']
+    readonly_fields = ['played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against', 'score']
 
 
 class PlayerStatsInline(admin.TabularInline):
@@ -395,11 +413,9 @@ class MatchStatAdmin(admin.ModelAdmin):
     def process_action(self, request, match_stat_id, action_title):
         match_stat = self.get_object(request, match_stat_id)
         if action_title == 'Add First':
-            match_stat.first += 1
-            match_stat.save()
+            writer.run(ingest.add_match_stat, match_stat.pk, first=1)
         elif action_title == 'Add Second':
-            match_stat.second += 1
-            match_stat.save()
+            writer.run(ingest.add_match_stat, match_stat.pk, second=1)
         return HttpResponseRedirect('/admin/SportsApp/matchstats')
 
 
@@ -433,6 +449,87 @@ class MatchEventAdmin(admin.ModelAdmin):
     list_display = ['match', 'title', 'comment', 'time']
     list_filter = ['time']
 
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created', 'method', 'path', 'status', 'duration_ms', 'queries', 'user', 'profile_actions']
+    list_filter = ['method', 'status']
+    search_fields = ['path']
+    fields = ['created', 'user', 'method', 'path', 'status', 'duration_ms', 'queries', 'summary_table']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            url(
+                r'^(?P<profile_id>.+)/flamegraph/$',
+                self.admin_site.admin_view(self.flamegraph),
+                name='profile_flamegraph',
+            ),
+            url(
+                r'^(?P<profile_id>.+)/folded/$',
+                self.admin_site.admin_view(self.folded),
+                name='profile_folded',
+            ),
+        ]
+        return custom_urls + urls
+
+    def profile_actions(self, obj):
+        return format_html(
+            '<a class="button" href="{}">Flame Graph</a>&nbsp;'
+            '<a class="button" href="{}">Folded Stacks</a>',
+            reverse('admin:profile_flamegraph', args=[obj.pk]),
+            reverse('admin:profile_folded', args=[obj.pk]),
+        )
+
+    profile_actions.short_description = 'Profile'
+
+    def summary_table(self, obj):
+        return format_html('<pre>{}</pre>', obj.summary)
+
+    summary_table.short_description = 'Summary'
+
+    def get_profile(self, request, profile_id):
+        # Profiles past PROFILE_KEEP are deleted, old links may point at them.
+        profile = self.get_object(request, profile_id)
+        if profile is None:
+            raise Http404('Request profile %s does not exist.' % profile_id)
+        return profile
+
+    def flamegraph(self, request, profile_id, *args, **kwargs):
+        profile = self.get_profile(request, profile_id)
+        context = self.admin_site.each_context(request)
+        context['opts'] = self.model._meta
+        context['profile'] = profile
+        context['title'] = str(profile)
+        context['rows'] = [
+            [(name, left * 100, width * 100) for name, left, width in row]
+            for row in profiler.flame_rows(profile.stacks)
+        ]
+        return TemplateResponse(
+            request,
+            'admin/profile/flamegraph.html',
+            context,
+        )
+
+    def folded(self, request, profile_id, *args, **kwargs):
+        # flamegraph.pl and speedscope read this format.
+        profile = self.get_profile(request, profile_id)
+        response = HttpResponse(profile.stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="profile-%d.folded"' % profile.pk
+        return response
+
+
+class ArchivedLeagueAdmin(admin.ModelAdmin):
+    list_display = ['name', 'season', 'league_id', 'archived']
+    list_filter = ['season']
+    readonly_fields = ['league_id', 'name', 'season', 'archived']
+
+    def has_add_permission(self, request):
+        return False
+
 admin.site.register(Tag)
 admin.site.register(NewsArticle, NewsArticleAdmin)
 admin.site.register(Comment)
@@ -450,4 +547,8 @@ admin.site.register(PlayerSeason, PlayerSeasonAdmin)
 admin.site.register(PlayerStat, PlayerStatsAdmin)
 admin.site.register(MatchImages)
 admin.site.register(MatchVideos)
-admin.site.register(LeagueStanding)
+admin.site.register(LeagueStanding, LeagueStandingAdmin)
+admin.site.register(IngestSequence)
+admin.site.register(ImportProgress)
+admin.site.register(RequestProfile, RequestProfileAdmin)
+admin.site.register(ArchivedLeague, ArchivedLeagueAdmin)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SportsappConfig(AppConfig):
     name = 'SportsApp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,233 @@
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+
+from . import versions
+from .models import *
+
+# What manage.py archive_season copies to the archive database: a finished
+# league with everything its league and match pages show. Teams, players
+# and their positions stay in the default database too, the archive holds a
+# copy of them as they were when the league was archived.
+ARCHIVED_MODELS = (
+    League, LeagueStanding, Team, Team.leagues.through, TeamPosition, Player,
+    Match, MatchLineup, MatchEvent, MatchStats, MatchImages, MatchVideos,
+)
+ARCHIVED_MODEL_NAMES = {model._meta.model_name for model in ARCHIVED_MODELS}
+
+REGISTRY_KEY = 'archive:leagues'
+
+_local = threading.local()
+
+
+def database():
+    """Alias of the archive database, None when there is none."""
+    alias = getattr(settings, 'ARCHIVE_DATABASE', 'archive')
+    return alias if alias in settings.DATABASES else None
+
+
+def get_cache():
+    return caches[getattr(settings, 'VERSION_CACHE', 'default')]
+
+
+def archived():
+    """
+    (league ids, seasons) served by the archive database, as strings like
+    the query parameters they are matched against. A season counts once
+    none of its leagues is left in the default database.
+    """
+    registry = get_cache().get(REGISTRY_KEY)
+    if registry is None:
+        leagues = dict(ArchivedLeague.objects.values_list('league_id', 'season'))
+        seasons = set(leagues.values())
+        if seasons:
+            seasons -= {day.year for day in League.objects.dates('start_date', 'year')}
+        registry = ({str(pk) for pk in leagues}, {str(season) for season in seasons})
+        get_cache().set(REGISTRY_KEY, registry, None)
+    return registry
+
+
+def forget():
+    get_cache().delete(REGISTRY_KEY)
+
+
+def is_reading():
+    return getattr(_local, 'reading', False)
+
+
+@contextmanager
+def reading(archive=True):
+    """Route the reads of ARCHIVED_MODELS in this thread to the archive."""
+    previous = is_reading()
+    _local.reading = previous or (archive and database() is not None)
+    try:
+        yield
+    finally:
+        _local.reading = previous
+
+
+def requested(request, league=None):
+    """Whether `request` asks for an archived league or season."""
+    if database() is None:
+        return False
+    leagues, seasons = archived()
+    if not leagues:
+        return False
+    league = league if league is not None else request.GET.get('league')
+    return str(league) in leagues or request.GET.get('season') in seasons
+
+
+def databases_for(leagues=None, seasons=None):
+    """
+    Databases that may hold matches of `leagues` and `seasons`, every
+    database for no filter. A season can be split between the two when only
+    some of its leagues are archived.
+    """
+    if database() is None:
+        return ['default']
+    archived_leagues, archived_seasons = archived()
+    if not archived_leagues:
+        return ['default']
+    leagues = {str(league) for league in leagues or ()}
+    seasons = {str(season) for season in seasons or ()}
+    databases = []
+    if not leagues or leagues & archived_leagues:
+        databases.append(database())
+    if not (leagues and leagues <= archived_leagues) and not (seasons and seasons <= archived_seasons):
+        databases.append('default')
+    return databases
+
+
+def league_rows(league):
+    """Querysets of the rows archive_league copies for `league`."""
+    matches = Match.objects.filter(league=league)
+    lineups = MatchLineup.objects.filter(match__league=league)
+    positions = TeamPosition.objects.filter(pk__in=lineups.values('team_position'))
+    teams = Team.objects.filter(Q(pk__in=matches.values('team1')) | Q(pk__in=matches.values('team2')) |
+                                Q(pk__in=league.standings.values('team')) | Q(pk__in=positions.values('team')) |
+                                Q(leagues=league)).distinct()
+    return [
+        League.objects.filter(pk=league.pk),
+        league.standings.all(),
+        teams,
+        Team.leagues.through.objects.filter(league=league),
+        positions,
+        Player.objects.filter(pk__in=positions.values('player')),
+        matches,
+        lineups,
+        MatchEvent.objects.filter(match__league=league),
+        MatchStats.objects.filter(match__league=league),
+        MatchImages.objects.filter(match__league=league),
+        MatchVideos.objects.filter(match__league=league),
+    ]
+
+
+def copy_rows(queryset, using, chunk_size=500):
+    """
+    Copy the rows of `queryset` to the `using` database with their ids.
+    Rows already there, a team archived with an earlier season, are updated.
+    """
+    model = queryset.model
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    rows = queryset.order_by('pk').iterator(chunk_size=chunk_size)
+    copied = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return copied
+        existing = set(model._base_manager.using(using).filter(pk__in=[row.pk for row in chunk])
+                       .values_list('pk', flat=True))
+        model._base_manager.using(using).bulk_create([row for row in chunk if row.pk not in existing])
+        model._base_manager.using(using).bulk_update([row for row in chunk if row.pk in existing], fields)
+        copied += len(chunk)
+
+
+def archive_league(league, chunk_size=500):
+    """
+    Move a finished league and its matches to the archive database, return
+    the number of rows copied per model. The copy is committed before
+    anything is deleted, so a failed run leaves the league in the default
+    database and running it again updates the copy.
+    """
+    counts = {}
+    with transaction.atomic(using=database()):
+        for queryset in league_rows(league):
+            counts[queryset.model._meta.model_name] = copy_rows(queryset, database(), chunk_size)
+
+    teams = list(league.team_set.values_list('pk', flat=True))
+    with transaction.atomic():
+        ArchivedLeague.objects.update_or_create(league_id=league.pk, defaults={
+            'name': league.name, 'season': league.start_date.year})
+        # Matches go in chunks to keep the deletion's collector small, their
+        # events, stats, lineups, media and feed rows cascade with them.
+        matches = Match.objects.filter(league=league).order_by('pk').values_list('pk', flat=True)
+        while True:
+            chunk = list(matches[:chunk_size])
+            if not chunk:
+                break
+            Match.objects.filter(pk__in=chunk).delete()
+        League.objects.filter(pk=league.pk).delete()
+        versions.bump('team', *teams)
+    return counts
+
+
+class ArchiveRouter(object):
+    """
+    Everything lives in the default database except what archive_season
+    moved. Reads go to the archive inside reading(), and objects loaded
+    from the archive load their relations from there too.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if is_reading() and model in ARCHIVED_MODELS:
+            return database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Archived rows keep their ids, so the archive copy of a team is the
+        # same team as the one in the default database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == database():
+            return app_label == 'SportsApp' and model_name in ARCHIVED_MODEL_NAMES
+        return None
+
+
+class ArchiveMixin(object):
+    """
+    Serves requests for an archived league (`archive_league_kwarg` or
+    ?league=) or season (?season=) from the archive database. A detail
+    request for an object the default database does not have is retried
+    on the archive once any league has been archived.
+    """
+    archive_league_kwarg = None
+
+    def dispatch(self, request, *args, **kwargs):
+        league = kwargs.get(self.archive_league_kwarg) if self.archive_league_kwarg else None
+        with reading(requested(request, league)):
+            return super().dispatch(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if is_reading() or database() is None or not archived()[0]:
+                raise
+        with reading():
+            return super().retrieve(request, *args, **kwargs)
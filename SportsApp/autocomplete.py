@@ -0,0 +1,96 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .models import League, Player, Team
+from .search import normalize
+
+SOURCES = {
+    'team': Team,
+    'player': Player,
+    'league': League,
+}
+
+
+def _keys(name):
+    # One key per word start, so "رئال مادرید" is found by "ماد" as well.
+    words = normalize(name).split()
+    return {' '.join(words[index:]) for index in range(len(words))}
+
+
+class PrefixIndex(object):
+    """
+    Sorted (key, kind, pk, name) tuples searched with bisect. Loaded lazily
+    per process, kept current by model signals and fully reloaded every
+    `AUTOCOMPLETE_REFRESH_SECONDS` to pick up writes made by other workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = []
+        self.objects = {}
+        self.loaded_at = None
+
+    def _insert(self, kind, pk, name):
+        entries = [(key, kind, pk, name) for key in _keys(name)]
+        for entry in entries:
+            insort(self.entries, entry)
+        self.objects[(kind, pk)] = entries
+
+    def _remove(self, kind, pk):
+        for entry in self.objects.pop((kind, pk), ()):
+            index = bisect_left(self.entries, entry)
+            if index < len(self.entries) and self.entries[index] == entry:
+                del self.entries[index]
+
+    def load(self):
+        objects = {}
+        entries = []
+        for kind, model in SOURCES.items():
+            for pk, name in model.objects.values_list('pk', 'name').iterator():
+                objects[(kind, pk)] = [(key, kind, pk, name) for key in _keys(name)]
+                entries += objects[(kind, pk)]
+        entries.sort()
+        with self.lock:
+            self.entries, self.objects = entries, objects
+            self.loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        refresh = getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 300)
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > refresh:
+            self.load()
+
+    def update(self, kind, pk, name):
+        with self.lock:
+            if self.loaded_at is not None:
+                self._remove(kind, pk)
+                self._insert(kind, pk, name)
+
+    def remove(self, kind, pk):
+        with self.lock:
+            if self.loaded_at is not None:
+                self._remove(kind, pk)
+
+    def lookup(self, prefix, kinds=None, limit=10):
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        results, seen = [], set()
+        with self.lock:
+            index = bisect_left(self.entries, (prefix,))
+            while index < len(self.entries) and len(results) < limit:
+                key, kind, pk, name = self.entries[index]
+                if not key.startswith(prefix):
+                    break
+                index += 1
+                if (kind, pk) in seen or (kinds and kind not in kinds):
+                    continue
+                seen.add((kind, pk))
+                results.append({'type': kind, 'id': pk, 'name': name})
+        return results
+
+
+index = PrefixIndex()
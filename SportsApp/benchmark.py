@@ -0,0 +1,257 @@
+import math
+import multiprocessing
+import platform
+import random
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import ingest, responsecache, writer
+from .models import *
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def endpoints():
+    """(name, url, needs login) of every router endpoint and TeamMatchList, on existing rows."""
+    first = {model: model.objects.order_by('pk').values_list('pk', flat=True).first()
+             for model in (NewsArticle, Team, Player, League, Match)}
+    team_slug = Team.objects.order_by('pk').values_list('slug', flat=True).first()
+    season = PlayerSeason.objects.values_list('season', flat=True).first()
+    stat = PlayerStat.objects.values_list('name', flat=True).first()
+    urls = [
+        ('news-list', '/api/news/', False),
+        ('news-detail', '/api/news/%s/' % first[NewsArticle], False),
+        ('news-search', '/api/news/?search=%D8%A8%D8%A7%D8%B2%DB%8C', False),
+        ('news-comments', '/api/news/%s/comments/' % first[NewsArticle], False),
+        ('comments-list', '/api/comments/', False),
+        ('teams-list', '/api/teams/', False),
+        ('teams-detail', '/api/teams/%s/' % first[Team], False),
+        ('players-list', '/api/players/', False),
+        ('players-detail', '/api/players/%s/' % first[Player], False),
+        ('matches-list', '/api/matches/', False),
+        ('team-matches', '/api/matches/%s/' % team_slug, False),
+        ('leagues-list', '/api/leagues/', False),
+        ('leagues-detail', '/api/leagues/%s/' % first[League], False),
+        ('leaderboard', '/api/leaderboard/?season=%s&stat=%s' % (season, stat), False),
+        ('autocomplete', '/api/autocomplete/?q=%D8%B3', False),
+        ('user-teams', '/api/user_teams/', True),
+        ('user-players', '/api/user_players/', True),
+        ('feed', '/api/feed/', True),
+    ]
+    return [(name, url, login) for name, url, login in urls if 'None' not in url]
+
+
+def measure(client, url, cached=False):
+    if not cached:
+        responsecache.get_cache().clear()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url)
+        content = response.content
+        elapsed = time.perf_counter() - started
+    return response.status_code, elapsed, len(queries.captured_queries), len(content)
+
+
+def peak_memory(client, url, cached=False):
+    if not cached:
+        responsecache.get_cache().clear()
+    tracemalloc.start()
+    try:
+        client.get(url).content
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(iterations=20, warmup=2, cached=False, only=None, log=None):
+    """
+    Request every endpoint `warmup` + `iterations` times with the test
+    client. Latency and query counts come from the timed iterations, peak
+    memory from one extra request with tracemalloc on, so its overhead does
+    not skew the latencies.
+    """
+    log = log or (lambda message: None)
+    anonymous = Client()
+    user = User.objects.filter(userfollowteam__isnull=False).order_by('pk').first()
+    member = Client()
+    if user is not None:
+        member.force_login(user)
+
+    results = {}
+    for name, url, login in endpoints():
+        if only and name not in only:
+            continue
+        if login and user is None:
+            continue
+        client = member if login else anonymous
+        for _ in range(warmup):
+            measure(client, url, cached)
+        samples = [measure(client, url, cached) for _ in range(iterations)]
+        latencies = [elapsed * 1000 for status, elapsed, queries, size in samples]
+        results[name] = {
+            'url': url,
+            'status': samples[-1][0],
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries': max(queries for status, elapsed, queries, size in samples),
+            'response_bytes': samples[-1][3],
+            'peak_memory_kb': round(peak_memory(client, url, cached) / 1024, 1),
+        }
+        log('%-16s p50 %8.2fms  p95 %8.2fms  %4d queries  %8.1fkB peak' % (
+            name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['queries'],
+            results[name]['peak_memory_kb']))
+    return {
+        'commit': git_commit(),
+        'date': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'iterations': iterations,
+        'cached': cached,
+        'rows': {model.__name__: model.objects.count() for model in (League, Team, Player, Match, NewsArticle, User)},
+        'endpoints': results,
+    }
+
+
+def _read_loop(index, urls, deadline, results):
+    # Runs in a forked reader process, like one more WSGI worker.
+    client = Client()
+    latencies, errors = [], {}
+    count = 0
+    while time.monotonic() < deadline:
+        url = urls[count % len(urls)]
+        count += 1
+        started = time.perf_counter()
+        try:
+            status = client.get('%s%s_r=%d.%d' % (url, '&' if '?' in url else '?', index, count)).status_code
+            error = None if status == 200 else 'read: HTTP %d' % status
+        except Exception as exception:
+            error = 'read: %s' % exception
+        latencies.append(time.perf_counter() - started)
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    connection.close()
+    results.put((latencies, errors))
+
+
+def concurrency(readers=4, writers=2, seconds=10, write_interval=0.05, queued=True, log=None):
+    """
+    Reader throughput while writers add goals to random matches. Readers
+    are forked processes cycling through the anonymous endpoints with a
+    throwaway query parameter, so every request misses the response cache
+    and reaches the database. Writers are threads of this process calling
+    ingest.add_score through the write queue, or each in its own
+    transaction when `queued` is False.
+    """
+    log = log or (lambda message: None)
+    urls = [url for name, url, login in endpoints() if not login]
+    match_ids = list(Match.objects.values_list('pk', flat=True)[:100])
+    journal_mode = None
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            journal_mode = cursor.execute('PRAGMA journal_mode').fetchone()[0]
+    # Forked processes must not share the parent's connection.
+    connection.close()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.monotonic() + seconds
+    processes = [context.Process(target=_read_loop, args=(index, urls, deadline, results))
+                 for index in range(readers)]
+    for process in processes:
+        process.start()
+
+    writes, errors = [], {}
+    lock = threading.Lock()
+
+    def write(index):
+        chooser = random.Random(index)
+        try:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    if queued:
+                        writer.run(ingest.add_score, chooser.choice(match_ids), 1, 0)
+                    else:
+                        with transaction.atomic():
+                            ingest.add_score(chooser.choice(match_ids), 1, 0)
+                    error = None
+                except Exception as exception:
+                    error = 'write: %s' % exception
+                with lock:
+                    writes.append(time.perf_counter() - started)
+                    if error is not None:
+                        errors[error] = errors.get(error, 0) + 1
+                time.sleep(write_interval)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(writers if match_ids else 0)]
+    for thread in threads:
+        thread.start()
+    reads = []
+    for process in processes:
+        latencies, read_errors = results.get()
+        reads += latencies
+        for error, count in read_errors.items():
+            errors[error] = errors.get(error, 0) + count
+    for process in processes:
+        process.join()
+    for thread in threads:
+        thread.join()
+
+    result = {
+        'readers': readers,
+        'writers': len(threads),
+        'seconds': seconds,
+        'queued': queued,
+        'journal_mode': journal_mode,
+        'reads_per_second': round(len(reads) / seconds, 1),
+        'read_p50_ms': round(percentile(reads, 0.5) * 1000, 3) if reads else None,
+        'read_p95_ms': round(percentile(reads, 0.95) * 1000, 3) if reads else None,
+        'writes_per_second': round(len(writes) / seconds, 1),
+        'write_p95_ms': round(percentile(writes, 0.95) * 1000, 3) if writes else None,
+        'errors': errors,
+    }
+    log('%(reads_per_second)8.1f reads/s  p50 %(read_p50_ms)8.2fms  p95 %(read_p95_ms)8.2fms  '
+        '%(writes_per_second)6.1f writes/s  p95 %(write_p95_ms)s ms' % result)
+    for error, count in sorted(errors.items()):
+        log('%6d x %s' % (count, error))
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold=1.2):
+    """Endpoints whose p95 latency grew by more than `threshold` times, or that run more queries."""
+    regressions = []
+    for name, result in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * threshold:
+            regressions.append('%s: p95 %.2fms -> %.2fms' % (name, before['p95_ms'], result['p95_ms']))
+        if result['queries'] > before['queries']:
+            regressions.append('%s: %d -> %d queries' % (name, before['queries'], result['queries']))
+    return regressions
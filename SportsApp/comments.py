@@ -0,0 +1,55 @@
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import versions
+from .models import Comment, NewsArticle
+from .serializers import CommentSerializer
+
+
+def refresh_latest(article_ids):
+    limit = getattr(settings, 'LATEST_COMMENTS', 3)
+    for article_id in set(article_ids):
+        latest = Comment.objects.filter(article_id=article_id).select_related('user')[:limit]
+        NewsArticle.objects.filter(pk=article_id).update(
+            latest_comments=json.dumps(CommentSerializer(latest, many=True).data, ensure_ascii=False))
+
+
+def recount():
+    """Set comment_count and latest_comments of every article from its comments."""
+    counts = Comment.objects.filter(article=OuterRef('pk')).order_by().values('article').annotate(
+        count=Count('pk')).values('count')
+    NewsArticle.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+    refresh_latest(Comment.objects.order_by().values_list('article_id', flat=True).distinct())
+
+
+def comment_added(article_id, count=1):
+    NewsArticle.objects.filter(pk=article_id).update(comment_count=F('comment_count') + count)
+    refresh_latest([article_id])
+
+
+def comment_removed(article_id):
+    NewsArticle.objects.filter(pk=article_id).update(comment_count=F('comment_count') - 1)
+    refresh_latest([article_id])
+
+
+def add_comments(user, items):
+    """
+    Insert a batch of comments given as dicts with `article`, `name` and
+    `text`. One INSERT for the batch and one counter update per article, so
+    a burst of comments does not hold the write lock per comment.
+    """
+    with transaction.atomic():
+        comments = Comment.objects.bulk_create([
+            Comment(user=user, article_id=item['article'], name=item['name'], text=item['text']) for item in items
+        ])
+        counts = {}
+        for comment in comments:
+            counts[comment.article_id] = counts.get(comment.article_id, 0) + 1
+        for article_id, count in counts.items():
+            comment_added(article_id, count)
+        versions.bump('news', *counts)
+    return comments
@@ -0,0 +1,54 @@
+import zlib
+from itertools import islice
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import archive
+from .models import Match
+from .queries import apply_fetch_plan
+from .serializers import MatchSerializer
+
+
+def season_matches(leagues=None, seasons=None):
+    """Querysets of the matches of `leagues` and `seasons`, one per database holding some."""
+    querysets = []
+    for using in archive.databases_for(leagues, seasons):
+        queryset = Match.objects.using(using).order_by('league_id', 'date', 'pk')
+        if leagues:
+            queryset = queryset.filter(league_id__in=leagues)
+        if seasons:
+            queryset = queryset.filter(league__start_date__year__in=seasons)
+        querysets.append(queryset)
+    return querysets
+
+
+def export_matches(querysets, chunk_size=500):
+    """
+    Yield every match of `querysets` as one NDJSON line (bytes). Match ids
+    are streamed with iterator(chunk_size), each chunk of ids is loaded with
+    MatchSerializer's fetch plan and dropped before the next, so memory
+    does not grow with the size of the export.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    for queryset in querysets:
+        ids = queryset.values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(ids, chunk_size))
+            if not chunk:
+                break
+            matches = apply_fetch_plan(Match.objects.using(queryset.db).filter(pk__in=chunk),
+                                       MatchSerializer).in_bulk()
+            lines = []
+            for pk in chunk:
+                if pk in matches:
+                    lines.append(encoder.encode(MatchSerializer(matches[pk]).data).encode() + b'\n')
+            yield b''.join(lines)
+
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+from .models import FeedItem, Player, Team, UserFollowPlayer, UserFollowTeam
+
+
+def fan_out(kind, date, teams=(), players=(), **targets):
+    """
+    Write a feed item for the followers of `teams` and `players`. Teams and
+    players with more than `FEED_FANOUT_LIMIT` followers get a single shared
+    row instead, which `user_feed` merges in when the feed is read.
+    """
+    limit = getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+    sources = {'team': (UserFollowTeam, set(teams)), 'player': (UserFollowPlayer, set(players))}
+    items, users, popular = [], set(), {'team': [], 'player': []}
+    for field, (follow_model, pks) in sources.items():
+        for pk in pks:
+            followers = follow_model.objects.filter(**{field + '_id': pk}).values_list('user_id', flat=True)
+            followers = list(followers[:limit + 1])
+            if len(followers) > limit:
+                items.append(FeedItem(kind=kind, date=date, **{field + '_id': pk}, **targets))
+                popular[field].append(pk)
+            else:
+                users.update(followers)
+
+    # Followers of a popular source already see its shared row.
+    for field, (follow_model, pks) in sources.items():
+        if popular[field] and users:
+            users -= set(follow_model.objects.filter(**{field + '_id__in': popular[field]}, user_id__in=users)
+                         .values_list('user_id', flat=True))
+    items += [FeedItem(kind=kind, date=date, user_id=user_id, **targets) for user_id in users]
+    FeedItem.objects.bulk_create(items)
+
+
+def fan_out_match(match):
+    fan_out('match', match.date, teams=(match.team1_id, match.team2_id), match=match)
+
+
+def fan_out_event(event):
+    match = event.match
+    fan_out('event', event.time, teams=(match.team1_id, match.team2_id), match=match, event=event)
+
+
+def fan_out_article(article, tag_ids):
+    names = list(article.tags.filter(pk__in=tag_ids).values_list('name', flat=True))
+    teams = Team.objects.filter(name__in=names).values_list('pk', flat=True)
+    players = Player.objects.filter(name__in=names).values_list('pk', flat=True)
+    if teams or players:
+        fan_out('news', article.date, teams=teams, players=players, article=article)
+
+
+def user_feed(user):
+    teams = UserFollowTeam.objects.filter(user=user).values('team_id')
+    players = UserFollowPlayer.objects.filter(user=user).values('player_id')
+    visible = FeedItem.objects.filter(
+        Q(user=user) | Q(user__isnull=True, team__in=teams) | Q(user__isnull=True, player__in=players)
+    )
+    # A user following both teams of a match sees both teams' shared rows,
+    # only the first of them is kept. Done in the query so that pages are
+    # never short.
+    earlier = visible.filter(pk__lt=OuterRef('pk'), kind=OuterRef('kind')).filter(
+        Q(kind='match', match=OuterRef('match')) | Q(kind='event', event=OuterRef('event')) |
+        Q(kind='news', article=OuterRef('article'))
+    )
+    return visible.annotate(duplicate=Exists(earlier)).filter(duplicate=False)
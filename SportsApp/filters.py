@@ -1,7 +1,7 @@
 from django.db.models import Q
 from rest_framework import filters
 
-from SportsApp.models import Team
+from SportsApp.search import search_articles
 
 
 class NewsFilterBackend(filters.BaseFilterBackend):
@@ -12,14 +12,26 @@ class NewsFilterBackend(filters.BaseFilterBackend):
             elif key == 'text':
                 return queryset.filter(text__icontains=request.GET['text'])
             elif key == 'tag':
-                return queryset.filter(tags__name__icontains=request.GET['tag'])
+                return queryset.filter(tags__name__icontains=request.GET['tag']).distinct()
         return queryset
 
 
-class MatchOrderingFilterBackend(filters.OrderingFilter):
+class NewsSearchFilter(filters.BaseFilterBackend):
+    search_param = 'search'
+
     def filter_queryset(self, request, queryset, view):
-        name = view.kwargs['name']
-        for key in request.GET.keys():
-            if key == 'ordering':
-                print(Team.objects.get(name=name).team2)
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_articles(queryset, query)
+
+
+class SeasonFilterBackend(filters.BaseFilterBackend):
+    """?league=<id> and ?season=<year>, through the view's `season_lookups`."""
+
+    def filter_queryset(self, request, queryset, view):
+        for param, lookup in getattr(view, 'season_lookups', {}).items():
+            value = request.query_params.get(param, '')
+            if value.isdigit():
+                queryset = queryset.filter(**{lookup: int(value)})
         return queryset
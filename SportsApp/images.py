@@ -0,0 +1,149 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import League, MatchImages, NewsArticle, Player, Team
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+
+# The image field of every model that gets derivatives.
+IMAGE_FIELDS = {
+    NewsArticle: 'image',
+    Team: 'logo',
+    League: 'logo',
+    Player: 'image',
+    MatchImages: 'image',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Derivatives known to be in storage. Missing ones are looked up again on
+# every use, the worker pool may have written them since.
+_written = set()
+
+
+def get_sizes():
+    return getattr(settings, 'IMAGE_DERIVATIVES', {'thumbnail': (150, 150), 'medium': (600, 600)})
+
+
+def derivative_name(name, size, webp=False):
+    """
+    Storage name of the `size` derivative of `name`, next to the original:
+    teams/logo.png -> teams/derivatives/logo.thumbnail.png (or .webp).
+    """
+    directory, filename = posixpath.split(name)
+    stem, extension = posixpath.splitext(filename)
+    if webp:
+        extension = '.webp'
+    elif extension.lower() not in ('.jpg', '.jpeg', '.png'):
+        extension = '.png'
+    return posixpath.join(directory, DERIVATIVES_DIR, '%s.%s%s' % (stem, size, extension))
+
+
+def _encode(image, name):
+    extension = posixpath.splitext(name)[1].lower()
+    output = BytesIO()
+    if extension == '.webp':
+        image.save(output, 'WEBP', quality=80, method=4)
+    elif extension in ('.jpg', '.jpeg'):
+        image.convert('RGB').save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        image.save(output, 'PNG', optimize=True)
+    return output.getvalue()
+
+
+def generate(name, force=False, storage=default_storage):
+    """Write the missing derivatives of image `name`, return how many."""
+    if not name or DERIVATIVES_DIR in posixpath.dirname(name).split('/') or not storage.exists(name):
+        return 0
+    targets = [(derivative_name(name, size, webp), box)
+               for size, box in get_sizes().items() for webp in (False, True)]
+    targets = [(target, box) for target, box in targets if force or not storage.exists(target)]
+    if not targets:
+        return 0
+
+    with storage.open(name) as source:
+        original = Image.open(source)
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+        original.load()
+
+    for target, box in targets:
+        image = original.copy()
+        image.thumbnail(box, Image.LANCZOS)
+        if storage.exists(target):
+            _written.discard(target)
+            storage.delete(target)
+        storage.save(target, ContentFile(_encode(image, target)))
+        _written.add(target)
+    return len(targets)
+
+
+def written(storage, name):
+    if name not in _written and storage.exists(name):
+        _written.add(name)
+    return name in _written
+
+
+def _generate_logged(name, force=False, done=None):
+    try:
+        count = generate(name, force)
+        if count and done is not None:
+            done()
+        return count
+    except Exception:
+        logger.exception('Could not create derivatives of %s', name)
+        return 0
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(getattr(settings, 'IMAGE_WORKERS', 2),
+                                           thread_name_prefix='image-derivatives')
+        return _executor
+
+
+def schedule(name, force=False, done=None):
+    """
+    Queue `name` for the worker pool once the current transaction commits,
+    `done` is called once derivatives were written. With IMAGE_WORKERS = 0
+    the derivatives are made inline at commit.
+    """
+    def submit():
+        if getattr(settings, 'IMAGE_WORKERS', 2):
+            get_executor().submit(_generate_logged, name, force, done)
+        else:
+            _generate_logged(name, force, done)
+    transaction.on_commit(submit)
+
+
+def srcset(field_file, build_url=None):
+    """
+    URLs of the original and every derivative of `field_file`. Derivatives
+    not written yet, still queued or of an image uploaded before they were
+    made, point at the original.
+    """
+    if not field_file:
+        return None
+    build_url = build_url or (lambda url: url)
+    storage, name = field_file.storage, field_file.name
+    urls = {'original': build_url(field_file.url)}
+    for size in get_sizes():
+        for key, derivative in ((size, derivative_name(name, size)),
+                                (size + '_webp', derivative_name(name, size, webp=True))):
+            urls[key] = build_url(storage.url(derivative)) if written(storage, derivative) else urls['original']
+    return urls
@@ -0,0 +1,237 @@
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import standings, versions
+from .models import Match, MatchLineup, Player, PlayerSeason, PlayerStat, Team, TeamPosition, parse_sport
+
+# Record kinds and the fields they are read from. Teams are referred to by
+# slug or name, players by name.
+#   roster: team, player, position[, age, height, weight, nationality]
+#   stat:   player, season, name, value
+#   match:  home, away, date, score1, score2[, type, player1, player2, sub1, sub2]
+# Lineups are lists of player names, "|" separated in CSV.
+KINDS = ('roster', 'stat', 'match')
+
+
+class SeasonImportError(Exception):
+    pass
+
+
+def read_records(path, kind=None):
+    """Stream (number, record) from a .csv or .jsonl file, numbered from 1."""
+    with io.open(path, encoding='utf-8-sig', newline='') as file:
+        if path.endswith('.csv'):
+            records = csv.DictReader(file)
+        else:
+            records = (json.loads(line) for line in file if line.strip())
+        for number, record in enumerate(records, 1):
+            if kind:
+                record['kind'] = kind
+            yield number, record
+
+
+def _names(value):
+    if isinstance(value, str):
+        return [name.strip() for name in value.split('|') if name.strip()]
+    return list(value or [])
+
+
+class SeasonImporter(object):
+    """
+    Writes roster, stat and match records of one league with bulk queries,
+    resolving natural keys through in-memory maps of the existing rows.
+    Records are upserts, so importing a chunk twice changes nothing.
+    """
+
+    def __init__(self, league):
+        self.league = league
+        self.teams = {}
+        for pk, slug, name in Team.objects.values_list('pk', 'slug', 'name'):
+            self.teams.setdefault(name, pk)
+            self.teams[slug] = pk
+        self.players = {}
+        for pk, name in Player.objects.values_list('pk', 'name'):
+            # Two players sharing a name cannot be told apart by it.
+            self.players[name] = None if name in self.players else pk
+        self.positions = {(team_id, player_id): pk
+                          for pk, team_id, player_id in TeamPosition.objects.values_list('pk', 'team_id', 'player_id')}
+        self.seasons = {(player_id, season): pk
+                        for pk, player_id, season in PlayerSeason.objects.values_list('pk', 'player_id', 'season')}
+        self.stats = {}
+        self.loaded_stat_seasons = set()
+        self.matches = {(team1_id, team2_id, date): pk for pk, team1_id, team2_id, date in
+                        Match.objects.filter(league=league).values_list('pk', 'team1_id', 'team2_id', 'date')}
+
+    def team(self, number, value):
+        pk = self.teams.get((value or '').strip())
+        if pk is None:
+            raise SeasonImportError('Row %d: unknown team %r.' % (number, value))
+        return pk
+
+    def player(self, number, value):
+        value = (value or '').strip()
+        if value not in self.players:
+            raise SeasonImportError('Row %d: unknown player %r.' % (number, value))
+        if self.players[value] is None:
+            raise SeasonImportError('Row %d: more than one player is called %r.' % (number, value))
+        return self.players[value]
+
+    def import_chunk(self, records):
+        """Write one chunk of (number, record) in a transaction, return touched ids."""
+        grouped = defaultdict(list)
+        for number, record in records:
+            if record.get('kind') not in KINDS:
+                raise SeasonImportError('Row %d: kind must be one of %s.' % (number, ', '.join(KINDS)))
+            grouped[record['kind']].append((number, record))
+        with transaction.atomic():
+            touched = {'player': set(), 'team': set(), 'match': set()}
+            self.import_rosters(grouped['roster'], touched)
+            self.import_stats(grouped['stat'], touched)
+            self.import_matches(grouped['match'], touched)
+            # Bulk writes skip the model signals, so invalidate here.
+            for collection, pks in touched.items():
+                if pks:
+                    versions.bump(collection, *pks)
+        return touched
+
+    def import_rosters(self, records, touched):
+        new_players = {}
+        for number, record in records:
+            name = (record.get('player') or '').strip()
+            if name and name not in self.players and name not in new_players:
+                new_players[name] = Player(
+                    name=name, age=int(record.get('age') or 0), height=int(record.get('height') or 0),
+                    weight=float(record.get('weight') or 0), nationality=record.get('nationality') or '')
+        if new_players:
+            Player.objects.bulk_create(new_players.values())
+            # Primary keys are only set on bulk_create with PostgreSQL.
+            for pk, name in Player.objects.filter(name__in=list(new_players)).values_list('pk', 'name'):
+                self.players[name] = pk
+
+        creates, updates = {}, {}
+        for number, record in records:
+            team_id = self.team(number, record.get('team'))
+            player_id = self.player(number, record.get('player'))
+            position = (record.get('position') or '')[:20]
+            pk = self.positions.get((team_id, player_id))
+            if pk is None:
+                creates[(team_id, player_id)] = TeamPosition(team_id=team_id, player_id=player_id, position=position)
+            else:
+                updates[pk] = TeamPosition(pk=pk, position=position)
+            touched['team'].add(team_id)
+            touched['player'].add(player_id)
+        TeamPosition.objects.bulk_create(creates.values())
+        TeamPosition.objects.bulk_update(updates.values(), ['position'])
+        if creates:
+            for pk, team_id, player_id in TeamPosition.objects.filter(
+                    player_id__in={player_id for team_id, player_id in creates}).values_list('pk', 'team_id', 'player_id'):
+                self.positions[(team_id, player_id)] = pk
+
+    def load_stats(self, seasons):
+        missing = set(seasons) - self.loaded_stat_seasons
+        if missing:
+            for pk, season_id, name in PlayerStat.objects.filter(player_season__season__in=missing) \
+                    .values_list('pk', 'player_season_id', 'name'):
+                self.stats[(season_id, name)] = pk
+            self.loaded_stat_seasons |= missing
+
+    def import_stats(self, records, touched):
+        if not records:
+            return
+        rows = []
+        for number, record in records:
+            season = str(record.get('season') or '').strip()
+            if not season or not record.get('name'):
+                raise SeasonImportError('Row %d: season and name are required.' % number)
+            try:
+                value = int(record.get('value'))
+            except (TypeError, ValueError):
+                raise SeasonImportError('Row %d: value must be an integer.' % number)
+            rows.append((self.player(number, record.get('player')), season, record['name'][:100], value))
+
+        new_seasons = {(player_id, season) for player_id, season, name, value in rows} - set(self.seasons)
+        if new_seasons:
+            PlayerSeason.objects.bulk_create([PlayerSeason(player_id=player_id, season=season)
+                                              for player_id, season in new_seasons])
+            for pk, player_id, season in PlayerSeason.objects.filter(
+                    season__in={season for player_id, season in new_seasons},
+                    player_id__in={player_id for player_id, season in new_seasons}) \
+                    .values_list('pk', 'player_id', 'season'):
+                self.seasons[(player_id, season)] = pk
+
+        self.load_stats({season for player_id, season, name, value in rows})
+        creates, updates = {}, {}
+        for player_id, season, name, value in rows:
+            season_id = self.seasons[(player_id, season)]
+            pk = self.stats.get((season_id, name))
+            if pk is None:
+                creates[(season_id, name)] = PlayerStat(player_season_id=season_id, name=name, value=value)
+            else:
+                updates[pk] = PlayerStat(pk=pk, value=value)
+            touched['player'].add(player_id)
+        PlayerStat.objects.bulk_create(creates.values())
+        PlayerStat.objects.bulk_update(updates.values(), ['value'])
+        if creates:
+            for pk, season_id, name in PlayerStat.objects.filter(
+                    player_season_id__in={season_id for season_id, name in creates}) \
+                    .values_list('pk', 'player_season_id', 'name'):
+                self.stats[(season_id, name)] = pk
+
+    def import_matches(self, records, touched):
+        if not records:
+            return
+        rows = {}
+        for number, record in records:
+            date = parse_datetime(str(record.get('date') or ''))
+            if date is None:
+                raise SeasonImportError('Row %d: date must be an ISO 8601 date and time.' % number)
+            if timezone.is_naive(date):
+                date = timezone.make_aware(date)
+            team1_id, team2_id = self.team(number, record.get('home')), self.team(number, record.get('away'))
+            lineups = []
+            for lineup, side, role in MatchLineup.LISTS:
+                team_id = team1_id if side == 1 else team2_id
+                for order, name in enumerate(_names(record.get(lineup))):
+                    position = self.positions.get((team_id, self.player(number, name)))
+                    if position is None:
+                        raise SeasonImportError('Row %d: %s is not in the roster of team %s.' % (number, name, team_id))
+                    lineups.append(MatchLineup(side=side, role=role, order=order, team_position_id=position))
+            sport = parse_sport(record['type']) if record.get('type') else self.league.type
+            if sport is None:
+                raise SeasonImportError('Row %d: unknown sport %r.' % (number, record['type']))
+            match = Match(
+                league=self.league, team1_id=team1_id, team2_id=team2_id, date=date, type=sport,
+                score1=int(record.get('score1') or 0), score2=int(record.get('score2') or 0))
+            match.pk = self.matches.get((team1_id, team2_id, date))
+            rows[(team1_id, team2_id, date)] = (match, lineups)
+
+        creates = [match for match, lineups in rows.values() if match.pk is None]
+        Match.objects.bulk_create(creates)
+        Match.objects.bulk_update([match for match, lineups in rows.values() if match.pk is not None],
+                                  ['type', 'score1', 'score2'])
+        if creates:
+            for pk, team1_id, team2_id, date in Match.objects.filter(
+                    league=self.league, date__in={match.date for match in creates}) \
+                    .values_list('pk', 'team1_id', 'team2_id', 'date'):
+                self.matches[(team1_id, team2_id, date)] = pk
+
+        match_ids = []
+        for key, (match, lineups) in rows.items():
+            match.pk = self.matches[key]
+            match_ids.append(match.pk)
+            touched['match'].add(match.pk)
+            touched['team'] |= {match.team1_id, match.team2_id}
+        MatchLineup.objects.filter(match_id__in=match_ids).delete()
+        for match, lineups in rows.values():
+            for lineup in lineups:
+                lineup.match_id = match.pk
+        MatchLineup.objects.bulk_create([lineup for match, lineups in rows.values() for lineup in lineups])
+
+    def finish(self):
+        standings.rebuild_league(self.league.pk)
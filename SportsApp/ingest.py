@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import F
+
+from . import standings, versions
+from .leaderboard import leaderboards
+from .live import publish_on_commit
+from .models import Match, MatchEvent, MatchStats, PlayerStat
+
+
+# Live data writes. Each one is a single UPDATE ... SET x = x + n so
+# concurrent operators (admin clicks or the ingest API) never lose updates.
+
+
+class IngestError(Exception):
+    pass
+
+
+def add_score(match_id, score1=0, score2=0):
+    if not Match.objects.filter(pk=match_id).update(score1=F('score1') + score1, score2=F('score2') + score2):
+        raise IngestError('Match %s does not exist.' % match_id)
+    match = Match.objects.only('score1', 'score2', 'date', 'league_id', 'team1_id', 'team2_id').get(pk=match_id)
+    standings.update_for_match(match)
+    versions.bump('match', match.pk)
+    publish_on_commit(match.pk, 'score', {'score1': match.score1, 'score2': match.score2})
+    return match
+
+
+def add_match_stat(stat_id, first=0, second=0):
+    if not MatchStats.objects.filter(pk=stat_id).update(first=F('first') + first, second=F('second') + second):
+        raise IngestError('Match stat %s does not exist.' % stat_id)
+    stat = MatchStats.objects.only('match_id', 'name', 'first', 'second').get(pk=stat_id)
+    versions.bump('match', stat.match_id)
+    publish_on_commit(stat.match_id, 'stats', {
+        'name': stat.name,
+        'first': stat.first,
+        'second': stat.second,
+        'first_delta': first,
+        'second_delta': second,
+    })
+    return stat
+
+
+def add_player_stat(stat_id, value=1):
+    if not PlayerStat.objects.filter(pk=stat_id).update(value=F('value') + value):
+        raise IngestError('Player stat %s does not exist.' % stat_id)
+    versions.bump('player', PlayerStat.objects.values_list('player_season__player_id', flat=True).get(pk=stat_id))
+    transaction.on_commit(lambda: leaderboards.stat_changed(stat_id))
+
+
+def add_event(match_id, title, comment=None):
+    if not Match.objects.filter(pk=match_id).exists():
+        raise IngestError('Match %s does not exist.' % match_id)
+    return MatchEvent.objects.create(match_id=match_id, title=title, comment=comment)
+
+
+def apply_operation(operation):
+    op = operation['op']
+    if op == 'score':
+        add_score(operation['match'], operation.get('score1', 0), operation.get('score2', 0))
+    elif op == 'match_stat':
+        add_match_stat(operation['stat'], operation.get('first', 0), operation.get('second', 0))
+    elif op == 'player_stat':
+        add_player_stat(operation['stat'], operation.get('value', 1))
+    elif op == 'event':
+        add_event(operation['match'], operation['title'], operation.get('comment'))
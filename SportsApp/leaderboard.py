@@ -0,0 +1,164 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from .models import PlayerSeason, PlayerStat
+
+
+class SeasonTable(object):
+    """
+    Pivot of one season's PlayerStat rows: one dense int64 column per stat
+    name, one row per player. `cells` remembers what every PlayerStat row
+    contributed so changes are applied as deltas.
+    """
+
+    def __init__(self, season):
+        self.season = season
+        self.player_ids = np.zeros(0, dtype=np.int64)
+        self.names = []
+        self.rows = {}
+        self.columns = {}
+        self.cells = {}
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, season):
+        table = cls(season)
+        stats = list(PlayerStat.objects.filter(player_season__season=season).values_list(
+            'pk', 'player_season__player_id', 'player_season__player__name', 'name', 'value'))
+        if not stats:
+            return table
+        player_ids, player_names, names, values = list(zip(*stats))[1:]
+        # Columns are built in one pass, rows numbered in player id order.
+        table.player_ids, first, rows = np.unique(np.array(player_ids, dtype=np.int64),
+                                                  return_index=True, return_inverse=True)
+        table.names = [player_names[index] for index in first]
+        table.rows = {int(player_id): row for row, player_id in enumerate(table.player_ids)}
+        numbers = {}
+        columns = np.array([numbers.setdefault(name, len(numbers)) for name in names], dtype=np.int64)
+        stat_names = list(numbers)
+        sums = np.bincount(columns * len(table.names) + rows, np.array(values, dtype=np.float64),
+                           len(stat_names) * len(table.names)).astype(np.int64)
+        for name, column in zip(stat_names, sums.reshape(len(stat_names), len(table.names))):
+            table.columns[name] = column.copy()
+        table.cells = {stat_id: (player_id, name, value) for stat_id, player_id, player_name, name, value in stats}
+        return table
+
+    def _row(self, player_id, player_name):
+        if player_id not in self.rows:
+            self.rows[player_id] = len(self.names)
+            self.names.append(player_name)
+            self.player_ids = np.append(self.player_ids, player_id)
+            for name, column in self.columns.items():
+                self.columns[name] = np.append(column, 0)
+        return self.rows[player_id]
+
+    def _column(self, name):
+        if name not in self.columns:
+            self.columns[name] = np.zeros(len(self.names), dtype=np.int64)
+        return self.columns[name]
+
+    def _add(self, stat_id, player_id, name, value):
+        self._column(name)[self.rows[player_id]] += value
+        self.cells[stat_id] = (player_id, name, value)
+
+    def remove(self, stat_id):
+        if stat_id in self.cells:
+            player_id, name, value = self.cells.pop(stat_id)
+            self.columns[name][self.rows[player_id]] -= value
+
+    def update(self, stat_id, player_id, player_name, name, value):
+        self.remove(stat_id)
+        self._row(player_id, player_name)
+        self._add(stat_id, player_id, name, value)
+
+    def top(self, name, limit, player_ids=None):
+        column = self.columns.get(name)
+        if column is None or not len(column):
+            return []
+        candidates = np.arange(len(column))
+        if player_ids is not None:
+            candidates = candidates[np.isin(self.player_ids, player_ids)]
+        # Highest value first, ties broken by player id, cut after sorting
+        # so the players tied at the limit are not picked at random.
+        order = np.lexsort((self.player_ids[candidates], -column[candidates]))[:limit]
+        return [(int(self.player_ids[row]), self.names[row], int(column[row])) for row in candidates[order]]
+
+
+class Leaderboards(object):
+    """
+    Season tables loaded on first use. A table older than
+    LEADERBOARD_REFRESH_SECONDS keeps being served while a background
+    thread reloads it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+        # Seasons being reloaded, with the stats changed meanwhile.
+        self.reloading = {}
+
+    def table(self, season):
+        """The table of `season`, None if no player has stats in it."""
+        table = self.tables.get(season)
+        if table is None:
+            if not PlayerSeason.objects.filter(season=season).exists():
+                return None
+            table = SeasonTable.load(season)
+            with self.lock:
+                table = self.tables.setdefault(season, table)
+        elif time.monotonic() - table.loaded_at > getattr(settings, 'LEADERBOARD_REFRESH_SECONDS', 300):
+            with self.lock:
+                if season in self.reloading:
+                    return table
+                self.reloading[season] = set()
+            threading.Thread(target=self.reload, args=(season,), name='leaderboard-reload', daemon=True).start()
+        return table
+
+    def reload(self, season):
+        try:
+            table = SeasonTable.load(season)
+            with self.lock:
+                self.tables[season] = table
+                changed = self.reloading.pop(season)
+            # Changes applied to the old table while this one was loading.
+            for stat_id in changed:
+                self.stat_changed(stat_id)
+        finally:
+            with self.lock:
+                self.reloading.pop(season, None)
+            connection.close()
+
+    def top(self, season, name, limit=10, player_ids=None):
+        """Rows of the top players, None for an unknown season."""
+        table = self.table(season)
+        if table is None:
+            return None
+        with self.lock:
+            return table.top(name, limit, player_ids)
+
+    def stat_changed(self, stat_id):
+        """Apply the current value of PlayerStat `stat_id` to loaded seasons."""
+        row = PlayerStat.objects.filter(pk=stat_id).values_list(
+            'player_season__season', 'player_season__player_id', 'player_season__player__name', 'name',
+            'value').first()
+        with self.lock:
+            self._changed(stat_id)
+            if row is not None and row[0] in self.tables:
+                self.tables[row[0]].update(stat_id, *row[1:])
+
+    def stat_removed(self, stat_id):
+        with self.lock:
+            self._changed(stat_id)
+
+    def _changed(self, stat_id):
+        for table in self.tables.values():
+            table.remove(stat_id)
+        for changed in self.reloading.values():
+            changed.add(stat_id)
+
+
+leaderboards = Leaderboards()
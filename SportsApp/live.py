@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+class BaseBroker(object):
+    """
+    Per-match channel of versioned deltas. `publish` assigns the next version
+    of the match's channel, `wait` blocks until a delta newer than `since` is
+    available. Implementations backed by a local broker (redis, nats, ...)
+    only have to provide these two methods.
+    """
+
+    def publish(self, match_id, kind, data):
+        raise NotImplementedError
+
+    def wait(self, match_id, since, timeout):
+        raise NotImplementedError
+
+
+class InProcessBroker(BaseBroker):
+    """
+    Keeps the last `backlog` deltas of every match in memory. Only clients
+    connected to the worker that handled the write are notified, so use it
+    with a single worker process or swap it through `LIVE_BROKER`.
+    """
+
+    def __init__(self, backlog=256):
+        self.backlog = backlog
+        self.condition = threading.Condition()
+        self.channels = {}
+
+    def publish(self, match_id, kind, data):
+        with self.condition:
+            version, deltas = self.channels.get(match_id, (0, deque(maxlen=self.backlog)))
+            version += 1
+            deltas.append({'version': version, 'type': kind, 'data': data})
+            self.channels[match_id] = (version, deltas)
+            self.condition.notify_all()
+        return version
+
+    def _since(self, match_id, since):
+        version, deltas = self.channels.get(match_id, (0, ()))
+        if since > version:
+            # The worker restarted and the client holds a version from before.
+            return [{'version': version, 'type': 'reset', 'data': None}]
+        if deltas and since < deltas[0]['version'] - 1:
+            # The client fell behind the backlog, it has to refetch the match.
+            return [{'version': version, 'type': 'reset', 'data': None}]
+        return [delta for delta in deltas if delta['version'] > since]
+
+    def wait(self, match_id, since, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                deltas = self._since(match_id, since)
+                remaining = deadline - time.monotonic()
+                if deltas or remaining <= 0:
+                    return deltas
+                self.condition.wait(remaining)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'LIVE_BROKER', 'SportsApp.live.InProcessBroker'))()
+    return _broker
+
+
+def publish(match_id, kind, data):
+    return get_broker().publish(match_id, kind, data)
+
+
+def publish_on_commit(match_id, kind, data):
+    transaction.on_commit(lambda: publish(match_id, kind, data))
+
+
+def event_stream(match_id, since):
+    heartbeat = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+    deadline = time.monotonic() + getattr(settings, 'LIVE_STREAM_MAX_SECONDS', 300)
+    broker = get_broker()
+    metrics.live_connections.inc()
+    try:
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            deltas = broker.wait(match_id, since, heartbeat)
+            if not deltas:
+                yield ': keepalive\n\n'
+                continue
+            for delta in deltas:
+                since = delta['version']
+                yield 'id: %d\nevent: %s\ndata: %s\n\n' % (delta['version'], delta['type'],
+                                                          json.dumps(delta['data'], ensure_ascii=False))
+    finally:
+        metrics.live_connections.dec()
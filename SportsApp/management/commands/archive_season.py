@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from SportsApp import archive
+from SportsApp.models import League, Match
+
+
+class Command(BaseCommand):
+    help = ('Move finished leagues, with their standings, matches, lineups, events, stats and media, to the '
+            'archive database. Run `migrate --run-syncdb --database archive` first to create its tables.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('leagues', nargs='*', type=int, help='League ids.')
+        parser.add_argument('--season', type=int, help='Every finished league that started in this year.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows copied or deleted per query.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the leagues and their matches.')
+
+    def handle(self, *args, **options):
+        alias = archive.database()
+        if alias is None:
+            raise CommandError('No archive database, add ARCHIVE_DATABASE to DATABASES.')
+        if Match._meta.db_table not in connections[alias].introspection.table_names():
+            raise CommandError('The archive database has no tables, run `migrate --run-syncdb --database %s`.'
+                               % alias)
+        if not options['leagues'] and options['season'] is None:
+            raise CommandError('Give league ids or --season.')
+
+        leagues = League.objects.order_by('start_date', 'pk')
+        if options['leagues']:
+            leagues = leagues.filter(pk__in=options['leagues'])
+            missing = set(options['leagues']) - {league.pk for league in leagues}
+            if missing:
+                raise CommandError('Unknown leagues: %s' % ', '.join(map(str, sorted(missing))))
+        if options['season'] is not None:
+            leagues = leagues.filter(start_date__year=options['season'])
+
+        for league in leagues:
+            if league.is_ongoing:
+                self.stdout.write('%s: still ongoing, skipped' % league)
+                continue
+            if options['dry_run']:
+                self.stdout.write('%s: %d matches' % (league, league.match_set.count()))
+                continue
+            counts = archive.archive_league(league, options['chunk_size'])
+            self.stdout.write('%s: archived %s' % (
+                league, ', '.join('%d %s' % (count, name) for name, count in counts.items() if count)))
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from SportsApp import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Time every API endpoint on the current database (see generate_data) and write '
+            'p50/p95 latency, query count and peak memory as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cached', action='store_true', help='Keep the API response cache between requests.')
+        parser.add_argument('--endpoint', action='append', help='Only this endpoint, repeatable.')
+        parser.add_argument('--output', help='JSON file to write the results to.')
+        parser.add_argument('--compare', help='Earlier results to report regressions against.')
+        parser.add_argument('--threshold', type=float, default=1.2, help='Allowed p95 growth, default 1.2x.')
+
+    def handle(self, *args, **options):
+        # Lets the test client's host through ALLOWED_HOSTS.
+        setup_test_environment()
+        results = benchmark.run(options['iterations'], options['warmup'], options['cached'], options['endpoint'],
+                                log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write('Wrote %s' % options['output'])
+        if options['compare']:
+            with open(options['compare']) as file:
+                regressions = benchmark.compare(json.load(file), results, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against %s:\n%s' % (options['compare'], '\n'.join(regressions)))
+            self.stdout.write('No regressions against %s' % options['compare'])
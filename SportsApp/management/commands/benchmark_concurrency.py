@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment
+
+from SportsApp import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Measure API read throughput and latency on the current database while writer threads add '
+            'goals like operators clicking in the admin.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--write-interval', type=float, default=0.05, help='Pause after each write.')
+        parser.add_argument('--direct', action='store_true', help='Write from every writer thread, not the queue.')
+        parser.add_argument('--output', help='JSON file to write the results to.')
+
+    def handle(self, *args, **options):
+        # Lets the test client's host through ALLOWED_HOSTS.
+        setup_test_environment()
+        results = benchmark.concurrency(options['readers'], options['writers'], options['seconds'],
+                                        options['write_interval'], not options['direct'], log=self.stdout.write)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write('Wrote %s' % options['output'])
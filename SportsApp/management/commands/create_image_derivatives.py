@@ -0,0 +1,41 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from SportsApp import images
+
+
+class Command(BaseCommand):
+    help = 'Create the missing thumbnail, medium and WebP derivatives of every image under MEDIA_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recreate derivatives that already exist.')
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'IMAGE_WORKERS', 2) or 1)
+
+    def names(self):
+        for root, directories, files in os.walk(settings.MEDIA_ROOT):
+            directories[:] = [directory for directory in directories if directory != images.DERIVATIVES_DIR]
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1].lower() in ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'):
+                    path = os.path.relpath(os.path.join(root, filename), settings.MEDIA_ROOT)
+                    yield path.replace(os.sep, '/')
+
+    def handle(self, *args, **options):
+        def create(name):
+            try:
+                return name, images.generate(name, options['force']), None
+            except Exception as error:
+                return name, 0, error
+
+        created = failed = 0
+        with ThreadPoolExecutor(options['workers']) as executor:
+            for name, count, error in executor.map(create, self.names()):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write('%s: %s' % (name, error))
+                elif count:
+                    created += count
+                    self.stdout.write('%s: %d derivatives' % (name, count))
+        self.stdout.write('Created %d derivatives, %d images failed' % (created, failed))
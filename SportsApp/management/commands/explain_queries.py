@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from SportsApp import queryplan
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN (EXPLAIN QUERY PLAN on SQLite) on the queries of every API endpoint and '
+            'flag full scans of filtered queries and sorts that no index covers.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', help='Only this endpoint, repeatable.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when anything is flagged.')
+
+    def handle(self, *args, **options):
+        # Lets the test client's host through ALLOWED_HOSTS.
+        setup_test_environment()
+        flagged = 0
+        for name, sql, plan, problems in queryplan.check(options['endpoint']):
+            if not problems and options['verbosity'] < 2:
+                continue
+            self.stdout.write('%s: %s' % (name, '; '.join(problems) or 'ok'))
+            self.stdout.write('    ' + sql)
+            for line in plan:
+                self.stdout.write('      ' + line)
+            flagged += bool(problems)
+        if flagged and options['fail']:
+            raise CommandError('%d queries flagged' % flagged)
+        self.stdout.write('%d queries flagged' % flagged)
@@ -0,0 +1,32 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from SportsApp import export
+
+
+class Command(BaseCommand):
+    help = 'Write matches with lineups, events and stats as NDJSON, one match per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--league', type=int, action='append', help='League id, repeatable.')
+        parser.add_argument('--season', type=int, action='append', help='Season start year, repeatable.')
+        parser.add_argument('--output', help='File to write, stdout when omitted.')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'EXPORT_CHUNK_SIZE', 500))
+
+    def handle(self, *args, **options):
+        chunks = export.export_matches(export.season_matches(options['league'], options['season']),
+                                       options['chunk_size'])
+        if options['gzip']:
+            chunks = export.gzip_stream(chunks)
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from SportsApp.synthetic import DEFAULTS, Generator
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with seeded synthetic leagues, teams, matches, news and users.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        for size, default in DEFAULTS.items():
+            parser.add_argument('--%s' % size, type=int, help='Default %d.' % default)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        sizes = {size: options[size] for size in DEFAULTS}
+        Generator(options['seed'], log=self.stdout.write, **sizes).run()
+        self.stdout.write('Done in %.1fs' % (time.monotonic() - started))
@@ -0,0 +1,55 @@
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from SportsApp.importer import KINDS, SeasonImporter, SeasonImportError, read_records
+from SportsApp.models import ImportProgress, League
+
+
+class Command(BaseCommand):
+    help = 'Import rosters, player stats and fixtures of a league from CSV or JSONL files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('league', type=int, help='League id.')
+        parser.add_argument('files', nargs='+', help='.csv or .jsonl files, imported in order.')
+        parser.add_argument('--kind', choices=KINDS, help='Kind of every record, instead of a "kind" field.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Records per transaction.')
+        parser.add_argument('--restart', action='store_true', help='Ignore the progress of earlier runs.')
+
+    def handle(self, *args, **options):
+        try:
+            league = League.objects.get(pk=options['league'])
+        except League.DoesNotExist:
+            raise CommandError('League %s does not exist.' % options['league'])
+        importer = SeasonImporter(league)
+        started, total = time.monotonic(), 0
+
+        for path in options['files']:
+            progress, created = ImportProgress.objects.get_or_create(source=os.path.abspath(path))
+            if options['restart']:
+                progress.rows = 0
+            elif progress.rows:
+                self.stdout.write('%s: resuming after record %d' % (path, progress.rows))
+            records = islice(read_records(path, options['kind']), progress.rows, None)
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                try:
+                    importer.import_chunk(chunk)
+                except (SeasonImportError, ValueError) as error:
+                    raise CommandError('%s: %s Records up to %d are imported, run again to resume.'
+                                       % (path, error, progress.rows))
+                # Saved after the chunk committed: a crash in between replays
+                # the chunk, which the upserts make harmless.
+                progress.rows = chunk[-1][0]
+                progress.save(update_fields=['rows', 'updated'])
+                total += len(chunk)
+                elapsed = time.monotonic() - started
+                self.stdout.write('%s: %d records, %.0f rows/s' % (path, progress.rows, total / (elapsed or 1e-9)))
+
+        importer.finish()
+        elapsed = time.monotonic() - started
+        self.stdout.write('Imported %d records in %.1fs (%.0f rows/s)' % (total, elapsed, total / (elapsed or 1e-9)))
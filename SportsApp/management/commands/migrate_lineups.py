@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from SportsApp import versions
+from SportsApp.models import Match, MatchLineup
+
+
+class Command(BaseCommand):
+    help = ('Copy the lineups of the old player1, player2, sub1 and sub2 tables into MatchLineup. '
+            'Run `migrate --run-syncdb` first to create the new table.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drop', action='store_true', help='Drop the old tables once copied.')
+
+    def old_tables(self):
+        existing = set(connection.introspection.table_names())
+        for name, side, role in MatchLineup.LISTS:
+            table = '%s_%s' % (Match._meta.db_table, name)
+            if table in existing:
+                yield table, side, role
+
+    def handle(self, *args, **options):
+        tables = list(self.old_tables())
+        if not tables:
+            self.stdout.write('No old lineup tables found')
+            return
+        with transaction.atomic():
+            # Matches already on the new table were migrated by an earlier run.
+            done = set(MatchLineup.objects.values_list('match_id', flat=True).distinct())
+            lineups, orders = [], {}
+            with connection.cursor() as cursor:
+                for table, side, role in tables:
+                    # Rows were added in lineup order, so the ids give `order`.
+                    cursor.execute('SELECT match_id, teamposition_id FROM %s ORDER BY match_id, id'
+                                   % connection.ops.quote_name(table))
+                    for match_id, position_id in cursor.fetchall():
+                        if match_id in done:
+                            continue
+                        order = orders.get((match_id, side, role), 0)
+                        orders[(match_id, side, role)] = order + 1
+                        lineups.append(MatchLineup(match_id=match_id, side=side, role=role, order=order,
+                                                   team_position_id=position_id))
+            MatchLineup.objects.bulk_create(lineups)
+            versions.bump('match', *{match_id for match_id, side, role in orders})
+            if options['drop']:
+                with connection.cursor() as cursor:
+                    for table, side, role in tables:
+                        cursor.execute('DROP TABLE %s' % connection.ops.quote_name(table))
+        self.stdout.write('Copied %d lineup rows of %d matches from %d tables%s' % (
+            len(lineups), len({match_id for match_id, side, role in orders}), len(tables),
+            ', dropped them' if options['drop'] else ''))
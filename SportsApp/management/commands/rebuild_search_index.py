@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from SportsApp import search
+from SportsApp.models import NewsArticle
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the news search index.'
+
+    def handle(self, *args, **options):
+        count = 0
+        for article in NewsArticle.objects.iterator(chunk_size=500):
+            search.index_article(article)
+            count += 1
+        self.stdout.write('Indexed %d articles' % count)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from SportsApp import standings
+from SportsApp.models import League
+
+
+class Command(BaseCommand):
+    help = ('Recompute league standings from match results. Run with --kicked-off from cron to add the '
+            'fixtures saved before their kickoff once they start.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('league', nargs='*', type=int, help='League ids, all leagues when omitted.')
+        parser.add_argument('--kicked-off', type=int, metavar='MINUTES',
+                            help='Only leagues with a match that kicked off in the last MINUTES, '
+                                 'more than the interval the command runs at.')
+
+    def handle(self, *args, **options):
+        leagues = League.objects.all()
+        if options['league']:
+            leagues = leagues.filter(pk__in=options['league'])
+        if options['kicked_off'] is not None:
+            leagues = leagues.filter(pk__in=standings.kicked_off(options['kicked_off']))
+        for league in leagues:
+            standings.rebuild_league(league.pk)
+            self.stdout.write('Rebuilt %s' % league)
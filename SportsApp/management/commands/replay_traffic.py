@@ -0,0 +1,52 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from SportsApp import replay
+
+
+class Command(BaseCommand):
+    help = ('Replay requests captured by TrafficCaptureMiddleware against a server or the test client '
+            'and report latency per route.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='+', help='Capture files, directories or globs.')
+        parser.add_argument('--target', help='Base URL of a running server, e.g. http://127.0.0.1:8000. '
+                                             'The Django test client is used when omitted.')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--speedup', type=float, default=1.0, help='Play the log this many times faster.')
+        parser.add_argument('--limit', type=int, help='Replay only the first N requests.')
+        parser.add_argument('--authorization', help='Authorization header sent for authenticated requests.')
+        parser.add_argument('--user', help='Username logged in for authenticated requests (test client).')
+        parser.add_argument('--output', help='JSON file to write the summary to.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User %s does not exist.' % options['user'])
+        if not options['target']:
+            # Lets the test client's host through ALLOWED_HOSTS.
+            setup_test_environment()
+
+        records = replay.read_log(options['logs'])
+        if not records:
+            raise CommandError('No GET requests found in %s.' % ', '.join(options['logs']))
+        self.stdout.write('Replaying %d requests spanning %.0fs at %gx on %d threads' % (
+            min(len(records), options['limit'] or len(records)), records[-1]['time'] - records[0]['time'],
+            options['speedup'], options['concurrency']))
+        player = replay.Replayer(options['target'], options['concurrency'], options['speedup'],
+                                 options['authorization'], user)
+        summary = replay.summarize(player.run(records, options['limit']))
+
+        for route, stats in summary.items():
+            self.stdout.write('%-40s %6d req %4d err  p50 %8.2fms  p95 %8.2fms  p99 %8.2fms  max %8.2fms' % (
+                route[:40], stats['requests'], stats['errors'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+                stats['max_ms']))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(summary, file, indent=2, sort_keys=True)
@@ -0,0 +1,116 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, migrations, models
+from django.db.migrations.state import ProjectState
+
+from SportsApp import comments
+from SportsApp.models import SPORTS, League, Match, NewsArticle, Team
+
+APP_LABEL = 'SportsApp'
+SPORT_MODELS = (NewsArticle, League, Team, Match)
+
+
+class Command(BaseCommand):
+    help = ('Bring a database created by `migrate --run-syncdb` up to date: add the missing columns, convert the '
+            'Persian `type` columns to the sport ids and create the missing indexes. Run `migrate --run-syncdb` '
+            'first.')
+
+    def handle(self, *args, **options):
+        tables = set(connection.introspection.table_names())
+        upgraded = [model for model in apps.get_app_config(APP_LABEL).get_models()
+                    if model._meta.db_table in tables]
+        # The models as their tables are now. Every change below is a
+        # migration operation applied to this state, so the SQLite table
+        # rebuilds only copy the columns the tables really have.
+        self.state = ProjectState.from_apps(apps)
+        self.missing = {}
+        self.sport_columns = set()
+        for model in upgraded:
+            self.read_table(model)
+        for model in upgraded:
+            self.convert_sport(model)
+            self.add_columns(model)
+            self.add_indexes(model)
+
+    def read_table(self, model):
+        with connection.cursor() as cursor:
+            columns = {column.name: column for column in
+                       connection.introspection.get_table_description(cursor, model._meta.db_table)}
+        name = model._meta.model_name
+        self.missing[model] = [field for field in model._meta.local_concrete_fields if field.column not in columns]
+        for field in self.missing[model]:
+            migrations.RemoveField(name, field.name).state_forwards(APP_LABEL, self.state)
+        column = columns.get('type')
+        if model in SPORT_MODELS and connection.introspection.get_field_type(column.type_code, column) == 'CharField':
+            migrations.AlterField(name, 'type', models.CharField(max_length=10)).state_forwards(APP_LABEL, self.state)
+            self.sport_columns.add(model)
+
+    def apply(self, editor, operation):
+        state = self.state.clone()
+        operation.state_forwards(APP_LABEL, state)
+        operation.database_forwards(APP_LABEL, editor, self.state, state)
+        self.state = state
+
+    def convert_sport(self, model):
+        if model not in self.sport_columns:
+            return
+        table = model._meta.db_table
+        quote = connection.ops.quote_name
+        with connection.schema_editor() as editor:
+            for sport, name in SPORTS:
+                editor.execute('UPDATE %s SET %s = %%s WHERE %s = %%s' % (quote(table), quote('type'), quote('type')),
+                               [str(sport), name])
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT DISTINCT %s FROM %s WHERE %s NOT IN (%s)' % (
+                    quote('type'), quote(table), quote('type'), ', '.join('%s' for sport in SPORTS)),
+                    [str(sport) for sport, name in SPORTS])
+                unknown = [row[0] for row in cursor.fetchall()]
+            if unknown:
+                # Leaving the block rolls the updates back.
+                raise CommandError('%s has unknown sports: %s' % (table, ', '.join(map(str, unknown))))
+            self.apply(editor, migrations.AlterField(model._meta.model_name, 'type',
+                                                     model._meta.get_field('type').clone()))
+        self.stdout.write('%s: type converted to sport ids' % table)
+
+    def add_columns(self, model):
+        missing = self.missing[model]
+        if not missing:
+            return
+        name = model._meta.model_name
+        with connection.schema_editor() as editor:
+            for field in missing:
+                if field.unique:
+                    # Added without the constraint, which is set once the
+                    # existing rows have distinct values.
+                    path, args, kwargs = field.deconstruct()[1:]
+                    kwargs.update(unique=False, db_index=False)
+                    self.apply(editor, migrations.AddField(name, field.name, field.__class__(*args, **kwargs)))
+                else:
+                    self.apply(editor, migrations.AddField(name, field.name, field.clone()))
+            if model is Team:
+                self.fill_slugs()
+            elif model is NewsArticle:
+                comments.recount()
+            for field in missing:
+                if field.unique:
+                    self.apply(editor, migrations.AlterField(name, field.name, field.clone()))
+        self.stdout.write('%s: added %s' % (model._meta.db_table, ', '.join(field.column for field in missing)))
+
+    def fill_slugs(self):
+        taken = set()
+        for pk, name in Team.objects.order_by('pk').values_list('pk', 'name'):
+            slug = Team.unique_slug(name, taken.__contains__)
+            taken.add(slug)
+            Team.objects.filter(pk=pk).update(slug=slug)
+
+    def add_indexes(self, model):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, table)
+        missing = [index for index in model._meta.indexes if index.name not in existing]
+        if not missing:
+            return
+        with connection.schema_editor() as editor:
+            for index in missing:
+                editor.add_index(model, index)
+        self.stdout.write('%s: created %s' % (table, ', '.join(index.name for index in missing)))
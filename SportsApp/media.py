@@ -0,0 +1,126 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_hash(content):
+    hasher = hashlib.md5()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()[:12]
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Stores uploads as name.<md5 prefix>.ext, so a URL never changes content
+    and can be cached forever. Uploading the same bytes twice reuses the
+    stored file. Files in `unhashed_directories` keep their names, image
+    derivatives are named after their already hashed original.
+    """
+    unhashed_directories = ('derivatives',)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        if not set(directory.split('/')) & set(self.unhashed_directories):
+            root, extension = posixpath.splitext(filename)
+            name = posixpath.join(directory, '%s.%s%s' % (root, file_hash(content), extension))
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length)
+
+
+def is_immutable(name):
+    return bool(HASHED_NAME_RE.search(posixpath.basename(name)))
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive of a single byte range, None to send the whole
+    file (no, malformed or multiple ranges), False when unsatisfiable.
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if not length:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+
+class RangeFile(object):
+    """
+    Part of an open file as a file-like object. WSGI servers whose
+    wsgi.file_wrapper uses os.sendfile (gunicorn, uWSGI, ...) stream it
+    zero-copy from the current offset for Content-Length bytes, others
+    read it in blocks.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def sendfile_headers(path, name):
+    """Headers handing `path` to the front server, None to serve it here."""
+    backend = getattr(settings, 'MEDIA_SENDFILE', None)
+    if backend == 'X-Sendfile':
+        return {'X-Sendfile': path}
+    if backend == 'X-Accel-Redirect':
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        return {'X-Accel-Redirect': prefix.rstrip('/') + '/' + name.lstrip('/')}
+    return None
+
+
+def cache_control(name):
+    if is_immutable(name):
+        return 'public, max-age=31536000, immutable'
+    return 'public, max-age=%d' % getattr(settings, 'MEDIA_CACHE_SECONDS', 3600)
+
+
+def file_etag(stat):
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def resolve(path):
+    """Absolute path of media file `path`, None when outside MEDIA_ROOT or missing."""
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    full = os.path.realpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep) or not os.path.isfile(full):
+        return None
+    return full
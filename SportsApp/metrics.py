@@ -0,0 +1,241 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# Prometheus text exposition of in-process metrics. Every worker process
+# keeps its own registry and dumps it to METRICS_DIR/metrics-<pid>.json at
+# most every METRICS_FLUSH_SECONDS. /metrics merges the dumps of all
+# workers: counters and histograms are summed over every file, gauges only
+# over the workers that are still running.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Metric(object):
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = registry.lock
+        registry.metrics[name] = self
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            # Per bucket (non cumulative) counts, then sum and count.
+            state = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0, 0])
+            index = len(self.buckets)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = position
+                    break
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _number(value):
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.flushed_at = 0
+
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    def dump(self):
+        with self.lock:
+            return {name: {json.dumps(key): value for key, value in metric.values.items()}
+                    for name, metric in self.metrics.items()}
+
+    def flush(self, force=False):
+        """Write this worker's values for the other workers' /metrics to read."""
+        directory = self.directory()
+        now = time.monotonic()
+        if not directory or (not force and now - self.flushed_at < getattr(settings, 'METRICS_FLUSH_SECONDS', 5)):
+            return
+        self.flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'metrics-%d.json' % os.getpid())
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.dump(), file)
+        os.replace(path + '.tmp', path)
+
+    def merged(self):
+        """{name: {label values: value}} summed over every worker."""
+        dumps = [(os.getpid(), self.dump())]
+        directory = self.directory()
+        if directory:
+            for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+                pid = int(os.path.basename(path)[8:-5])
+                if pid == os.getpid():
+                    continue
+                try:
+                    with open(path) as file:
+                        dumps.append((pid, json.load(file)))
+                except (OSError, ValueError):
+                    continue
+
+        merged = {name: {} for name in self.metrics}
+        for pid, dump in dumps:
+            alive = pid == os.getpid() or _alive(pid)
+            for name, values in dump.items():
+                metric = self.metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                for key, value in values.items():
+                    key = tuple(json.loads(key))
+                    if metric.kind == 'histogram':
+                        current = merged[name].get(key)
+                        merged[name][key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        merged[name][key] = merged[name].get(key, 0) + value
+        return merged
+
+    def exposition(self):
+        merged = self.merged()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append('# HELP %s %s' % (name, metric.documentation))
+            lines.append('# TYPE %s %s' % (name, metric.kind))
+            for key, value in sorted(merged[name].items()):
+                if metric.kind != 'histogram':
+                    lines.append('%s%s %s' % (name, _labels(metric.labelnames, key), _number(value)))
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value[:-2]):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (
+                        name, _labels(metric.labelnames, key, [('le', _number(bound))]), cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(metric.labelnames, key), _number(value[-2])))
+                lines.append('%s_count%s %d' % (name, _labels(metric.labelnames, key), value[-1]))
+            if name == 'cache_requests_total':
+                lines += self.hit_ratios(merged[name])
+        return '\n'.join(lines) + '\n'
+
+    def hit_ratios(self, values):
+        totals = {}
+        for (cache, result), count in values.items():
+            hits, requests = totals.get(cache, (0, 0))
+            totals[cache] = (hits + (count if result == 'hit' else 0), requests + count)
+        lines = ['# HELP cache_hit_ratio Share of cache lookups that were hits.', '# TYPE cache_hit_ratio gauge']
+        for cache, (hits, requests) in sorted(totals.items()):
+            lines.append('cache_hit_ratio%s %s' % (_labels(('cache',), (cache,)), _number(hits / requests)))
+        return lines
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush(force=True))
+
+requests_total = Counter(registry, 'http_requests_total', 'Requests by route, method and status.',
+                         ('route', 'method', 'status'))
+request_duration = Histogram(registry, 'http_request_duration_seconds', 'Request latency by route.',
+                             ('route', 'method'))
+response_size = Histogram(registry, 'http_response_size_bytes', 'Response body size by route.', ('route',),
+                          buckets=SIZE_BUCKETS)
+db_queries = Histogram(registry, 'db_queries_per_request', 'Database queries per request by route.', ('route',),
+                       buckets=QUERY_BUCKETS)
+db_duration = Histogram(registry, 'db_duration_seconds_per_request', 'SQL time per request by route.', ('route',))
+cache_requests = Counter(registry, 'cache_requests_total', 'Response cache and ETag lookups by result.',
+                         ('cache', 'result'))
+live_connections = Gauge(registry, 'live_stream_connections', 'Open live match event streams.')
+
+
+def route_name(request):
+    """Router basename (news, matches, ...) or URL name of the resolved view."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    initkwargs = getattr(match.func, 'initkwargs', None) or {}
+    return initkwargs.get('basename') or match.url_name or match.view_name
+
+
+class MetricsMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        route = route_name(request)
+        requests_total.inc(route=route, method=request.method, status=response.status_code)
+        request_duration.observe(duration, route=route, method=request.method)
+        if not response.streaming:
+            response_size.observe(len(response.content), route=route)
+        counter = getattr(request, '_query_counter', None)
+        if counter is not None:
+            db_queries.observe(counter.count, route=route)
+            db_duration.observe(counter.duration, route=route)
+        registry.flush()
+        return response
@@ -1,5 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils.text import slugify
+
+FOOTBALL = 1
+BASKETBALL = 2
+# Stored as small integers, shown and accepted by the API under these names.
+SPORTS = ((FOOTBALL, 'فوتبال'), (BASKETBALL, 'بسکتبال'))
+SPORT_NAMES = {'فوتبال': FOOTBALL, 'football': FOOTBALL, 'بسکتبال': BASKETBALL, 'basketball': BASKETBALL}
+
+
+def parse_sport(value):
+    """Sport of an id or a Persian or English name, None if unknown."""
+    if isinstance(value, int) or str(value).isdigit():
+        return int(value) if int(value) in dict(SPORTS) else None
+    return SPORT_NAMES.get(str(value).strip().lower())
 
 
 class Tag(models.Model):
@@ -13,16 +27,20 @@ class NewsArticle(models.Model):
     title = models.CharField(max_length=100)
     description = models.CharField(max_length=500)
     text = models.TextField()
-    image = models.ImageField(upload_to='../media/news', null=True, blank=True)
+    image = models.ImageField(upload_to='news', null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
-    type = models.CharField(max_length=10)
+    type = models.PositiveSmallIntegerField(choices=SPORTS, default=FOOTBALL)
     tags = models.ManyToManyField(Tag)
+    comment_count = models.IntegerField(default=0, editable=False)
+    # JSON list of the newest comments, rewritten whenever comments change.
+    latest_comments = models.TextField(default='[]', editable=False)
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['-date']
+        indexes = [models.Index(fields=['-date', '-id']), models.Index(fields=['type', '-date'])]
 
 
 class Comment(models.Model):
@@ -35,27 +53,69 @@ class Comment(models.Model):
     def __unicode__(self):
         return self.name + ': ' + self.user.username
 
+    class Meta:
+        ordering = ['-date']
+        indexes = [models.Index(fields=['-date', '-id']), models.Index(fields=['article', '-date'])]
+
+
+class NewsSearchTerm(models.Model):
+    term = models.CharField(max_length=50)
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.FloatField()
+
+    class Meta:
+        index_together = ('term', 'article')
+
 
 class League(models.Model):
     name = models.CharField(max_length=30)
-    type = models.CharField(max_length=10)
+    type = models.PositiveSmallIntegerField(choices=SPORTS, default=FOOTBALL, db_index=True)
     is_ongoing = models.BooleanField(default=True)
     start_date = models.DateField()
-    logo = models.ImageField(upload_to='../media/leagues')
+    logo = models.ImageField(upload_to='leagues')
 
     def __str__(self):
         return self.name + str(self.start_date.year)
 
 
 class Team(models.Model):
-    name = models.CharField(max_length=50)
-    type = models.CharField(max_length=10)
-    logo = models.ImageField(upload_to='../media/teams')
+    name = models.CharField(max_length=50, db_index=True)
+    slug = models.SlugField(max_length=60, unique=True, allow_unicode=True, blank=True)
+    type = models.PositiveSmallIntegerField(choices=SPORTS, default=FOOTBALL, db_index=True)
+    logo = models.ImageField(upload_to='teams')
     leagues = models.ManyToManyField(League)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = Team.unique_slug(
+                self.name, lambda slug: Team.objects.filter(slug=slug).exclude(pk=self.pk).exists())
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def unique_slug(name, taken):
+        """Slug of `name`, numbered until `taken(slug)` is false."""
+        base = slugify(name, allow_unicode=True)[:50] or 'team'
+        slug, suffix = base, 1
+        while taken(slug):
+            suffix += 1
+            slug = '%s-%d' % (base, suffix)
+        return slug
+
+    @classmethod
+    def resolve(cls, value):
+        """Team id for a slug, a numeric id or an exact name, None if unknown."""
+        lookups = [{'slug': value}, {'name': value}]
+        if value.isdigit():
+            lookups.insert(0, {'pk': int(value)})
+        for lookup in lookups:
+            team_id = cls.objects.filter(**lookup).values_list('pk', flat=True).first()
+            if team_id is not None:
+                return team_id
+        return None
+
 
 class CoachingStaff(models.Model):
     team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name='coaching_staff')
@@ -80,7 +140,7 @@ class Player(models.Model):
     height = models.IntegerField()
     weight = models.FloatField()
     nationality = models.CharField(max_length=50)
-    image = models.ImageField(upload_to='../media/players')
+    image = models.ImageField(upload_to='players')
 
     def __str__(self):
         return self.name
@@ -90,6 +150,9 @@ class PlayerSeason(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='stats')
     season = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [models.Index(fields=['season', 'player'])]
+
 
 class PlayerStat(models.Model):
     player_season = models.ForeignKey(PlayerSeason, on_delete=models.CASCADE, related_name='stats')
@@ -109,15 +172,11 @@ class TeamPosition(models.Model):
 class Match(models.Model):
     team1 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='team1')
     team2 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='team2')
-    type = models.CharField(max_length=10)
+    type = models.PositiveSmallIntegerField(choices=SPORTS, default=FOOTBALL)
     score1 = models.IntegerField()
     score2 = models.IntegerField()
     has_commentary = models.BooleanField(default=False)
     date = models.DateTimeField()
-    player1 = models.ManyToManyField(TeamPosition, related_name='player1')
-    player2 = models.ManyToManyField(TeamPosition, related_name='player2')
-    sub1 = models.ManyToManyField(TeamPosition, related_name='sub1')
-    sub2 = models.ManyToManyField(TeamPosition, related_name='sub2')
     league = models.ForeignKey(League, on_delete=models.CASCADE)
 
     def __str__(self):
@@ -126,6 +185,37 @@ class Match(models.Model):
     class Meta:
         verbose_name_plural = 'Matches'
         ordering = ['-date']
+        # Newest first with the pagination's id tiebreak (lists, the admin's
+        # ongoing filter) and a league's season in date order (standings,
+        # exports). A team's matches are an OR of the team1 and team2 foreign
+        # key indexes.
+        indexes = [
+            models.Index(fields=['-date', '-id']),
+            models.Index(fields=['league', 'date']),
+            models.Index(fields=['type', '-date']),
+        ]
+
+
+class MatchLineup(models.Model):
+    STARTER, SUBSTITUTE = 1, 2
+    ROLES = ((STARTER, 'Starter'), (SUBSTITUTE, 'Substitute'))
+    SIDES = ((1, 'Team 1'), (2, 'Team 2'))
+    # The lineup lists of the match API: name, side, role.
+    LISTS = (('player1', 1, STARTER), ('player2', 2, STARTER), ('sub1', 1, SUBSTITUTE), ('sub2', 2, SUBSTITUTE))
+
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='lineups')
+    side = models.PositiveSmallIntegerField(choices=SIDES)
+    role = models.PositiveSmallIntegerField(choices=ROLES)
+    order = models.PositiveSmallIntegerField(default=0)
+    shirt_number = models.PositiveSmallIntegerField(null=True, blank=True)
+    team_position = models.ForeignKey(TeamPosition, on_delete=models.CASCADE, related_name='lineups')
+
+    def __str__(self):
+        return '%s: %s' % (self.match_id, self.team_position_id)
+
+    class Meta:
+        ordering = ['match_id', 'side', 'role', 'order']
+        indexes = [models.Index(fields=['match', 'side', 'role', 'order'])]
 
 
 class MatchEvent(models.Model):
@@ -173,15 +263,23 @@ class UserFollowPlayer(models.Model):
 class LeagueStanding(models.Model):
     league = models.ForeignKey(League, on_delete=models.CASCADE, related_name='standings')
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
-    score = models.IntegerField()
+    score = models.IntegerField(default=0)
+    played = models.IntegerField(default=0)
+    won = models.IntegerField(default=0)
+    drawn = models.IntegerField(default=0)
+    lost = models.IntegerField(default=0)
+    goals_for = models.IntegerField(default=0)
+    goals_against = models.IntegerField(default=0)
 
     class Meta:
         ordering = ['-score']
+        unique_together = ('league', 'team')
+        indexes = [models.Index(fields=['league', '-score'])]
 
 
 class MatchImages(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='../media/matches', blank=True, null=True)
+    image = models.ImageField(upload_to='matches', blank=True, null=True)
     caption = models.CharField(max_length=300)
 
 
@@ -189,3 +287,77 @@ class MatchVideos(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='videos')
     video = models.URLField(blank=True, null=True)
     caption = models.CharField(max_length=300)
+
+
+class IngestSequence(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    feed = models.CharField(max_length=50)
+    last_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'feed')
+
+
+class FeedItem(models.Model):
+    KINDS = (
+        ('match', 'Match'),
+        ('event', 'Match Event'),
+        ('news', 'News'),
+    )
+
+    # Rows with a user were fanned out on write to one follower. Rows
+    # without a user belong to a popular team or player and are merged into
+    # the followers' feeds on read.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, null=True, blank=True)
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, null=True, blank=True)
+    event = models.ForeignKey(MatchEvent, on_delete=models.CASCADE, null=True, blank=True)
+    article = models.ForeignKey(NewsArticle, on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-date']
+        index_together = (('user', 'date'), ('team', 'date'), ('player', 'date'))
+
+
+class ImportProgress(models.Model):
+    # Records of `source` committed by manage.py import_season, the next run
+    # resumes after them.
+    source = models.CharField(max_length=255, unique=True)
+    rows = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '%s: %d' % (self.source, self.rows)
+
+
+class ArchivedLeague(models.Model):
+    # A finished league that manage.py archive_season moved, with its
+    # matches, to the archive database. Kept in the default database so
+    # requests know where to look without touching the archive.
+    league_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=30)
+    season = models.IntegerField(db_index=True)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name + str(self.season)
+
+
+class RequestProfile(models.Model):
+    # A staff request run with ?profile, see SportsApp.profiler. `stacks`
+    # holds folded stacks weighted by microseconds of self time.
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL)
+    created = models.DateTimeField(auto_now_add=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    status = models.IntegerField()
+    duration_ms = models.FloatField()
+    queries = models.IntegerField(null=True)
+    stacks = models.TextField()
+    summary = models.TextField()
+
+    def __str__(self):
+        return '%s %s' % (self.method, self.path)
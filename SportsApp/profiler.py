@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .models import RequestProfile
+
+
+def code_label(code, prefixes=()):
+    filename = code.co_filename
+    for prefix in prefixes:
+        if filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return '%s (%s:%d)' % (code.co_qualname if hasattr(code, 'co_qualname') else code.co_name,
+                           filename, code.co_firstlineno)
+
+
+def builtin_label(function):
+    owner = getattr(function, '__module__', None) or type(getattr(function, '__self__', None)).__name__
+    return '<built-in %s.%s>' % (owner, getattr(function, '__qualname__', function.__name__))
+
+
+class StackTracer(object):
+    """
+    sys.setprofile() hook recording the self time of every call stack of
+    the current thread, in microseconds, as folded stacks ("a;b;c 120"),
+    the input of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self.stacks = {}
+        # [path, started, time spent in callees] of the open calls.
+        self.frames = []
+        self.labels = {}
+        self.prefixes = sorted(set(path for path in [settings.BASE_DIR] + sys.path if path), key=len, reverse=True)
+
+    def __call__(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == 'call' or event == 'c_call':
+            key = frame.f_code if event == 'call' else arg
+            label = self.labels.get(key)
+            if label is None:
+                label = code_label(key, self.prefixes) if event == 'call' else builtin_label(key)
+                label = self.labels[key] = label.replace(';', ',')
+            parent = self.frames[-1][0] + ';' if self.frames else ''
+            self.frames.append([parent + label, now, 0.0])
+        elif self.frames:
+            # Returns of calls entered before the tracer was set are ignored.
+            path, started, callees = self.frames.pop()
+            elapsed = now - started
+            self.stacks[path] = self.stacks.get(path, 0.0) + elapsed - callees
+            if self.frames:
+                self.frames[-1][2] += elapsed
+
+    def run(self, function, *args):
+        sys.setprofile(self)
+        try:
+            return function(*args)
+        finally:
+            sys.setprofile(None)
+
+    def folded(self):
+        return '\n'.join('%s %d' % (path, round(seconds * 1e6))
+                         for path, seconds in sorted(self.stacks.items()) if seconds >= 1e-6)
+
+
+def summarize(folded, limit=40):
+    """Functions with the most self and total time, from folded stacks."""
+    own, total = {}, {}
+    for line in folded.splitlines():
+        path, weight = line.rsplit(' ', 1)
+        frames = path.split(';')
+        own[frames[-1]] = own.get(frames[-1], 0) + int(weight)
+        for name in set(frames):
+            total[name] = total.get(name, 0) + int(weight)
+    lines = ['%10s %10s  %s' % ('self ms', 'total ms', 'function')]
+    for name, weight in sorted(own.items(), key=lambda item: -item[1])[:limit]:
+        lines.append('%10.2f %10.2f  %s' % (weight / 1000, total[name] / 1000, name))
+    return '\n'.join(lines)
+
+
+def flame_rows(folded, min_width=0.002):
+    """Icicle rows for the admin view: per depth, (name, left, width) as fractions of the whole."""
+    tree = {}
+    whole = 0
+    for line in folded.splitlines():
+        path, weight = line.rsplit(' ', 1)
+        weight = int(weight)
+        whole += weight
+        node = tree
+        for name in path.split(';'):
+            child = node.setdefault(name, [0, {}])
+            child[0] += weight
+            node = child[1]
+    rows = []
+
+    def walk(children, depth, left):
+        for name, (weight, grandchildren) in sorted(children.items()):
+            width = weight / whole
+            if width >= min_width:
+                while len(rows) <= depth:
+                    rows.append([])
+                rows[depth].append((name, left, width))
+                walk(grandchildren, depth + 1, left)
+            left += width
+    if whole:
+        walk(tree, 0, 0.0)
+    return rows
+
+
+class ProfilerMiddleware(object):
+    """
+    Profiles a request of a staff user carrying PROFILE_PARAM in its query
+    string (?profile) and stores the stacks as a RequestProfile, listed in
+    the admin. Other requests only pay for a substring check. Streaming
+    responses are profiled up to the start of the stream.
+    """
+
+    def __init__(self, get_response):
+        self.param = getattr(settings, 'PROFILE_PARAM', 'profile')
+        if not self.param:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.param not in request.META.get('QUERY_STRING', '') or self.param not in request.GET \
+                or not request.user.is_staff:
+            return self.get_response(request)
+
+        tracer = StackTracer()
+        started = time.perf_counter()
+        response = tracer.run(self.get_response, request)
+        duration = time.perf_counter() - started
+        counter = getattr(request, '_query_counter', None)
+        folded = tracer.folded()
+        with ExitStack() as stack:
+            if counter is not None:
+                stack.enter_context(counter.pause())
+            profile = RequestProfile.objects.create(
+                user=request.user, method=request.method, path=request.get_full_path()[:255],
+                status=response.status_code, duration_ms=duration * 1000,
+                queries=counter.count if counter is not None else None,
+                stacks=folded, summary=summarize(folded))
+            keep = getattr(settings, 'PROFILE_KEEP', 200)
+            stale = RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[keep:keep + 1]
+            if stale:
+                RequestProfile.objects.filter(pk__lte=stale[0]).delete()
+        response['X-Profile'] = profile.pk
+        return response
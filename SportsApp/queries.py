@@ -0,0 +1,133 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+# A fetch plan is derived once per serializer class by walking its field tree:
+# forward FKs / one-to-ones become select_related paths, nested many=True
+# serializers and many related fields become Prefetch objects whose querysets
+# carry the plan of the nested serializer (e.g. TeamPosition -> Player).
+
+
+def _related_field(model, source):
+    if not source or '.' in source or source == '*':
+        return None
+    try:
+        field = model._meta.get_field(source)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _plan(serializer):
+    model = serializer.Meta.model
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        custom = getattr(field, 'get_fetch_plan', None)
+        if custom is not None:
+            s, p = custom()
+            select += s
+            prefetch += p
+            continue
+        relation = _related_field(model, field.source)
+        if relation is None:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.append(_nested_prefetch(field.source, field.child))
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.append((field.source, relation.related_model, (), ()))
+        elif isinstance(field, serializers.ModelSerializer):
+            if relation.many_to_many or relation.one_to_many:
+                prefetch.append(_nested_prefetch(field.source, field))
+                continue
+            s, p = _plan(field)
+            select.append(field.source)
+            select += ['%s__%s' % (field.source, path) for path in s]
+            prefetch += [('%s__%s' % (field.source, path), m, ps, pn) for path, m, ps, pn in p]
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            # The pk is read from the local `<name>_id` column, no join needed.
+            continue
+        elif isinstance(field, serializers.RelatedField):
+            if relation.many_to_many or relation.one_to_many:
+                prefetch.append((field.source, relation.related_model, (), ()))
+            else:
+                select.append(field.source)
+    return select, prefetch
+
+
+def _nested_prefetch(source, child):
+    s, p = _plan(child)
+    return source, child.Meta.model, tuple(s), tuple(p)
+
+
+@lru_cache(maxsize=None)
+def get_fetch_plan(serializer_class):
+    select, prefetch = _plan(serializer_class())
+    # Fields sharing one relation (the lineup lists of a match) prefetch it once.
+    unique = {}
+    for plan in prefetch:
+        unique.setdefault(plan[0], plan)
+    return tuple(dict.fromkeys(select)), tuple(unique.values())
+
+
+def _build_prefetch(path, model, select, nested):
+    queryset = model._default_manager.all()
+    if select:
+        queryset = queryset.select_related(*select)
+    if nested:
+        queryset = queryset.prefetch_related(*[_build_prefetch(*n) for n in nested])
+    return Prefetch(path, queryset=queryset)
+
+
+def apply_fetch_plan(queryset, serializer_class):
+    select, prefetch = get_fetch_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*[_build_prefetch(*p) for p in prefetch])
+    return queryset
+
+
+class FetchPlanMixin(object):
+    """Applies the serializer's fetch plan to every queryset the view serves."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return apply_fetch_plan(queryset, self.get_serializer_class())
+
+
+def related_instances(instance, serializer):
+    """
+    Yield `instance` and every model instance `serializer` renders with
+    it, reading the relations through the caches the fetch plan filled.
+    """
+    yield instance
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        custom = getattr(field, 'get_related_instances', None)
+        if custom is not None:
+            yield from custom(instance)
+            continue
+        if _related_field(type(instance), field.source) is None:
+            continue
+        value = getattr(instance, field.source, None)
+        if value is None:
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            for item in value.all():
+                yield from related_instances(item, field.child)
+        elif isinstance(field, serializers.ModelSerializer):
+            if hasattr(value, 'all'):
+                for item in value.all():
+                    yield from related_instances(item, field)
+            else:
+                yield from related_instances(value, field)
+        elif isinstance(field, serializers.ManyRelatedField):
+            yield from value.all()
+        elif isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+            yield value
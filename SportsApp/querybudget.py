@@ -0,0 +1,133 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    """
+    Declare the most queries a view may run per request, or a dict of them
+    per HTTP method ({'GET': 4, 'POST': 8}, unlisted methods are not
+    checked). Works on function views and view classes, for which
+    `query_budget = n` does the same.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def add_to_budget(request, queries):
+    """Raise the budget of this request, for views whose work grows with the input."""
+    view = getattr(getattr(request, '_request', request), '_query_view', None)
+    if view is not None and view['budget'] is not None:
+        view['budget'] += queries
+
+
+def get_budget(view_func, method):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        # DRF's as_view() keeps the view class as `cls`.
+        budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(method)
+    return budget
+
+
+class QueryCounter(object):
+    """Database execute wrapper counting the queries and time they take."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.paused = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.paused:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+    @contextmanager
+    def pause(self):
+        """Leave out queries that are not the request's own, like the profiler's."""
+        self.paused = True
+        try:
+            yield
+        finally:
+            self.paused = False
+
+
+class QueryBudgetMiddleware(object):
+    """
+    Counts the queries and SQL time of every request and splits the rest
+    into view time (serializers, for DRF views) and rendering. The numbers
+    are sent as a Server-Timing header (SERVER_TIMING) and logged with
+    QUERY_TIMING_LOG. A view going over its query budget is logged as a
+    warning, or raises QueryBudgetExceeded with QUERY_BUDGET_ACTION = 'raise'.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        request._query_counter = counter
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        timings = [('db', counter.duration, '%d queries' % counter.count)]
+        view = getattr(request, '_query_view', None)
+        if view is not None and 'end' in view:
+            view_time = view['end'] - view['start']
+            timings.append(('view', view_time - (view['db_end'] - view['db_start']), None))
+            timings.append(('render', total - (view['end'] - started), None))
+        timings.append(('total', total, None))
+
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join(
+                '%s;dur=%.2f%s' % (name, value * 1000, ';desc="%s"' % desc if desc else '')
+                for name, value, desc in timings)
+        if getattr(settings, 'QUERY_TIMING_LOG', False):
+            logger.info('%s %s %s', request.method, request.path,
+                        ' '.join('%s=%.2fms' % (name, value * 1000) for name, value, desc in timings),
+                        extra={'queries': counter.count})
+
+        budget = view['budget'] if view else None
+        if budget is not None and counter.count > budget:
+            message = '%s %s ran %d queries, over its budget of %d.' % (
+                request.method, request.path, counter.count, budget)
+            if getattr(settings, 'QUERY_BUDGET_ACTION', 'warn') == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        counter = getattr(request, '_query_counter', None)
+        if counter is not None:
+            request._query_view = {'budget': get_budget(view_func, request.method), 'start': time.perf_counter(),
+                                   'db_start': counter.duration}
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this, so here the view is done.
+        view = getattr(request, '_query_view', None)
+        if view is not None:
+            view['end'] = time.perf_counter()
+            view['db_end'] = request._query_counter.duration
+        return response
@@ -0,0 +1,65 @@
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import benchmark, responsecache
+
+# SQLite's EXPLAIN QUERY PLAN says "SCAN <table>" for a full table scan and
+# "SCAN <table> USING [COVERING] INDEX" when it walks an index instead.
+# "subquery" is the derived table Django wraps counts of distinct rows in.
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS \S+)?$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\S+)')
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute('EXPLAIN ' + sql)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def problems(sql, plan):
+    """
+    Full scans of filtered queries and sorts of limited ones. Scanning the
+    whole table is what an unfiltered list or count has to do, so those are
+    not flagged.
+    """
+    found = []
+    filtered = ' WHERE ' in sql
+    for line in plan:
+        line = line.strip()
+        match = SQLITE_SCAN_RE.match(line) or POSTGRES_SCAN_RE.search(line)
+        if match and filtered and match.group(1) not in ('CONSTANT', 'subquery'):
+            found.append('full scan of %s' % match.group(1))
+        elif 'TEMP B-TREE FOR ORDER BY' in line and ' LIMIT ' in sql:
+            found.append('sort without an index')
+    return found
+
+
+def check(only=None):
+    """(endpoint, sql, plan, problems) of every distinct SELECT the endpoints run."""
+    anonymous = Client()
+    user = User.objects.filter(userfollowteam__isnull=False).order_by('pk').first()
+    member = Client()
+    if user is not None:
+        member.force_login(user)
+
+    seen = set()
+    for name, url, login in benchmark.endpoints():
+        if (only and name not in only) or (login and user is None):
+            continue
+        responsecache.get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            (member if login else anonymous).get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or sql in seen:
+                continue
+            seen.add(sql)
+            plan = explain(sql)
+            yield name, sql, plan, problems(sql, plan)
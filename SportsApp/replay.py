@@ -0,0 +1,121 @@
+import glob
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import Client
+
+from .benchmark import percentile
+
+
+def read_log(paths, methods=('GET', 'HEAD')):
+    """Captured records of `paths` (files, directories or globs) in time order."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += glob.glob(os.path.join(path, 'traffic-*.jsonl*'))
+        else:
+            files += glob.glob(path) or [path]
+    records = []
+    for name in files:
+        with open(name, encoding='utf-8') as file:
+            records += [record for record in map(json.loads, filter(str.strip, file)) if record['method'] in methods]
+    return sorted(records, key=lambda record: record['time'])
+
+
+class Replayer(object):
+    """
+    Plays captured requests back at their recorded pace divided by
+    `speedup`, on `concurrency` threads, either against a running server
+    (`target` URL) or in process through the Django test client.
+    Authenticated records are sent with `authorization` (HTTP) or as
+    `user` (test client); without them they are sent anonymously.
+    """
+
+    def __init__(self, target=None, concurrency=10, speedup=1.0, authorization=None, user=None, timeout=30):
+        self.target = target.rstrip('/') if target else None
+        self.concurrency = concurrency
+        self.speedup = speedup
+        self.authorization = authorization
+        self.user = user
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def client(self, authenticated):
+        key = 'member' if authenticated else 'anonymous'
+        if not hasattr(self.local, key):
+            client = Client()
+            if authenticated:
+                client.force_login(self.user)
+            setattr(self.local, key, client)
+        return getattr(self.local, key)
+
+    def send(self, record):
+        url = record['path'] + ('?' + record['query'] if record['query'] else '')
+        authenticated = record.get('auth', 'anonymous') != 'anonymous'
+        started = time.perf_counter()
+        if self.target:
+            request = urllib.request.Request(self.target + url, method=record['method'])
+            if authenticated and self.authorization:
+                request.add_header('Authorization', self.authorization)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            except OSError:
+                status = None
+        else:
+            client = self.client(authenticated and self.user is not None)
+            response = getattr(client, record['method'].lower())(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            status = response.status_code
+        return status, time.perf_counter() - started
+
+    def run(self, records, limit=None):
+        records = records[:limit] if limit else records
+        if not records:
+            return []
+        first = records[0]['time']
+        started = time.perf_counter()
+
+        def play(record):
+            delay = (record['time'] - first) / self.speedup - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            lag = max(0.0, -delay)
+            status, elapsed = self.send(record)
+            return record, status, elapsed, lag
+
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            return list(executor.map(play, records))
+
+
+def summarize(results):
+    """Latency distribution per route, plus every route together under "*"."""
+    routes = {}
+    for record, status, elapsed, lag in results:
+        route = record.get('route') or record['path']
+        for key in (route, '*'):
+            routes.setdefault(key, []).append((status, elapsed * 1000, lag * 1000, record.get('duration_ms')))
+    summary = {}
+    for route, samples in sorted(routes.items()):
+        latencies = [elapsed for status, elapsed, lag, recorded in samples]
+        recorded = [value for status, elapsed, lag, value in samples if value is not None]
+        summary[route] = {
+            'requests': len(samples),
+            'errors': sum(1 for status, elapsed, lag, value in samples if status is None or status >= 500),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(max(latencies), 3),
+            'recorded_p95_ms': round(percentile(recorded, 0.95), 3) if recorded else None,
+            'max_lag_ms': round(max(lag for status, elapsed, lag, value in samples), 3),
+        }
+    return summary
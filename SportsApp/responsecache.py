@@ -0,0 +1,126 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import metrics, versions
+from .queries import related_instances
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE', 'default')]
+
+
+class CachedResponseMixin(object):
+    """
+    Caches the rendered bytes of list and detail responses per URL, query
+    string, Accept header and user. Every entry remembers the version tokens
+    of what it contains: the view's collection for lists, the object for
+    details, plus every team, player, league, ... rendered inside. A save
+    of any of those bumps its token and the entry stops validating.
+
+    Concurrent misses for one key are collapsed: the first request takes a
+    lock entry with `cache.add` and renders, the others wait for its result
+    for up to `API_CACHE_LOCK_WAIT` seconds before rendering themselves.
+
+    Uses the `etag_collections` of ConditionalGetMixin, the first one is
+    the collection the view lists.
+    """
+    etag_collections = ()
+
+    def get_cache_key(self, request):
+        scope = 'user:%s' % request.user.pk if request.user.is_authenticated else 'anonymous'
+        parts = [request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), scope]
+        return 'response:%s' % hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+    def get_cached(self, key):
+        entry = get_cache().get(key)
+        if entry is None:
+            return None
+        tags = list(entry['tags'])
+        if versions.get_versions(tags) != [entry['tags'][tag] for tag in tags]:
+            return None
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def wait_for(self, key):
+        deadline = time.monotonic() + getattr(settings, 'API_CACHE_LOCK_WAIT', 5)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = self.get_cached(key)
+            if response is not None:
+                return response
+            if get_cache().get(key + ':lock') is None:
+                return None
+        return None
+
+    def cached(self, request, handler, *args, **kwargs):
+        key = self.get_cache_key(request)
+        response = self.get_cached(key)
+        metrics.cache_requests.inc(cache='api', result='miss' if response is None else 'hit')
+        if response is not None:
+            return response
+
+        self._cache_locked = get_cache().add(key + ':lock', 1, getattr(settings, 'API_CACHE_LOCK_WAIT', 5))
+        if not self._cache_locked:
+            response = self.wait_for(key)
+            if response is not None:
+                return response
+        self._cache_key = key
+        self._cache_instances = []
+        self._cache_collection_tags = [versions.version_key(collection) for collection in self.etag_collections]
+        self._cache_before = versions.get_versions(self._cache_collection_tags)
+        return handler(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if getattr(self, '_cache_key', None) and args:
+            self._cache_instances.append((args[0], serializer))
+        return serializer
+
+    def get_tags(self):
+        tags = set()
+        if self.etag_collections and self.kwargs.get(self.lookup_url_kwarg or self.lookup_field) is None:
+            tags.add(versions.version_key(self.etag_collections[0]))
+        for instances, serializer in self._cache_instances:
+            child = getattr(serializer, 'child', serializer)
+            for instance in instances if getattr(serializer, 'many', False) else [instances]:
+                for related in related_instances(instance, child):
+                    tag = versions.instance_key(related)
+                    if tag:
+                        tags.add(tag)
+        return sorted(tags)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, '_cache_key', None)
+        if key is None:
+            return response
+        self._cache_key = None
+        cache = get_cache()
+        try:
+            # A write committed while this response was built: its tokens
+            # may postdate the data we read, so the result is not stored.
+            if response.status_code == 200 and hasattr(response, 'render') and \
+                    versions.get_versions(self._cache_collection_tags) == self._cache_before:
+                response.render()
+                tags = self.get_tags()
+                cache.set(key, {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'tags': dict(zip(tags, versions.get_versions(tags))),
+                }, getattr(settings, 'API_CACHE_TIMEOUT', 300))
+                response['X-Cache'] = 'MISS'
+        finally:
+            if self._cache_locked:
+                cache.delete(key + ':lock')
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, super().retrieve, *args, **kwargs)
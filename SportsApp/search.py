@@ -0,0 +1,161 @@
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.utils.html import escape
+
+from . import versions
+from .models import NewsArticle, NewsSearchTerm
+
+# Arabic code points that Persian text is often typed with, and digits.
+CHARACTER_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4', '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4', '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+# Harakat, superscript alef, tatweel and the zero width non-joiner. Removing
+# the ZWNJ joins half-spaced words, so "می‌رود" and "میرود" index the same.
+IGNORED = '\u064b-\u065f\u0670\u0640\u200c'
+IGNORED_RE = re.compile('[%s]' % IGNORED)
+WORD_RE = re.compile(r'\w+')
+
+STOP_WORDS = {
+    'و', 'در', 'به', 'از', 'که', 'را', 'این', 'آن', 'با', 'است', 'بود', 'برای', 'تا', 'یا', 'هم', 'شد', 'می',
+    'the', 'and', 'of', 'to', 'in', 'a', 'is',
+}
+
+FIELD_WEIGHTS = (
+    ('title', 3.0),
+    ('description', 1.5),
+    ('text', 1.0),
+)
+TAG_WEIGHT = 2.0
+
+# Article count and article frequency of the searched terms, dropped
+# whenever the index changes.
+FREQUENCIES_KEY = 'search:frequencies'
+MAX_FREQUENCIES = 5000
+
+
+def normalize(text):
+    return IGNORED_RE.sub('', text.translate(CHARACTER_MAP)).lower()
+
+
+def tokenize(text):
+    return [word for word in WORD_RE.findall(normalize(text)) if word not in STOP_WORDS and len(word) > 1]
+
+
+def index_article(article):
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for term in tokenize(getattr(article, field) or ''):
+            weights[term] += weight
+    for tag in article.tags.all():
+        for term in tokenize(tag.name):
+            weights[term] += TAG_WEIGHT
+    for term in tokenize(article.get_type_display() or ''):
+        weights[term] += 1.0
+
+    NewsSearchTerm.objects.filter(article=article).delete()
+    NewsSearchTerm.objects.bulk_create([
+        # Damp long articles repeating a word, like BM25's term saturation.
+        NewsSearchTerm(article=article, term=term[:50], weight=round(1 + math.log(weight), 4))
+        for term, weight in weights.items()
+    ])
+    forget_frequencies()
+
+
+def forget_frequencies():
+    versions.get_cache().delete(FREQUENCIES_KEY)
+    # Again once committed, in case a search cached the old counts meanwhile.
+    transaction.on_commit(lambda: versions.get_cache().delete(FREQUENCIES_KEY))
+
+
+def term_lookup(term, prefix=False):
+    # A range rather than LIKE, so SQLite can seek the term index.
+    term = term[:50]
+    return {'term__gte': term, 'term__lt': term + '\uffff'} if prefix else {'term': term}
+
+
+def frequencies(lookups):
+    """
+    Number of articles, and of articles matching each of `lookups`, counted
+    once per index change.
+    """
+    cache = versions.get_cache()
+    cached = cache.get(FREQUENCIES_KEY) or {}
+    keys = [tuple(sorted(lookup.items())) for lookup in lookups]
+    if 'total' not in cached or any(key not in cached for key in keys):
+        if len(cached) > MAX_FREQUENCIES:
+            cached = {}
+        if 'total' not in cached:
+            cached['total'] = NewsArticle.objects.count()
+        for key in keys:
+            if key not in cached:
+                cached[key] = NewsSearchTerm.objects.filter(**dict(key)).values('article').distinct().count()
+        cache.set(FREQUENCIES_KEY, cached, None)
+    return cached['total'], [cached[key] for key in keys]
+
+
+def search_articles(queryset, query):
+    """
+    Filter `queryset` to the articles containing every word of `query` (the
+    last one as a prefix, for search-as-you-type) and annotate it with a
+    tf-idf style `search_rank`, ordered by relevance then date.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return queryset
+    lookups = [term_lookup(term) for term in terms[:-1]] + [term_lookup(terms[-1], prefix=True)]
+    prefixed = [Q(**{'search_terms__' + key: value for key, value in lookup.items()}) for lookup in lookups]
+
+    total, counts = frequencies(lookups)
+    whens, hits = [], []
+    for index, (condition, frequency) in enumerate(zip(prefixed, counts)):
+        idf = math.log(1 + (total or 1) / (frequency or 1))
+        whens.append(When(condition, then=F('search_terms__weight') * Value(idf)))
+        hits.append(When(condition, then=Value(index)))
+
+    condition = Q()
+    for lookup in prefixed:
+        condition |= lookup
+    return queryset.filter(condition).annotate(
+        search_rank=Sum(Case(*whens, output_field=FloatField())),
+        search_hits=Count(Case(*hits), distinct=True),
+    ).filter(search_hits=len(terms)).order_by('-search_rank', '-date')
+
+
+def _term_pattern(term, prefix):
+    variants = {}
+    for source, target in CHARACTER_MAP.items():
+        variants.setdefault(target, {target}).add(chr(source))
+    parts = []
+    for char in term:
+        options = variants.get(char, {char})
+        parts.append('[%s]' % ''.join(re.escape(option) for option in sorted(options)))
+    pattern = ('[%s]*' % IGNORED).join(parts)
+    return r'(?<!\w)%s%s' % (pattern, r'\w*' if prefix else r'(?!\w)')
+
+
+def snippet(text, query, width=160):
+    """Escaped excerpt of `text` around the first match, matches in <mark>."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or not text:
+        return None
+    patterns = [_term_pattern(term, index == len(terms) - 1) for index, term in enumerate(terms)]
+    matcher = re.compile('|'.join('(?:%s)' % pattern for pattern in patterns), re.IGNORECASE)
+    first = matcher.search(text)
+    start = max(0, first.start() - width // 3) if first else 0
+    end = min(len(text), start + width)
+    excerpt = text[start:end]
+
+    parts, position = [], 0
+    for match in matcher.finditer(excerpt):
+        parts.append(escape(excerpt[position:match.start()]))
+        parts.append('<mark>%s</mark>' % escape(match.group()))
+        position = match.end()
+    parts.append(escape(excerpt[position:]))
+    return '%s%s%s' % ('…' if start else '', ''.join(parts), '…' if end < len(text) else '')
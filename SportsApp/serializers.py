@@ -1,10 +1,43 @@
+import json
+
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
+from . import images, search
+from .queries import get_fetch_plan, related_instances
 from .models import *
+from django.conf import settings
 from django.contrib.auth.models import User
 
 
+class ImageSrcsetField(serializers.Field):
+    """Original and derivative URLs of an image field, see images.srcset."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return images.srcset(value, request.build_absolute_uri if request else None)
+
+
+class SportField(serializers.ChoiceField):
+    """Sport as its Persian name, accepting the id or an English name too."""
+
+    def __init__(self, **kwargs):
+        super().__init__(SPORTS, **kwargs)
+
+    def to_representation(self, value):
+        return dict(SPORTS).get(value, value)
+
+    def to_internal_value(self, data):
+        sport = parse_sport(data)
+        if sport is None:
+            self.fail('invalid_choice', input=data)
+        return sport
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -60,13 +93,30 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ('user', 'name', 'text', 'date')
 
 
+class CommentCreateSerializer(serializers.Serializer):
+    article = serializers.IntegerField()
+    name = serializers.CharField(max_length=100)
+    text = serializers.CharField()
+
+
 class NewsArticleSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
-    comments = CommentSerializer(many=True)
+    image_srcset = ImageSrcsetField(source='image')
+    latest_comments = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+
+    def get_latest_comments(self, obj):
+        return json.loads(obj.latest_comments)
+
+    def get_snippet(self, obj):
+        request = self.context.get('request')
+        query = request.query_params.get('search') if request else None
+        return search.snippet(obj.text, query) if query else None
 
     class Meta:
         model = NewsArticle
-        fields = ('id', 'title', 'description', 'text', 'date', 'tags', 'comments', 'image')
+        fields = ('id', 'title', 'description', 'text', 'date', 'tags', 'comment_count', 'latest_comments', 'image',
+                  'image_srcset', 'snippet')
 
 
 class TeamPositionSerializer(serializers.ModelSerializer):
@@ -109,6 +159,7 @@ class PlayerSeasonSerializer(serializers.ModelSerializer):
 class PlayerSerializer(serializers.ModelSerializer):
     teams = TeamPositionSerializer(many=True)
     stats = PlayerSeasonSerializer(many=True)
+    image_srcset = ImageSrcsetField(source='image')
 
     class Meta:
         model = Player
@@ -122,9 +173,11 @@ class CoachingStaffSerializer(serializers.ModelSerializer):
 
 
 class TeamSerializer(serializers.ModelSerializer):
+    type = SportField()
     players = PlayerPositionSerializer(many=True)
     leagues = serializers.SlugRelatedField(read_only=True, slug_field='name', many=True)
     coaching_staff = CoachingStaffSerializer(required=True)
+    logo_srcset = ImageSrcsetField(source='logo')
 
     class Meta:
         model = Team
@@ -144,15 +197,19 @@ class MatchEventsSerializer(serializers.ModelSerializer):
 
 
 class MatchTeamSerializer(serializers.ModelSerializer):
+    logo_srcset = ImageSrcsetField(source='logo')
+
     class Meta:
         model = Team
-        fields = ('id', 'name', 'logo')
+        fields = ('id', 'name', 'slug', 'logo', 'logo_srcset')
 
 
 class MatchImagesSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image')
+
     class Meta:
         model = MatchImages
-        fields = ('image', 'caption')
+        fields = ('image', 'image_srcset', 'caption')
 
 
 class MatchVideosSerializer(serializers.ModelSerializer):
@@ -161,13 +218,55 @@ class MatchVideosSerializer(serializers.ModelSerializer):
         fields = ('video', 'caption')
 
 
+class LineupField(serializers.Field):
+    """
+    One lineup list (player1, sub2, ...) of a match. Every list of every
+    match in the queryset comes from a single prefetch of `lineups`, which
+    is grouped by side and role once per match.
+    """
+
+    def __init__(self, side, role, **kwargs):
+        self.side, self.role = side, role
+        self.child = PlayerPositionSerializer()
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_lineup(self, match):
+        groups = getattr(match, '_lineup_groups', None)
+        if groups is None:
+            groups = match._lineup_groups = {}
+            for lineup in match.lineups.all():
+                groups.setdefault((lineup.side, lineup.role), []).append(lineup)
+        return groups.get((self.side, self.role), [])
+
+    def to_representation(self, match):
+        result = []
+        for lineup in self.get_lineup(match):
+            data = self.child.to_representation(lineup.team_position)
+            data['shirt_number'] = lineup.shirt_number
+            result.append(data)
+        return result
+
+    def get_fetch_plan(self):
+        select, prefetch = get_fetch_plan(type(self.child))
+        return [], [('lineups', MatchLineup, ('team_position',) + tuple('team_position__' + path for path in select),
+                     tuple(('team_position__' + path, model, s, p) for path, model, s, p in prefetch))]
+
+    def get_related_instances(self, match):
+        for lineup in self.get_lineup(match):
+            yield lineup
+            yield from related_instances(lineup.team_position, self.child)
+
+
 class MatchSerializer(serializers.ModelSerializer):
+    type = SportField()
     team1 = MatchTeamSerializer(read_only=True)
     team2 = MatchTeamSerializer(read_only=True)
-    player1 = PlayerPositionSerializer(many=True)
-    player2 = PlayerPositionSerializer(many=True)
-    sub1 = PlayerPositionSerializer(many=True)
-    sub2 = PlayerPositionSerializer(many=True)
+    player1 = LineupField(1, MatchLineup.STARTER)
+    player2 = LineupField(2, MatchLineup.STARTER)
+    sub1 = LineupField(1, MatchLineup.SUBSTITUTE)
+    sub2 = LineupField(2, MatchLineup.SUBSTITUTE)
     league = serializers.SlugRelatedField(read_only=True, slug_field='name')
     events = MatchEventsSerializer(many=True)
     stats = MatchStatsSerializer(many=True)
@@ -184,11 +283,13 @@ class LeagueStandingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LeagueStanding
-        fields = ('team', 'score')
+        fields = ('team', 'score', 'played', 'won', 'drawn', 'lost', 'goals_for', 'goals_against')
 
 
 class LeagueSerializer(serializers.ModelSerializer):
+    type = SportField()
     standings = LeagueStandingSerializer(many=True)
+    logo_srcset = ImageSrcsetField(source='logo')
 
     class Meta:
         model = League
@@ -207,5 +308,75 @@ class UserPlayerSerializer(serializers.ModelSerializer):
     player = serializers.SlugRelatedField(read_only=True, slug_field='name')
 
     class Meta:
-        model = UserFollowTeam
+        model = UserFollowPlayer
         fields = ('player',)
+
+
+class IngestOperationSerializer(serializers.Serializer):
+    REQUIRED_FIELDS = {
+        'score': ('match',),
+        'match_stat': ('stat',),
+        'player_stat': ('stat',),
+        'event': ('match', 'title'),
+    }
+
+    seq = serializers.IntegerField(min_value=1)
+    op = serializers.ChoiceField(choices=tuple(REQUIRED_FIELDS))
+    match = serializers.IntegerField(required=False)
+    stat = serializers.IntegerField(required=False)
+    score1 = serializers.IntegerField(required=False)
+    score2 = serializers.IntegerField(required=False)
+    first = serializers.IntegerField(required=False)
+    second = serializers.IntegerField(required=False)
+    value = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=30, required=False)
+    comment = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    def validate(self, data):
+        missing = [name for name in self.REQUIRED_FIELDS[data['op']] if name not in data]
+        if missing:
+            raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        return data
+
+
+class IngestBatchSerializer(serializers.Serializer):
+    feed = serializers.CharField(max_length=50, default='default')
+    operations = IngestOperationSerializer(many=True)
+
+    def validate_operations(self, value):
+        if len(value) > settings.INGEST_MAX_OPERATIONS:
+            raise serializers.ValidationError('At most %d operations per batch.' % settings.INGEST_MAX_OPERATIONS)
+        return value
+
+
+class FeedMatchSerializer(serializers.ModelSerializer):
+    team1 = MatchTeamSerializer(read_only=True)
+    team2 = MatchTeamSerializer(read_only=True)
+
+    class Meta:
+        model = Match
+        fields = ('id', 'team1', 'team2', 'score1', 'score2', 'date')
+
+
+class FeedEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MatchEvent
+        fields = ('id', 'title', 'comment', 'time')
+
+
+class FeedArticleSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField(source='image')
+
+    class Meta:
+        model = NewsArticle
+        fields = ('id', 'title', 'description', 'image', 'image_srcset', 'date')
+
+
+class FeedItemSerializer(serializers.ModelSerializer):
+    match = FeedMatchSerializer(read_only=True)
+    event = FeedEventSerializer(read_only=True)
+    article = FeedArticleSerializer(read_only=True)
+
+    class Meta:
+        model = FeedItem
+        fields = ('kind', 'date', 'match', 'event', 'article')
@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import archive, autocomplete, comments, feed, images, search, standings, versions
+from .leaderboard import leaderboards
+from .live import publish_on_commit
+from .models import (ArchivedLeague, Comment, League, Match, MatchEvent, MatchStats, NewsArticle, Player, PlayerStat,
+                     Tag, Team)
+
+
+@receiver(post_init, sender=Match)
+def remember_match_score(sender, instance, **kwargs):
+    # Read through __dict__ so deferred fields are not loaded one by one.
+    instance._live_score = (instance.__dict__.get('score1'), instance.__dict__.get('score2'))
+    instance._standings_key = (instance.__dict__.get('league_id'), instance.__dict__.get('team1_id'),
+                               instance.__dict__.get('team2_id'))
+
+
+@receiver(post_save, sender=Match)
+def publish_match_score(sender, instance, created, **kwargs):
+    if not created and instance._live_score != (instance.score1, instance.score2):
+        publish_on_commit(instance.pk, 'score', {'score1': instance.score1, 'score2': instance.score2})
+    instance._live_score = (instance.score1, instance.score2)
+
+
+@receiver(post_save, sender=Match)
+def update_standings(sender, instance, raw=False, **kwargs):
+    if not raw:
+        standings.update_for_match(instance, instance._standings_key)
+    instance._standings_key = (instance.league_id, instance.team1_id, instance.team2_id)
+
+
+@receiver(post_delete, sender=Match)
+def remove_from_standings(sender, instance, **kwargs):
+    # Deferred to commit: when a league or team is deleted its matches are
+    # removed first and the rows we would rewrite are about to go as well.
+    transaction.on_commit(lambda: standings.update_for_match(instance, existing_only=True))
+
+
+@receiver(post_save, sender=Match)
+def fan_out_match(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.fan_out_match(instance)
+
+
+@receiver(post_save, sender=MatchEvent)
+def fan_out_match_event(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.fan_out_event(instance)
+
+
+@receiver(post_save, sender=MatchEvent)
+def publish_match_event(sender, instance, created, **kwargs):
+    if created:
+        publish_on_commit(instance.match_id, 'event', {
+            'id': instance.pk,
+            'title': instance.title,
+            'comment': instance.comment,
+            'time': instance.time.isoformat(),
+        })
+
+
+@receiver(post_init, sender=MatchStats)
+def remember_match_stats(sender, instance, **kwargs):
+    instance._live_stats = (instance.__dict__.get('first'), instance.__dict__.get('second'))
+
+
+@receiver(post_save, sender=MatchStats)
+def publish_match_stats(sender, instance, created, **kwargs):
+    first, second = (0, 0) if created else instance._live_stats
+    if created or (first, second) != (instance.first, instance.second):
+        publish_on_commit(instance.match_id, 'stats', {
+            'name': instance.name,
+            'first': instance.first,
+            'second': instance.second,
+            'first_delta': instance.first - first,
+            'second_delta': instance.second - second,
+        })
+    instance._live_stats = (instance.first, instance.second)
+
+
+@receiver(post_save, sender=NewsArticle)
+def index_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_article(instance)
+
+
+@receiver(post_delete, sender=NewsArticle)
+def forget_search_frequencies(sender, instance, **kwargs):
+    search.forget_frequencies()
+
+
+@receiver(m2m_changed, sender=NewsArticle.tags.through)
+def index_article_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        search.index_article(instance)
+        if action == 'post_add':
+            feed.fan_out_article(instance, pk_set)
+    elif pk_set:
+        for article in NewsArticle.objects.filter(pk__in=pk_set):
+            search.index_article(article)
+            if action == 'post_add':
+                feed.fan_out_article(article, [instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+def index_tag_articles(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        for article in instance.newsarticle_set.all():
+            search.index_article(article)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Player)
+@receiver(post_save, sender=League)
+def update_autocomplete(sender, instance, **kwargs):
+    autocomplete.index.update(sender.__name__.lower(), instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Player)
+@receiver(post_delete, sender=League)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.index.remove(sender.__name__.lower(), instance.pk)
+
+
+@receiver(post_save, sender=ArchivedLeague)
+@receiver(post_delete, sender=ArchivedLeague)
+@receiver(post_save, sender=League)
+@receiver(post_delete, sender=League)
+def forget_archived(sender, instance, **kwargs):
+    # A league of an archived season left in or added to the default
+    # database keeps that season there.
+    if instance._state.db != archive.database():
+        transaction.on_commit(archive.forget)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comments.comment_added(instance.article_id)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    comments.comment_removed(instance.article_id)
+
+
+@receiver(post_save, sender=PlayerStat)
+def update_leaderboard(sender, instance, **kwargs):
+    transaction.on_commit(lambda: leaderboards.stat_changed(instance.pk))
+
+
+@receiver(post_delete, sender=PlayerStat)
+def remove_from_leaderboard(sender, instance, **kwargs):
+    stat_id = instance.pk
+    transaction.on_commit(lambda: leaderboards.stat_removed(stat_id))
+
+
+def bump_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        versions.bump_instance(instance)
+
+
+for model in versions.DEPENDENCIES:
+    post_save.connect(bump_version, sender=model, dispatch_uid='bump_version_save_%s' % model.__name__)
+    post_delete.connect(bump_version, sender=model, dispatch_uid='bump_version_delete_%s' % model.__name__)
+
+
+def remember_image(sender, instance, **kwargs):
+    value = instance.__dict__.get(images.IMAGE_FIELDS[sender])
+    instance._image_name = getattr(value, 'name', value)
+
+
+def create_image_derivatives(sender, instance, raw=False, **kwargs):
+    name = getattr(instance, images.IMAGE_FIELDS[sender]).name
+    if not raw and name and name != instance._image_name:
+        # Responses listing the original in place of the derivatives change.
+        images.schedule(name, done=lambda: versions.bump_instance(instance))
+    instance._image_name = name
+
+
+for model in images.IMAGE_FIELDS:
+    post_init.connect(remember_image, sender=model, dispatch_uid='remember_image_%s' % model.__name__)
+    post_save.connect(create_image_derivatives, sender=model,
+                      dispatch_uid='create_image_derivatives_%s' % model.__name__)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import versions
+from .models import BASKETBALL, FOOTBALL, League, LeagueStanding, Match, Team
+
+# Points for a win, a draw and a loss. Basketball has no draws, a level
+# score only shows up while the match is still being played.
+POINTS = {
+    FOOTBALL: (3, 1, 0),
+    BASKETBALL: (2, 1, 1),
+}
+
+
+def empty_record():
+    return {'played': 0, 'won': 0, 'drawn': 0, 'lost': 0, 'goals_for': 0, 'goals_against': 0, 'score': 0}
+
+
+def add_result(record, match_type, scored, conceded):
+    win, draw, loss = POINTS.get(match_type, POINTS[FOOTBALL])
+    record['played'] += 1
+    record['goals_for'] += scored
+    record['goals_against'] += conceded
+    if scored > conceded:
+        record['won'] += 1
+        record['score'] += win
+    elif scored == conceded:
+        record['drawn'] += 1
+        record['score'] += draw
+    else:
+        record['lost'] += 1
+        record['score'] += loss
+
+
+def played_matches(league_id):
+    # A match counts from kickoff on, so the table is live while it is played.
+    # Saves only update the table, a fixture saved before kickoff is added
+    # by `manage.py rebuild_standings --kicked-off`, see kicked_off().
+    return Match.objects.filter(league_id=league_id, date__lte=timezone.now())
+
+
+def kicked_off(minutes):
+    """Ids of the leagues with a match that kicked off in the last `minutes`."""
+    now = timezone.now()
+    return set(Match.objects.filter(date__gt=now - timedelta(minutes=minutes), date__lte=now)
+               .values_list('league_id', flat=True).distinct())
+
+
+def update_team(league_id, team_id):
+    record = empty_record()
+    rows = played_matches(league_id).filter(Q(team1_id=team_id) | Q(team2_id=team_id)) \
+        .values_list('type', 'team1_id', 'score1', 'score2')
+    for match_type, team1_id, score1, score2 in rows:
+        if team1_id == team_id:
+            add_result(record, match_type, score1, score2)
+        else:
+            add_result(record, match_type, score2, score1)
+    LeagueStanding.objects.update_or_create(league_id=league_id, team_id=team_id, defaults=record)
+
+
+def update_for_match(match, previous=None, existing_only=False):
+    """
+    Recompute the table rows of the two teams of `match`. `previous` is the
+    (league_id, team1_id, team2_id) the match had when it was loaded, so
+    rows the match was moved away from are corrected as well. With
+    `existing_only` rows of leagues or teams that are gone are skipped.
+    """
+    rows = {(match.league_id, match.team1_id), (match.league_id, match.team2_id)}
+    if previous and None not in previous:
+        league_id, team1_id, team2_id = previous
+        rows |= {(league_id, team1_id), (league_id, team2_id)}
+    if existing_only:
+        leagues = set(League.objects.filter(pk__in=[row[0] for row in rows]).values_list('pk', flat=True))
+        teams = set(Team.objects.filter(pk__in=[row[1] for row in rows]).values_list('pk', flat=True))
+        rows = {(league_id, team_id) for league_id, team_id in rows if league_id in leagues and team_id in teams}
+    for league_id, team_id in sorted(rows):
+        update_team(league_id, team_id)
+
+
+def rebuild_league(league_id):
+    records = {}
+    for match_type, team1_id, team2_id, score1, score2 in played_matches(league_id) \
+            .values_list('type', 'team1_id', 'team2_id', 'score1', 'score2'):
+        add_result(records.setdefault(team1_id, empty_record()), match_type, score1, score2)
+        add_result(records.setdefault(team2_id, empty_record()), match_type, score2, score1)
+
+    existing = {standing.team_id: standing for standing in LeagueStanding.objects.filter(league_id=league_id)}
+    created, updated = [], []
+    for team_id in set(existing) | set(records):
+        record = records.get(team_id, empty_record())
+        standing = existing.get(team_id) or LeagueStanding(league_id=league_id, team_id=team_id)
+        for name, value in record.items():
+            setattr(standing, name, value)
+        (updated if standing.pk else created).append(standing)
+    LeagueStanding.objects.bulk_create(created)
+    LeagueStanding.objects.bulk_update(updated, list(empty_record()))
+    versions.bump('league', league_id)
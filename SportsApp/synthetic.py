@@ -0,0 +1,242 @@
+import random
+import uuid
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import comments, feed, search, standings
+from .models import *
+from .standings import BASKETBALL, FOOTBALL
+
+# Seeded, realistic looking data to benchmark against. Everything is written
+# with bulk_create, so none of the model signals run and the derived data
+# (standings, search index, latest comments, feeds) is built at the end.
+
+CITIES = ('تهران', 'تبریز', 'اصفهان', 'شیراز', 'مشهد', 'اهواز', 'رشت', 'کرمان', 'قم', 'یزد', 'اراک', 'ساری',
+          'زنجان', 'همدان', 'کرج', 'قزوین', 'Madrid', 'Milan', 'London', 'Munich', 'Paris', 'Lisbon')
+CLUBS = ('استقلال', 'پرسپولیس', 'سپاهان', 'ذوب‌آهن', 'تراکتور', 'فولاد', 'پیکان', 'نفت', 'United', 'City',
+         'Athletic', 'Rovers')
+FIRST_NAMES = ('علی', 'رضا', 'محمد', 'حسین', 'مهدی', 'سینا', 'امیر', 'کریم', 'سردار', 'مسعود', 'Luka',
+               'Marco', 'Leo', 'Karim', 'Sergio', 'Thomas')
+LAST_NAMES = ('کریمی', 'دایی', 'انصاری', 'رحمانی', 'نوروزی', 'طارمی', 'جهانبخش', 'عزتی', 'Modric', 'Reus',
+              'Silva', 'Costa', 'Müller', 'Benzema')
+POSITIONS = {
+    FOOTBALL: ('GK', 'DF', 'DF', 'DF', 'DF', 'MF', 'MF', 'MF', 'FW', 'FW', 'FW'),
+    BASKETBALL: ('PG', 'SG', 'SF', 'PF', 'C'),
+}
+EVENTS = ('گل', 'کارت زرد', 'کارت قرمز', 'تعویض', 'پنالتی', 'آفساید')
+MATCH_STATS = ('شوت', 'شوت در چارچوب', 'کرنر', 'خطا', 'مالکیت توپ', 'پاس')
+PLAYER_STATS = ('goals', 'assists', 'appearances', 'minutes', 'yellow_cards', 'red_cards')
+WORDS = ('بازی', 'لیگ', 'گل', 'مربی', 'قهرمانی', 'هواداران', 'دربی', 'انتقال', 'قرارداد', 'مصدومیت', 'تیم ملی',
+         'جام', 'فینال', 'نیمه‌نهایی', 'ورزشگاه', 'داور', 'پیروزی', 'شکست', 'تساوی', 'رکورد')
+
+DEFAULTS = {
+    'leagues': 4,
+    'seasons': 2,
+    'teams': 16,
+    'players': 22,
+    'events': 8,
+    'articles': 2000,
+    'comments': 10,
+    'users': 500,
+}
+
+
+def _bulk(model, objects):
+    """bulk_create `objects` and set their primary keys on every backend."""
+    model.objects.bulk_create(objects)
+    if objects and objects[0].pk is None:
+        # Only PostgreSQL returns the keys. Rows of one generator run are
+        # inserted in order by a single writer, so the newest keys are ours.
+        pks = list(model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objects)])
+        for obj, pk in zip(objects, reversed(pks)):
+            obj.pk = pk
+    return objects
+
+
+class Generator(object):
+    def __init__(self, seed=0, log=None, **sizes):
+        self.random = random.Random(seed)
+        self.sizes = dict(DEFAULTS, **{key: value for key, value in sizes.items() if value is not None})
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+        # Slugs and usernames carry it, so runs can be repeated on one database.
+        self.suffix = uuid.uuid4().hex[:6]
+
+    def name(self):
+        return '%s %s' % (self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES))
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def run(self):
+        with transaction.atomic():
+            leagues = self.create_leagues()
+            teams = self.create_teams(leagues)
+            self.log('%d leagues, %d teams' % (len(leagues), sum(len(pool) for pool in teams.values())))
+            rosters = self.create_rosters(teams)
+            self.create_player_stats(rosters, leagues)
+            matches = self.create_matches(leagues, teams, rosters)
+            self.log('%d matches' % len(matches))
+            users = self.create_users(teams, rosters)
+            articles = self.create_news(users)
+            self.log('%d articles, %d users' % (len(articles), len(users)))
+
+        for league in leagues:
+            standings.rebuild_league(league.pk)
+        for article in NewsArticle.objects.filter(pk__in=[article.pk for article in articles]).prefetch_related('tags'):
+            search.index_article(article)
+        comments.refresh_latest([article.pk for article in articles])
+        for match in Match.objects.filter(pk__in=[match.pk for match in matches], date__gte=self.now - timedelta(days=30)):
+            feed.fan_out_match(match)
+        self.log('Built standings, search index, latest comments and feeds')
+        return {'leagues': leagues, 'teams': teams, 'matches': matches, 'users': users, 'articles': articles}
+
+    def create_leagues(self):
+        leagues = []
+        for index in range(self.sizes['leagues']):
+            sport = FOOTBALL if index % 2 == 0 else BASKETBALL
+            for season in range(self.sizes['seasons']):
+                year = self.now.year - self.sizes['seasons'] + season + 1
+                leagues.append(League(name='لیگ %d' % (index + 1), type=sport, start_date=date(year - 1, 8, 1),
+                                      is_ongoing=season == self.sizes['seasons'] - 1, logo='leagues/league.jpg'))
+        return _bulk(League, leagues)
+
+    def create_teams(self, leagues):
+        # One pool of teams per competition, playing in each of its seasons.
+        competitions, teams = {}, []
+        for league in leagues:
+            competitions.setdefault(league.name, []).append(league)
+        for number, (competition, seasons) in enumerate(competitions.items()):
+            for index in range(self.sizes['teams']):
+                name = '%s %s %d' % (self.random.choice(CLUBS), self.random.choice(CITIES), number * 100 + index)
+                slug = '%s-%s' % (slugify(name, allow_unicode=True), self.suffix)
+                teams.append(Team(name=name, slug=slug, type=seasons[0].type, logo='teams/team.jpg'))
+        _bulk(Team, teams)
+
+        pools, through, staff = {}, [], []
+        for number, seasons in enumerate(competitions.values()):
+            pool = teams[number * self.sizes['teams']:(number + 1) * self.sizes['teams']]
+            for league in seasons:
+                pools[league.pk] = pool
+                through += [Team.leagues.through(team_id=team.pk, league_id=league.pk) for team in pool]
+        for team in teams:
+            staff.append(CoachingStaff(
+                team=team, caretaker_manager=self.name(), first_team_coach=self.name(),
+                assistant_coaches=', '.join(self.name() for _ in range(3)), goalkeeping_coach=self.name(),
+                fitness_coach=self.name(), head_analysis=self.name(), head_development=self.name()))
+        Team.leagues.through.objects.bulk_create(through)
+        CoachingStaff.objects.bulk_create(staff)
+        return pools
+
+    def create_rosters(self, pools):
+        teams = {team.pk: team for pool in pools.values() for team in pool}
+        players, positions = [], []
+        for team in teams.values():
+            for index in range(self.sizes['players']):
+                players.append(Player(name=self.name(), age=self.random.randint(17, 38),
+                                      height=self.random.randint(165, 205), weight=round(self.random.uniform(60, 100), 1),
+                                      nationality=self.random.choice(('IR', 'IR', 'IR', 'BR', 'ES', 'DE')),
+                                      image='players/player.jpg'))
+        _bulk(Player, players)
+        for number, team in enumerate(teams.values()):
+            sport_positions = POSITIONS.get(team.type, POSITIONS[FOOTBALL])
+            for index in range(self.sizes['players']):
+                player = players[number * self.sizes['players'] + index]
+                positions.append(TeamPosition(team=team, player=player,
+                                              position=sport_positions[index % len(sport_positions)]))
+        _bulk(TeamPosition, positions)
+        rosters = {}
+        for position in positions:
+            rosters.setdefault(position.team_id, []).append(position)
+        return rosters
+
+    def create_player_stats(self, rosters, leagues):
+        seasons = sorted({str(league.start_date.year) for league in leagues})
+        player_seasons = _bulk(PlayerSeason, [
+            PlayerSeason(player_id=position.player_id, season=season)
+            for roster in rosters.values() for position in roster for season in seasons])
+        PlayerStat.objects.bulk_create([
+            PlayerStat(player_season=player_season, name=name, value=self.random.randint(0, 30))
+            for player_season in player_seasons for name in PLAYER_STATS])
+
+    def create_matches(self, leagues, pools, rosters):
+        matches, lineups = [], []
+        for league in leagues:
+            pool = pools[league.pk]
+            kickoff = timezone.make_aware(datetime.combine(league.start_date, time(18, 0)))
+            # Double round robin, one matchday every week.
+            fixtures = [(home, away) for home in pool for away in pool if home is not away]
+            self.random.shuffle(fixtures)
+            per_day = max(1, len(pool) // 2)
+            for index, (home, away) in enumerate(fixtures):
+                when = kickoff + timedelta(days=7 * (index // per_day), hours=index % per_day)
+                played = when <= self.now
+                score_range = (60, 110) if league.type == BASKETBALL else (0, 4)
+                matches.append(Match(
+                    league=league, team1=home, team2=away, type=league.type, date=when, has_commentary=played,
+                    score1=self.random.randint(*score_range) if played else 0,
+                    score2=self.random.randint(*score_range) if played else 0))
+        _bulk(Match, matches)
+
+        events, stats = [], []
+        for match in matches:
+            for side, team in ((1, match.team1), (2, match.team2)):
+                roster = rosters[team.pk]
+                starters = 5 if match.type == BASKETBALL else 11
+                chosen = self.random.sample(roster, min(len(roster), starters + 7))
+                lineups += [MatchLineup(match=match, side=side, role=MatchLineup.STARTER, order=order,
+                                        shirt_number=order + 1, team_position=position)
+                            for order, position in enumerate(chosen[:starters])]
+                lineups += [MatchLineup(match=match, side=side, role=MatchLineup.SUBSTITUTE, order=order,
+                                        shirt_number=starters + order + 1, team_position=position)
+                            for order, position in enumerate(chosen[starters:])]
+            if match.date <= self.now:
+                events += [MatchEvent(match=match, title=self.random.choice(EVENTS), comment=self.sentence(6))
+                           for _ in range(self.sizes['events'])]
+                stats += [MatchStats(match=match, name=name, first=self.random.randint(0, 20),
+                                     second=self.random.randint(0, 20)) for name in MATCH_STATS]
+        MatchLineup.objects.bulk_create(lineups)
+        MatchEvent.objects.bulk_create(events)
+        MatchStats.objects.bulk_create(stats)
+        return matches
+
+    def create_users(self, pools, rosters):
+        users = _bulk(User, [User(username='fan%d_%s' % (index, self.suffix), email='fan%d@example.com' % index,
+                                  password='!') for index in range(self.sizes['users'])])
+        teams = sorted({team.pk for pool in pools.values() for team in pool})
+        players = sorted({position.player_id for roster in rosters.values() for position in roster})
+        team_follows, player_follows = [], []
+        for user in users:
+            # A few clubs are followed by most users, like in real life.
+            followed = {self.random.choice(teams[:3])} | set(self.random.sample(teams, min(len(teams), 2)))
+            team_follows += [UserFollowTeam(user=user, team_id=team_id) for team_id in followed]
+            player_follows += [UserFollowPlayer(user=user, player_id=player_id)
+                               for player_id in self.random.sample(players, min(len(players), 5))]
+        UserFollowTeam.objects.bulk_create(team_follows)
+        UserFollowPlayer.objects.bulk_create(player_follows)
+        return users
+
+    def create_news(self, users):
+        tags = _bulk(Tag, [Tag(name=word) for word in WORDS])
+        articles = _bulk(NewsArticle, [
+            NewsArticle(title=self.sentence(6), description=self.sentence(20), text=self.sentence(300),
+                        type=self.random.choice((FOOTBALL, BASKETBALL)), image='news/news.jpg')
+            for _ in range(self.sizes['articles'])])
+        through, article_comments = [], []
+        for article in articles:
+            through += [NewsArticle.tags.through(newsarticle_id=article.pk, tag_id=tag.pk)
+                        for tag in self.random.sample(tags, 3)]
+            count = self.random.randint(0, self.sizes['comments'] * 2)
+            article.comment_count = count
+            for _ in range(count):
+                user = self.random.choice(users)
+                article_comments.append(Comment(article=article, user=user, name=user.username,
+                                                text=self.sentence(15)))
+        NewsArticle.tags.through.objects.bulk_create(through)
+        Comment.objects.bulk_create(article_comments)
+        NewsArticle.objects.bulk_update(articles, ['comment_count'])
+        return articles
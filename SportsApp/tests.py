@@ -1,3 +1,907 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (archive, autocomplete, benchmark, images, ingest, live, queryplan, replay, responsecache, search,
+               standings, views, writer)
+from .leaderboard import SeasonTable, leaderboards
+from .querybudget import QueryBudgetExceeded
+from .synthetic import Generator
+from .models import *
+
+
+def create_match(league, index):
+    team1 = Team.objects.create(name='Home %d' % index, type=FOOTBALL, logo='teams/home.jpg')
+    team2 = Team.objects.create(name='Away %d' % index, type=FOOTBALL, logo='teams/away.jpg')
+    team1.leagues.add(league)
+    team2.leagues.add(league)
+    CoachingStaff.objects.create(team=team1, caretaker_manager='a', first_team_coach='b', assistant_coaches='c',
+                                 goalkeeping_coach='d', fitness_coach='e', head_analysis='f', head_development='g')
+    match = Match.objects.create(team1=team1, team2=team2, type=FOOTBALL, score1=1, score2=0, league=league,
+                                 date=timezone.now() - timedelta(days=index))
+    for side, team in ((1, team1), (2, team2)):
+        for n in range(2):
+            player = Player.objects.create(name='Player %d%d%d' % (side, index, n), age=20, height=180, weight=75,
+                                           nationality='IR', image='players/p.jpg')
+            season = PlayerSeason.objects.create(player=player, season='2018')
+            PlayerStat.objects.create(player_season=season, name='goals', value=n)
+            position = TeamPosition.objects.create(team=team, player=player, position='FW')
+            for role in (MatchLineup.STARTER, MatchLineup.SUBSTITUTE):
+                MatchLineup.objects.create(match=match, side=side, role=role, order=n, team_position=position)
+    MatchEvent.objects.create(match=match, title='Goal')
+    MatchStats.objects.create(match=match, name='Shots', first=3, second=1)
+    MatchImages.objects.create(match=match, caption='photo')
+    MatchVideos.objects.create(match=match, caption='video')
+    return match
+
+
+def create_article(user, index):
+    article = NewsArticle.objects.create(title='Article %d' % index, description='d', text='t', type=FOOTBALL)
+    article.tags.add(Tag.objects.create(name='tag %d' % index))
+    Comment.objects.create(article=article, user=user, name='n', text='t')
+    return article
+
+
+class FetchPlanTests(TestCase):
+    endpoints = ['/api/matches/', '/api/teams/', '/api/players/', '/api/leagues/', '/api/news/',
+                 '/api/matches/Home 0/']
+
+    def setUp(self):
+        self.user = User.objects.create_user('fan', 'fan@example.com', 'password')
+        self.league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                            logo='leagues/l.jpg')
+
+    def count_queries(self, url):
+        responsecache.get_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_is_constant(self):
+        create_match(self.league, 0)
+        create_article(self.user, 0)
+        few = {url: self.count_queries(url) for url in self.endpoints}
+        for index in range(1, 6):
+            create_match(self.league, index)
+            create_article(self.user, index)
+            League.objects.create(name='League %d' % index, type=FOOTBALL, start_date=date(2018, 8, 1),
+                                  logo='leagues/l.jpg')
+        many = {url: self.count_queries(url) for url in self.endpoints}
+        self.assertEqual(few, many)
+
+
+class LineupTests(TestCase):
+    def setUp(self):
+        self.league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                            logo='leagues/l.jpg')
+
+    def test_lineups_are_loaded_in_one_query_and_ordered(self):
+        matches = [create_match(self.league, index) for index in range(3)]
+        MatchLineup.objects.filter(match=matches[0], side=1, role=MatchLineup.STARTER, order=0).update(order=5)
+        responsecache.get_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            rows = self.client.get('/api/matches/').json()['results']
+        self.assertEqual(len([query for query in context.captured_queries
+                              if 'FROM "SportsApp_matchlineup"' in query['sql']]), 1)
+        first = next(row for row in rows if row['id'] == matches[0].pk)
+        self.assertEqual([item['player']['name'] for item in first['player1']], ['Player 101', 'Player 100'])
+        self.assertEqual(len(first['sub2']), 2)
+        self.assertEqual(set(first['player1'][0]), {'player', 'position', 'shirt_number'})
+
+    def test_old_lineup_tables_are_migrated(self):
+        match = create_match(self.league, 0)
+        positions = list(TeamPosition.objects.filter(team=match.team1).order_by('-pk').values_list('pk', flat=True))
+        MatchLineup.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE "SportsApp_match_player1" (id integer PRIMARY KEY, match_id integer, '
+                           'teamposition_id integer)')
+            for position in positions:
+                cursor.execute('INSERT INTO "SportsApp_match_player1" (match_id, teamposition_id) VALUES (%s, %s)',
+                               [match.pk, position])
+        call_command('migrate_lineups', stdout=StringIO())
+        call_command('migrate_lineups', '--drop', stdout=StringIO())
+        self.assertEqual(list(match.lineups.values_list('side', 'role', 'order', 'team_position_id')),
+                         [(1, MatchLineup.STARTER, order, position) for order, position in enumerate(positions)])
+        self.assertNotIn('SportsApp_match_player1', connection.introspection.table_names())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                            logo='leagues/l.jpg')
+        team1 = Team.objects.create(name='Home', type=FOOTBALL, logo='teams/home.jpg')
+        team2 = Team.objects.create(name='Away', type=FOOTBALL, logo='teams/away.jpg')
+        kickoff = timezone.now()
+        for index in range(7):
+            # Pairs of matches share a kickoff so the pk tiebreak is exercised.
+            Match.objects.create(team1=team1, team2=team2, type=FOOTBALL, score1=0, score2=0, league=self.league,
+                                 date=kickoff - timedelta(hours=index // 2))
+
+    def test_pages_follow_ordering_in_both_directions(self):
+        expected = list(Match.objects.order_by('-date', '-pk').values_list('id', flat=True))
+        seen, pages = [], []
+        url = '/api/matches/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            pages.append(url)
+            seen += [match['id'] for match in data['results']]
+            url = data['next']
+        self.assertEqual(seen, expected)
+
+        data = self.client.get(pages[-1]).json()
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([match['id'] for match in previous['results']], expected[3:6])
+
+
+class LiveChannelTests(TransactionTestCase):
+    def test_score_and_event_deltas_are_versioned(self):
+        match = create_match(League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                                   logo='leagues/l.jpg'), 0)
+        url = '/api/matches/%d/live/' % match.pk
+        version = self.client.get(url, {'timeout': 0}).json()['version']
+        match.score1 += 1
+        match.save()
+        MatchEvent.objects.create(match=match, title='Goal')
+
+        data = self.client.get(url, {'since': version, 'timeout': 0}).json()
+        self.assertEqual([delta['type'] for delta in data['deltas']], ['score', 'event'])
+        self.assertEqual([delta['version'] for delta in data['deltas']], [version + 1, version + 2])
+        self.assertEqual(data['deltas'][0]['data'], {'score1': 2, 'score2': 0})
+
+        data = self.client.get(url, {'since': data['version'], 'timeout': 0}).json()
+        self.assertEqual(data['deltas'], [])
+        for timeout in ('nan', 'inf', '-inf', 'x'):
+            self.assertEqual(self.client.get(url, {'timeout': timeout}).status_code, 400, timeout)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.match = create_match(League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                                        logo='leagues/l.jpg'), 0)
+        self.stat = self.match.stats.get()
+        self.operator = User.objects.create_superuser('operator', 'op@example.com', 'password')
+        self.client.force_login(self.operator)
+
+    def test_batch_is_applied_once(self):
+        batch = {'feed': 'opta', 'operations': [
+            {'seq': 1, 'op': 'score', 'match': self.match.pk, 'score1': 1},
+            {'seq': 2, 'op': 'match_stat', 'stat': self.stat.pk, 'second': 2},
+            {'seq': 3, 'op': 'event', 'match': self.match.pk, 'title': 'Goal'},
+        ]}
+        response = self.client.post('/api/ingest/', batch, content_type='application/json')
+        self.assertEqual(response.json(), {'applied': 3, 'skipped': 0, 'last_seq': 3})
+        response = self.client.post('/api/ingest/', batch, content_type='application/json')
+        self.assertEqual(response.json(), {'applied': 0, 'skipped': 3, 'last_seq': 3})
+
+        self.match.refresh_from_db()
+        self.stat.refresh_from_db()
+        self.assertEqual((self.match.score1, self.stat.second), (2, 3))
+        self.assertEqual(self.match.events.count(), 2)
+
+    def test_failing_operation_rolls_back_batch(self):
+        batch = {'operations': [
+            {'seq': 1, 'op': 'score', 'match': self.match.pk, 'score2': 1},
+            {'seq': 2, 'op': 'score', 'match': 0, 'score2': 1},
+        ]}
+        response = self.client.post('/api/ingest/', batch, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.score2, 0)
+        self.assertFalse(IngestSequence.objects.exists())
+
+
+class StandingsTests(TestCase):
+    def test_table_follows_match_scores(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        match = create_match(league, 0)
+        table = {standing.team_id: standing for standing in league.standings.all()}
+        self.assertEqual((table[match.team1_id].score, table[match.team1_id].won), (3, 1))
+        self.assertEqual((table[match.team2_id].score, table[match.team2_id].lost), (0, 1))
+
+        match.score2 = 1
+        match.save()
+        self.assertEqual(list(league.standings.values_list('score', 'drawn', 'goals_for')), [(1, 1, 1), (1, 1, 1)])
+
+        LeagueStanding.objects.update(score=0)
+        standings.rebuild_league(league.pk)
+        self.assertEqual(list(league.standings.values_list('score', flat=True)), [1, 1])
+
+    def test_fixtures_enter_the_table_at_kickoff(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        match = create_match(league, 0)
+        fixture = Match.objects.create(team1=match.team1, team2=match.team2, type=FOOTBALL, league=league,
+                                       score1=0, score2=0, date=timezone.now() + timedelta(hours=1))
+        self.assertEqual(list(league.standings.values_list('played', flat=True)), [1, 1])
+
+        # Kickoff passes without the fixture being saved again.
+        Match.objects.filter(pk=fixture.pk).update(date=timezone.now() - timedelta(minutes=5))
+        call_command('rebuild_standings', '--kicked-off', '10', stdout=StringIO())
+        self.assertEqual(list(league.standings.values_list('played', 'drawn')), [(2, 1), (2, 1)])
+
+
+class NewsSearchTests(TestCase):
+    def setUp(self):
+        self.match_report = NewsArticle.objects.create(
+            title='پیروزی پرسپولیس', description='گزارش بازی', text='پرسپولیس در ورزشگاه آزادی برد.', type=FOOTBALL)
+        self.transfer = NewsArticle.objects.create(
+            title='نقل و انتقالات', description='خبر', text='بازيكن جدید به پرسپولیس پیوست.', type=FOOTBALL)
+        self.transfer.tags.add(Tag.objects.create(name='انتقالات'))
+
+    def search(self, query):
+        return self.client.get('/api/news/', {'search': query}).json()['results']
+
+    def test_ranked_prefix_and_normalized_matches(self):
+        self.assertEqual([a['id'] for a in self.search('پرسپولیس')], [self.match_report.pk, self.transfer.pk])
+        self.assertEqual([a['id'] for a in self.search('بازیکن پرس')], [self.transfer.pk])
+        self.assertEqual([a['id'] for a in self.search('انتقال')], [self.transfer.pk])
+        self.assertIn('<mark>بازيكن</mark>', self.search('بازیکن')[0]['snippet'])
+
+    def test_frequencies_are_counted_once_per_index_change(self):
+        lookups = [search.term_lookup('پرسپولیس'), search.term_lookup('باز', prefix=True)]
+        self.assertEqual(search.frequencies(lookups), (2, [2, 2]))
+        with self.assertNumQueries(0):
+            self.assertEqual(search.frequencies(lookups), (2, [2, 2]))
+        NewsArticle.objects.create(title='پرسپولیس', description='خبر', text='متن', type=FOOTBALL)
+        self.assertEqual(search.frequencies(lookups), (3, [3, 2]))
+        self.assertNotIn('LIKE', str(search.search_articles(NewsArticle.objects.all(), 'پرسپولیس باز').query))
+
+
+class TeamLookupTests(TestCase):
+    def test_matches_by_slug_and_autocomplete(self):
+        match = create_match(League.objects.create(name='لیگ برتر', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                                   logo='leagues/l.jpg'), 0)
+        self.assertEqual(match.team1.slug, 'home-0')
+        for name in ('home-0', 'Home 0', str(match.team1_id)):
+            results = self.client.get('/api/matches/%s/' % name).json()['results']
+            self.assertEqual([row['id'] for row in results], [match.pk])
+        later = Match.objects.create(team1=match.team2, team2=match.team1, type=FOOTBALL, league=match.league,
+                                     score1=0, score2=0, date=match.date + timedelta(days=7))
+        results = self.client.get('/api/matches/home-0/', {'ordering': '-date'}).json()['results']
+        self.assertEqual([row['id'] for row in results], [later.pk, match.pk])
+
+        autocomplete.index.load()
+        Team.objects.create(name='استقلال تهران', type=FOOTBALL, logo='teams/e.jpg')
+        with self.assertNumQueries(0):
+            results = self.client.get('/api/autocomplete/', {'q': 'تهر'}).json()
+        self.assertEqual([row['name'] for row in results], ['استقلال تهران'])
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'لیگ', 'type': 'league'}).json()[0]['type'],
+                         'league')
+
+
+class FeedTests(TestCase):
+    def test_fan_out_on_write_and_on_read(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        home = Team.objects.create(name='Home', type=FOOTBALL, logo='teams/home.jpg')
+        away = Team.objects.create(name='Away', type=FOOTBALL, logo='teams/away.jpg')
+        fan = User.objects.create_user('fan', 'fan@example.com', 'password')
+        UserFollowTeam.objects.create(user=fan, team=home)
+        UserFollowTeam.objects.create(user=fan, team=away)
+        with self.settings(FEED_FANOUT_LIMIT=0):
+            # Every team is "popular": only shared rows are written.
+            match = Match.objects.create(team1=home, team2=away, type=FOOTBALL, score1=0, score2=0, league=league,
+                                         date=timezone.now() - timedelta(hours=1))
+        MatchEvent.objects.create(match=match, title='Goal')
+        article = NewsArticle.objects.create(title='Home win', description='d', text='t', type=FOOTBALL)
+        article.tags.add(Tag.objects.create(name='Home'))
+
+        self.assertEqual(FeedItem.objects.filter(user=None).count(), 2)
+        self.client.force_login(fan)
+        # Session, user and one query for the whole page.
+        with self.assertNumQueries(3):
+            results = self.client.get('/api/feed/').json()['results']
+        self.assertEqual([item['kind'] for item in results], ['news', 'event', 'match'])
+
+        # Both teams' shared rows are in the feed, pages are still full.
+        kinds, url = [], '/api/feed/?page_size=1'
+        while url:
+            page = self.client.get(url).json()
+            self.assertEqual(len(page['results']), 1)
+            kinds.append(page['results'][0]['kind'])
+            url = page['next']
+        self.assertEqual(kinds, ['news', 'event', 'match'])
+
+
+class CommentTests(TestCase):
+    def test_counts_and_latest_comments_follow_writes(self):
+        user = User.objects.create_user('fan', 'fan@example.com', 'password')
+        article = create_article(user, 0)
+        self.client.force_login(user)
+        url = '/api/news/%d/comments/' % article.pk
+        batch = [{'name': 'fan', 'text': 'comment %d' % index} for index in range(4)]
+        self.assertEqual(self.client.post(url, batch, content_type='application/json').status_code, 201)
+        self.assertEqual(self.client.post('/api/news/0/comments/', batch[0]).status_code, 404)
+        for body in ([1], ['x'], 'x'):
+            self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 400)
+        with self.settings(COMMENT_MAX_BATCH=3):
+            self.assertEqual(self.client.post(url, batch, content_type='application/json').status_code, 400)
+
+        data = self.client.get('/api/news/%d/' % article.pk).json()
+        self.assertEqual(data['comment_count'], 5)
+        self.assertEqual(len(data['latest_comments']), 3)
+        page = self.client.get(url, {'page_size': 2}).json()
+        self.assertEqual(len(page['results']), 2)
+        self.assertIsNotNone(page['next'])
+
+        article.comments.first().delete()
+        article.refresh_from_db()
+        self.assertEqual(article.comment_count, 4)
+
+
+class LeaderboardTests(TransactionTestCase):
+    def setUp(self):
+        leaderboards.tables.clear()
+
+    def test_top_players_follow_stat_changes(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        match = create_match(league, 0)
+        url = '/api/leaderboard/'
+        rows = self.client.get(url, {'season': '2018', 'stat': 'goals', 'limit': 2}).json()
+        self.assertEqual([row['value'] for row in rows], [1, 1])
+
+        stat = PlayerStat.objects.get(name='goals', value=0, player_season__player__teams__team=match.team2)
+        ingest.add_player_stat(stat.pk, 5)
+        rows = self.client.get(url, {'season': '2018', 'stat': 'goals', 'limit': 1}).json()
+        self.assertEqual(rows, [{'rank': 1, 'player': {'id': stat.player_season.player_id,
+                                                       'name': stat.player_season.player.name}, 'value': 5}])
+
+        rows = self.client.get(url, {'season': '2018', 'stat': 'goals', 'team': match.team1.slug}).json()
+        self.assertEqual([row['value'] for row in rows], [1, 0])
+
+    def test_ties_at_the_limit_go_to_the_lowest_player_id(self):
+        players = [Player.objects.create(name='Player %d' % index, age=20, height=180, weight=75, nationality='IR',
+                                         image='players/p.jpg') for index in range(8)]
+        for index, player in enumerate(reversed(players)):
+            season = PlayerSeason.objects.create(player=player, season='2019')
+            PlayerStat.objects.create(player_season=season, name='goals', value=3 if index == 0 else 1)
+        rows = self.client.get('/api/leaderboard/', {'season': '2019', 'stat': 'goals', 'limit': 3}).json()
+        self.assertEqual([row['player']['id'] for row in rows], [players[-1].pk, players[0].pk, players[1].pk])
+
+        response = self.client.get('/api/leaderboard/', {'season': 'nope', 'stat': 'goals'})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('nope', leaderboards.tables)
+
+    def join_reloads(self):
+        for thread in threading.enumerate():
+            if thread.name == 'leaderboard-reload':
+                thread.join(5)
+
+    @override_settings(LEADERBOARD_REFRESH_SECONDS=0)
+    def test_stale_tables_are_reloaded_in_the_background(self):
+        match = create_match(League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                                   logo='leagues/l.jpg'), 0)
+        table = leaderboards.table('2018')
+        self.assertIs(leaderboards.table('2018'), table)
+        self.join_reloads()
+        self.assertIsNot(leaderboards.tables['2018'], table)
+
+        # A stat changed after the reload read it must not be lost when the
+        # reloaded table replaces the one the change was applied to.
+        stat = PlayerStat.objects.get(name='goals', value=0, player_season__player__teams__team=match.team2)
+        load = SeasonTable.load
+
+        def load_then_change(season):
+            table = load(season)
+            PlayerStat.objects.filter(pk=stat.pk).update(value=5)
+            leaderboards.stat_changed(stat.pk)
+            return table
+        with mock.patch.object(SeasonTable, 'load', side_effect=load_then_change):
+            leaderboards.table('2018')
+            self.join_reloads()
+        self.assertEqual(leaderboards.tables['2018'].top('goals', 1)[0][2], 5)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def test_etag_changes_only_when_dependencies_change(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        match = create_match(league, 0)
+        other = create_match(league, 1)
+        url = '/api/teams/%d/' % match.team1_id
+
+        etag = self.client.get('/api/matches/')['ETag']
+        detail_etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/matches/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other.team1.save()
+        self.assertEqual(self.client.get('/api/matches/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 304)
+        match.team1.coaching_staff.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+
+
+class ResponseCacheTests(TransactionTestCase):
+    def setUp(self):
+        responsecache.get_cache().clear()
+
+    def test_entries_are_invalidated_by_what_they_contain(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        match = create_match(league, 0)
+
+        first = self.client.get('/api/matches/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/matches/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+
+        Team.objects.create(name='Elsewhere', type=FOOTBALL, logo='teams/e.jpg')
+        self.assertEqual(self.client.get('/api/matches/')['X-Cache'], 'HIT')
+
+        match.team1.name = 'Renamed'
+        match.team1.save()
+        response = self.client.get('/api/matches/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed')
+
+
+class ImageDerivativeTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.directory, IMAGE_WORKERS=0)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def test_upload_creates_derivatives(self):
+        output = BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(output, 'PNG')
+        team = Team.objects.create(name='Home', type=FOOTBALL,
+                                   logo=SimpleUploadedFile('home.png', output.getvalue()))
+
+        thumbnail = images.derivative_name(team.logo.name, 'thumbnail')
+        with team.logo.storage.open(thumbnail) as file:
+            self.assertEqual(Image.open(file).size, (150, 75))
+        with team.logo.storage.open(images.derivative_name(team.logo.name, 'medium', webp=True)) as file:
+            self.assertEqual(Image.open(file).format, 'WEBP')
+        self.assertEqual(images.generate(team.logo.name), 0)
+
+        srcset = self.client.get('/api/teams/%d/' % team.pk).json()['logo_srcset']
+        self.assertEqual(set(srcset), {'original', 'thumbnail', 'thumbnail_webp', 'medium', 'medium_webp'})
+        self.assertTrue(srcset['thumbnail'].endswith('/derivatives/%s' % os.path.basename(thumbnail)))
+
+        # Derivatives that were not made yet fall back to the original.
+        Team.objects.filter(pk=team.pk).update(logo='teams/old.png')
+        responsecache.get_cache().clear()
+        srcset = self.client.get('/api/teams/%d/' % team.pk).json()['logo_srcset']
+        self.assertEqual(set(srcset.values()), {srcset['original']})
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.directory)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def test_hashed_names_ranges_and_offload(self):
+        storage = Team._meta.get_field('logo').storage
+        name = storage.save('teams/logo.png', SimpleUploadedFile('logo.png', b'0123456789'))
+        self.assertRegex(name, r'^teams/logo\.[0-9a-f]{12}\.png$')
+        self.assertEqual(storage.save('teams/logo.png', SimpleUploadedFile('logo.png', b'0123456789')), name)
+        url = '/media/' + name
+
+        response = self.client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(b''.join(self.client.get(url, HTTP_RANGE='bytes=-3').streaming_content), b'789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=10-').status_code, 416)
+        self.assertEqual(self.client.get('/media/../' + os.path.basename(self.directory)).status_code, 404)
+
+        with override_settings(MEDIA_SENDFILE='X-Accel-Redirect'):
+            response = self.client.get(url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + name)
+
+
+class ImportSeasonTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                            logo='leagues/l.jpg')
+        Team.objects.create(name='Home', slug='home', type=FOOTBALL, logo='teams/home.jpg')
+        Team.objects.create(name='Away', slug='away', type=FOOTBALL, logo='teams/away.jpg')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_is_chunked_idempotent_and_resumable(self):
+        rosters = self.write('rosters.csv', 'team,player,position\nhome,Ali,FW\nhome,Reza,GK\naway,Sina,DF\n')
+        stats = self.write('stats.jsonl', '\n'.join([
+            '{"player": "Ali", "season": "2018", "name": "goals", "value": 3}',
+            '{"player": "Reza", "season": "2018", "name": "saves", "value": 7}',
+            '{"player": "Nobody", "season": "2018", "name": "goals", "value": 1}',
+        ]))
+        matches = self.write('matches.jsonl', '{"kind": "match", "home": "Home", "away": "away", '
+                                              '"date": "2018-09-01T18:00:00", "score1": 2, "score2": 1, '
+                                              '"player1": ["Ali", "Reza"], "player2": ["Sina"]}\n')
+
+        call_command('import_season', self.league.pk, rosters, '--kind=roster', '--chunk-size=2', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_season', self.league.pk, stats, '--kind=stat', '--chunk-size=2', stdout=StringIO())
+        self.assertEqual(ImportProgress.objects.get(source=stats).rows, 2)
+        self.write('stats.jsonl', open(stats, encoding='utf-8').read().replace('Nobody', 'Sina'))
+        output = StringIO()
+        call_command('import_season', self.league.pk, stats, '--kind=stat', stdout=output)
+        self.assertIn('resuming after record 2', output.getvalue())
+        self.assertIn('rows/s', output.getvalue())
+        call_command('import_season', self.league.pk, matches, stdout=StringIO())
+
+        self.assertEqual(TeamPosition.objects.count(), 3)
+        self.assertEqual(sorted(PlayerStat.objects.values_list('player_season__player__name', 'value')),
+                         [('Ali', 3), ('Reza', 7), ('Sina', 1)])
+        match = Match.objects.get()
+        self.assertEqual(list(match.lineups.filter(side=1, role=MatchLineup.STARTER)
+                              .values_list('team_position__player__name', flat=True)), ['Ali', 'Reza'])
+        self.assertEqual(LeagueStanding.objects.get(team=match.team1).score, 3)
+
+        call_command('import_season', self.league.pk, matches, '--restart', stdout=StringIO())
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(match.lineups.count(), 3)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                            logo='leagues/l.jpg')
+        self.other = League.objects.create(name='Other', type=FOOTBALL, start_date=date(2019, 8, 1),
+                                           logo='leagues/l.jpg')
+        self.matches = [create_match(self.league, index) for index in range(3)] + [create_match(self.other, 3)]
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def read(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_streams_one_match_per_line(self):
+        # The archived leagues, then two chunks of matches, each loaded with a
+        # constant number of queries.
+        archive.forget()
+        with self.assertNumQueries(2 + 2 * 7):
+            rows = self.read(self.client.get('/api/export/matches/', {'season': 2018}))
+        self.assertEqual([row['id'] for row in rows], [match.pk for match in reversed(self.matches[:3])])
+        self.assertEqual(len(rows[0]['player1']), 2)
+        self.assertEqual(rows[0]['events'][0]['title'], 'Goal')
+
+        response = self.client.get('/api/export/matches/', {'league': self.other.pk}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.matches[3].pk])
+
+        path = os.path.join(tempfile.mkdtemp(), 'matches.ndjson.gz')
+        call_command('export_matches', '--gzip', '--output', path, '--chunk-size', '3')
+        with gzip.open(path) as file:
+            self.assertEqual(len(file.read().splitlines()), 4)
+        shutil.rmtree(os.path.dirname(path))
+
+
+class SyntheticDataTests(TestCase):
+    def test_generator_is_seeded_and_feeds_the_benchmark(self):
+        sizes = {'leagues': 2, 'seasons': 1, 'teams': 4, 'players': 12, 'articles': 5, 'users': 3}
+        Generator(seed=1, **sizes).run()
+        self.assertEqual(Match.objects.count(), 2 * 4 * 3)
+        self.assertEqual(TeamPosition.objects.count(), 2 * 4 * 12)
+        self.assertTrue(Match.objects.filter(lineups__isnull=False).exists())
+        Generator(seed=1, **sizes).run()
+        names = list(Player.objects.order_by('pk').values_list('name', flat=True))
+        self.assertEqual(names[:len(names) // 2], names[len(names) // 2:])
+
+        results = benchmark.run(iterations=2, warmup=0, only=['teams-list', 'team-matches', 'feed'])
+        self.assertEqual(set(results['endpoints']), {'teams-list', 'team-matches', 'feed'})
+        for result in results['endpoints'].values():
+            self.assertEqual(result['status'], 200)
+            self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+        slower = dict(results, endpoints={'feed': dict(results['endpoints']['feed'], queries=99)})
+        self.assertEqual(len(benchmark.compare(results, slower)), 1)
+
+
+class TrafficReplayTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_captured_requests_are_replayed_per_route(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                       logo='leagues/l.jpg')
+        with override_settings(TRAFFIC_CAPTURE_RATE=1, TRAFFIC_CAPTURE_DIR=self.directory):
+            self.client.get('/api/leagues/', {'page_size': 5})
+            self.client.get('/api/leagues/%d/' % league.pk)
+            self.client.get('/api/leagues/%d/' % league.pk, HTTP_AUTHORIZATION='JWT secret')
+            self.client.post('/api/comments/', {})
+            self.client.get('/admin/login/')
+
+        records = replay.read_log([self.directory])
+        self.assertEqual([record['route'] for record in records], ['leagues-list', 'leagues-detail', 'leagues-detail'])
+        self.assertEqual(records[0]['query'], 'page_size=5')
+        self.assertEqual([record['auth'] for record in records], ['anonymous', 'anonymous', 'jwt'])
+        self.assertNotIn('secret', open(os.path.join(self.directory, os.listdir(self.directory)[0])).read())
+        self.assertGreater(records[0]['bytes'], 0)
+
+        summary = replay.summarize(replay.Replayer(concurrency=1, speedup=100).run(records))
+        self.assertEqual(summary['leagues-detail']['requests'], 2)
+        self.assertEqual(summary['*']['requests'], 3)
+        self.assertEqual(summary['*']['errors'], 0)
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise')
+class QueryBudgetTests(TestCase):
+    def test_endpoints_stay_within_their_budgets(self):
+        Generator(seed=2, leagues=2, seasons=1, teams=4, players=12, articles=20, users=5).run()
+        member = User.objects.filter(userfollowteam__isnull=False).first()
+        for name, url, login in benchmark.endpoints():
+            self.client.logout()
+            if login:
+                self.client.force_login(member)
+            responsecache.get_cache().clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertIn('db;dur=', response['Server-Timing'])
+
+        # The write endpoints, whose budgets grow with the batch.
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        articles = list(NewsArticle.objects.values_list('pk', flat=True)[:2])
+        match = Match.objects.first()
+        stat = match.stats.first()
+        posts = [
+            ('/api/news/%s/comments/' % articles[0], {'name': 'n', 'text': 't'}),
+            ('/api/comments/', [{'article': article, 'name': 'n', 'text': 't'} for article in articles]),
+            ('/api/ingest/', {'feed': 'test', 'operations': [
+                {'seq': 1, 'op': 'score', 'match': match.pk, 'score1': 1},
+                {'seq': 2, 'op': 'score', 'match': match.pk, 'score2': 1},
+                {'seq': 3, 'op': 'match_stat', 'stat': stat.pk, 'first': 1},
+                {'seq': 4, 'op': 'event', 'match': match.pk, 'title': 'Goal'},
+            ]}),
+        ]
+        for url, data in posts:
+            response = self.client.post(url, data, content_type='application/json')
+            self.assertIn(response.status_code, (200, 201), url)
+
+        with mock.patch.object(views.TeamListView, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/teams/')
+        timing = self.client.get('/api/leagues/')['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", view;dur=[\d.]+, render;dur=[\d.]+, total;dur=')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_metrics_are_merged_across_workers(self):
+        League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1), logo='leagues/l.jpg')
+        other = {'http_requests_total': {json.dumps(['leagues', 'GET', '200']): 1000},
+                 'live_stream_connections': {json.dumps([]): 3}}
+        with open(os.path.join(self.directory, 'metrics-%d.json' % os.getppid()), 'w') as file:
+            json.dump(other, file)
+
+        with override_settings(METRICS_DIR=self.directory):
+            for _ in range(2):
+                self.client.get('/api/leagues/')
+            stream = live.event_stream(1, 0)
+            next(stream)
+            text = self.client.get('/metrics').content.decode()
+            stream.close()
+            after = self.client.get('/metrics').content.decode()
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'metrics-%d.json' % os.getpid())))
+
+        samples = dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+        self.assertGreaterEqual(int(samples['http_requests_total{route="leagues",method="GET",status="200"}']), 1002)
+        self.assertIn('http_request_duration_seconds_bucket{route="leagues",method="GET",le="+Inf"}', samples)
+        self.assertIn('db_queries_per_request_count{route="leagues"}', samples)
+        self.assertIn('cache_hit_ratio{cache="api"}', samples)
+        self.assertIn('live_stream_connections 4', text)
+        self.assertIn('live_stream_connections 3', after)
+
+        self.client.logout()
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+
+class ProfilerTests(TestCase):
+    def test_staff_requests_are_profiled_on_demand(self):
+        team = Team.objects.create(name='Team', type=FOOTBALL, logo='teams/t.jpg')
+        self.client.get('/api/teams/%d/?profile' % team.pk)
+        self.assertFalse(RequestProfile.objects.exists())
+
+        staff = User.objects.create_user('staff', password='secret', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.get('/api/teams/%d/?profile' % team.pk)
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile'])
+        self.assertEqual((profile.path, profile.status), ('/api/teams/%d/?profile' % team.pk, 200))
+        self.assertIn('RetrieveModelMixin.retrieve (rest_framework/mixins.py', profile.stacks)
+        self.assertRegex(profile.stacks.splitlines()[0], r'^[^ ].* \d+$')
+        self.assertIn('self ms', profile.summary)
+
+        self.assertNotIn('X-Profile', self.client.get('/api/teams/%d/' % team.pk))
+        for name in ('SportsApp_requestprofile_change', 'profile_flamegraph', 'profile_folded'):
+            self.assertEqual(self.client.get(reverse('admin:' + name, args=[profile.pk])).status_code, 200, name)
+        for name in ('profile_flamegraph', 'profile_folded'):
+            self.assertEqual(self.client.get(reverse('admin:' + name, args=[0])).status_code, 404, name)
+
+
+class SchemaUpgradeTests(TransactionTestCase):
+    def test_sport_columns_and_indexes_are_upgraded(self):
+        old = models.CharField(max_length=10)
+        old.set_attributes_from_name('type')
+        old.model = Team
+        index = Match._meta.indexes[0]
+        with connection.schema_editor() as editor:
+            editor.alter_field(Team, Team._meta.get_field('type'), old)
+            editor.remove_index(Match, index)
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO "SportsApp_team" (name, slug, type, logo) VALUES (%s, %s, %s, %s)',
+                           ['Home', 'home', 'بسکتبال', 'teams/home.jpg'])
+
+        output = StringIO()
+        call_command('upgrade_schema', stdout=output)
+        self.assertIn('SportsApp_team: type converted', output.getvalue())
+        self.assertEqual(Team.objects.get().type, BASKETBALL)
+        with connection.cursor() as cursor:
+            self.assertIn(index.name, connection.introspection.get_constraints(cursor, Match._meta.db_table))
+        self.assertEqual(self.client.get('/api/teams/').json()['results'][0]['type'], 'بسکتبال')
+
+    def test_tables_from_before_the_new_columns_are_upgraded(self):
+        # The tables as `migrate --run-syncdb` created them before slugs,
+        # standings counters and comment counts.
+        with connection.schema_editor() as editor:
+            for model in (Team, LeagueStanding, NewsArticle):
+                editor.execute('DROP TABLE %s' % editor.quote_name(model._meta.db_table))
+            editor.execute('CREATE TABLE "SportsApp_team" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+                           '"name" varchar(50) NOT NULL, "type" varchar(10) NOT NULL, "logo" varchar(100) NOT NULL)')
+            editor.execute('CREATE TABLE "SportsApp_leaguestanding" ("id" integer NOT NULL PRIMARY KEY '
+                           'AUTOINCREMENT, "league_id" integer NOT NULL, "team_id" integer NOT NULL, '
+                           '"score" integer NOT NULL)')
+            editor.execute('CREATE TABLE "SportsApp_newsarticle" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+                           '"title" varchar(100) NOT NULL, "description" varchar(500) NOT NULL, "text" text NOT NULL, '
+                           '"image" varchar(100) NULL, "date" datetime NOT NULL, "type" varchar(10) NOT NULL)')
+            for name in ('Home', 'Home', 'Away'):
+                editor.execute('INSERT INTO "SportsApp_team" (name, type, logo) VALUES (%s, %s, %s)',
+                               [name, 'فوتبال', 'teams/t.jpg'])
+            editor.execute('INSERT INTO "SportsApp_newsarticle" (title, description, text, date, type) '
+                           'VALUES (%s, %s, %s, %s, %s)', ['Title', 'Description', 'Text', '2018-08-01', 'فوتبال'])
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1), logo='leagues/l.jpg')
+        user = User.objects.create_user('reader', password='password')
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO "SportsApp_leaguestanding" (league_id, team_id, score) VALUES (%s, 1, 3)',
+                           [league.pk])
+            for text in ('First', 'Second'):
+                cursor.execute('INSERT INTO "SportsApp_comment" (article_id, user_id, name, text, date) '
+                               'VALUES (1, %s, %s, %s, %s)', [user.pk, 'Reader', text, timezone.now()])
+
+        output = StringIO()
+        call_command('upgrade_schema', stdout=output)
+        self.assertIn('SportsApp_team: added slug', output.getvalue())
+        self.assertEqual(list(Team.objects.order_by('pk').values_list('slug', 'type')),
+                         [('home', FOOTBALL), ('home-2', FOOTBALL), ('away', FOOTBALL)])
+        self.assertEqual(Team.objects.create(name='Home', type=FOOTBALL, logo='teams/t.jpg').slug, 'home-3')
+        self.assertEqual(list(LeagueStanding.objects.values_list('score', 'played', 'goals_for')), [(3, 0, 0)])
+        article = NewsArticle.objects.get()
+        self.assertEqual(article.comment_count, 2)
+        self.assertEqual([comment['text'] for comment in json.loads(article.latest_comments)], ['Second', 'First'])
+        self.assertEqual(self.client.get('/api/matches/home-2/', {'ordering': 'date'}).status_code, 200)
+
+        call_command('upgrade_schema', stdout=StringIO())
+
+    def test_endpoint_queries_use_indexes(self):
+        league = League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1), logo='leagues/l.jpg')
+        create_match(league, 0)
+        results = list(queryplan.check(['matches-list', 'leagues-detail']))
+        self.assertTrue(results)
+        self.assertEqual([problems for name, sql, plan, problems in results if problems], [])
+        self.assertEqual(queryplan.problems('SELECT * FROM "t" WHERE "a" = 1 LIMIT 5',
+                                            ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY']),
+                         ['full scan of t', 'sort without an index'])
+
+
+class WriteQueueTests(TransactionTestCase):
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+
+    def test_admin_writes_go_through_one_writer_thread(self):
+        match = create_match(League.objects.create(name='League', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                                   logo='leagues/l.jpg'), 0)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.get(reverse('admin:add_scoreOne_two', args=[match.pk]))
+        match.refresh_from_db()
+        self.assertEqual(match.score1, 3)
+        self.assertEqual(writer.write_queue.thread.name, 'write-queue')
+
+        failing = writer.write_queue.submit(ingest.add_score, 0, 1)
+        passing = writer.write_queue.submit(ingest.add_score, match.pk, 0, 1)
+        with self.assertRaises(ingest.IngestError):
+            failing.result(5)
+        self.assertEqual(passing.result(5).score2, 1)
+        self.assertEqual(Match.objects.get(pk=match.pk).score2, 1)
+
+
+class ArchiveTests(TransactionTestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        self.addCleanup(archive.forget)
+        self.addCleanup(responsecache.get_cache().clear)
+        self.old = League.objects.create(name='Old', type=FOOTBALL, is_ongoing=False, start_date=date(2017, 8, 1),
+                                         logo='leagues/l.jpg')
+        self.current = League.objects.create(name='Current', type=FOOTBALL, start_date=date(2018, 8, 1),
+                                             logo='leagues/l.jpg')
+        self.archived = [create_match(self.old, index) for index in range(2)]
+        self.hot = create_match(self.current, 2)
+
+    def test_finished_leagues_move_to_the_archive(self):
+        output = StringIO()
+        call_command('archive_season', '--season', '2017', '--dry-run', stdout=output)
+        self.assertEqual(output.getvalue(), 'Old2017: 2 matches\n')
+        self.assertEqual(Match.objects.count(), 3)
+        call_command('archive_season', self.current.pk, self.old.pk, stdout=output)
+        self.assertIn('Current2018: still ongoing, skipped', output.getvalue())
+        self.assertIn('Old2017: archived 1 league, 4 leaguestanding, 4 team, 4 team_leagues', output.getvalue())
+
+        self.assertEqual(list(Match.objects.values_list('pk', flat=True)), [self.hot.pk])
+        self.assertFalse(League.objects.filter(pk=self.old.pk).exists())
+        self.assertEqual(Match.objects.using('archive').count(), 2)
+        self.assertEqual(MatchLineup.objects.using('archive').count(), 16)
+        self.assertEqual(Team.objects.count(), 6)
+
+        self.assertEqual(self.client.get('/api/leagues/%d/' % self.old.pk).json()['name'], 'Old')
+        self.assertEqual([row['id'] for row in self.client.get('/api/leagues/').json()['results']],
+                         [self.current.pk])
+        rows = self.client.get('/api/matches/', {'season': 2017}).json()['results']
+        self.assertEqual({row['id'] for row in rows}, {match.pk for match in self.archived})
+        self.assertEqual(len(rows[0]['player1']), 2)
+        rows = self.client.get('/api/matches/', {'league': self.current.pk}).json()['results']
+        self.assertEqual([row['id'] for row in rows], [self.hot.pk])
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get('/api/export/matches/', {'league': self.old.pk})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+        for params in ({'league': [self.old.pk, self.current.pk]}, {'season': [2017, 2018]}, {}):
+            response = self.client.get('/api/export/matches/', params)
+            self.assertEqual({json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()},
+                             {match.pk for match in self.archived + [self.hot]})
@@ -0,0 +1,85 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_logger():
+    """JSONL writer rotated by size, one file per process so workers never interleave."""
+    directory = getattr(settings, 'TRAFFIC_CAPTURE_DIR', os.path.join(settings.BASE_DIR, 'traffic'))
+    with _loggers_lock:
+        if directory not in _loggers:
+            os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(
+                os.path.join(directory, 'traffic-%d.jsonl' % os.getpid()), encoding='utf-8',
+                maxBytes=getattr(settings, 'TRAFFIC_CAPTURE_MAX_BYTES', 50 * 1024 * 1024),
+                backupCount=getattr(settings, 'TRAFFIC_CAPTURE_BACKUPS', 5))
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger = logging.getLogger('SportsApp.traffic.%d.%d' % (os.getpid(), len(_loggers)))
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+            _loggers[directory] = logger
+        return _loggers[directory]
+
+
+def auth_class(request):
+    # The scheme only: credentials and user ids are never written.
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header:
+        return header.split(' ', 1)[0].lower()
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'session'
+    return 'anonymous'
+
+
+class TrafficCaptureMiddleware(object):
+    """
+    Writes a sample (TRAFFIC_CAPTURE_RATE) of the requests under
+    TRAFFIC_CAPTURE_PREFIX as JSON lines: method, path, query string,
+    route, auth scheme, status, duration and response size. The files are
+    what `manage.py replay_traffic` plays back.
+    """
+
+    def __init__(self, get_response):
+        self.rate = getattr(settings, 'TRAFFIC_CAPTURE_RATE', 0)
+        if not self.rate:
+            raise MiddlewareNotUsed()
+        self.prefix = getattr(settings, 'TRAFFIC_CAPTURE_PREFIX', '/api/')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(self.prefix) or random.random() >= self.rate:
+            return self.get_response(request)
+        started = time.time()
+        response = self.get_response(request)
+        duration = time.time() - started
+        match = getattr(request, 'resolver_match', None)
+        if response.streaming:
+            size = None
+        elif response.has_header('Content-Length'):
+            size = int(response['Content-Length'])
+        else:
+            size = len(response.content)
+        get_logger().info(json.dumps({
+            'time': round(started, 3),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'route': match.view_name if match else None,
+            'auth': auth_class(request),
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'bytes': size,
+        }, ensure_ascii=False))
+        return response
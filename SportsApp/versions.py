@@ -0,0 +1,125 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+from .models import *
+
+# For every versioned model: the collection it belongs to and how to find
+# the object whose representation it is part of. A MatchEvent changes the
+# "match" collection and the match it belongs to.
+DEPENDENCIES = {
+    Match: ('match', lambda instance: instance.pk),
+    MatchEvent: ('match', lambda instance: instance.match_id),
+    MatchStats: ('match', lambda instance: instance.match_id),
+    MatchImages: ('match', lambda instance: instance.match_id),
+    MatchVideos: ('match', lambda instance: instance.match_id),
+    MatchLineup: ('match', lambda instance: instance.match_id),
+    League: ('league', lambda instance: instance.pk),
+    LeagueStanding: ('league', lambda instance: instance.league_id),
+    Team: ('team', lambda instance: instance.pk),
+    CoachingStaff: ('team', lambda instance: instance.team_id),
+    TeamPosition: ('team', lambda instance: instance.team_id),
+    Player: ('player', lambda instance: instance.pk),
+    PlayerSeason: ('player', lambda instance: instance.player_id),
+    PlayerStat: ('player', lambda instance: instance.player_season.player_id),
+    NewsArticle: ('news', lambda instance: instance.pk),
+    Comment: ('news', lambda instance: instance.article_id),
+    Tag: ('tag', lambda instance: instance.pk),
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'VERSION_CACHE', 'default')]
+
+
+def version_key(collection, pk=None):
+    return 'version:%s' % collection if pk is None else 'version:%s:%s' % (collection, pk)
+
+
+def get_versions(keys):
+    """
+    Current version token of every key. Tokens are random rather than
+    incremented, so racing writers on a non-atomic backend still leave a
+    token no client has seen, and an evicted key simply gets a new one.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(collection, *pks):
+    keys = [version_key(collection)] + [version_key(collection, pk) for pk in pks]
+    transaction.on_commit(lambda: get_cache().set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+def instance_key(instance):
+    """Version key of the object `instance` is part of, None if unversioned."""
+    if type(instance) not in DEPENDENCIES:
+        return None
+    collection, parent = DEPENDENCIES[type(instance)]
+    try:
+        pk = parent(instance)
+    except ObjectDoesNotExist:
+        return None
+    return None if pk is None else version_key(collection, pk)
+
+
+def bump_instance(instance):
+    collection, parent = DEPENDENCIES[type(instance)]
+    try:
+        pk = parent(instance)
+    except ObjectDoesNotExist:
+        pk = None
+    bump(collection, *([] if pk is None else [pk]))
+
+
+class ConditionalGetMixin(object):
+    """
+    Strong ETags for list and detail responses built from the version
+    tokens of `etag_collections`. On detail routes the view's own
+    collection (`etag_object`) is replaced by the requested object's token.
+    A matching If-None-Match is answered with 304 before any query or
+    serializer runs.
+    """
+    etag_collections = ()
+    etag_object = None
+
+    def get_etag(self, request):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        keys = [version_key(collection) for collection in self.etag_collections
+                if pk is None or collection != self.etag_object]
+        if pk is not None and self.etag_object:
+            keys.append(version_key(self.etag_object, pk))
+        parts = get_versions(keys) + [request.get_full_path(), request.META.get('HTTP_ACCEPT', '')]
+        return '"%s"' % hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+    def conditional(self, request, view, *args, **kwargs):
+        etag = self.get_etag(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            metrics.cache_requests.inc(cache='etag', result='hit')
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            if if_none_match:
+                metrics.cache_requests.inc(cache='etag', result='miss')
+            response = view(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
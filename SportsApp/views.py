@@ -1,6 +1,17 @@
+import math
+import mimetypes
+import os
+
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
-from django.shortcuts import render
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 from rest_framework import generics
+from rest_framework import permissions
+from rest_framework import serializers
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework import filters
@@ -8,47 +19,105 @@ from rest_framework import viewsets
 from rest_framework.views import APIView
 
 from .serializers import *
-from .filters import NewsFilterBackend, MatchOrderingFilterBackend
-
-
-class NewsArticleListView(viewsets.ModelViewSet):
+from .archive import ArchiveMixin
+from .filters import NewsFilterBackend, NewsSearchFilter, SeasonFilterBackend
+from .queries import FetchPlanMixin
+from .querybudget import add_to_budget, query_budget
+from .responsecache import CachedResponseMixin
+from .versions import ConditionalGetMixin
+from .ingest import IngestError, apply_operation
+from . import autocomplete, comments, export, feed, live, media, metrics
+from .leaderboard import leaderboards
+
+
+class NewsArticleListView(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = NewsArticleSerializer
     queryset = NewsArticle.objects.all()
-    filter_backends = (NewsFilterBackend, filters.SearchFilter,)
-    search_fields = ('title', 'text', 'tags__name', 'type')
+    filter_backends = (NewsFilterBackend, NewsSearchFilter,)
+    etag_collections = ('news', 'tag')
+    etag_object = 'news'
+    query_budget = 10
+
+
+def create_comments(request, article_id=None):
+    """Validate and insert one comment or a batch of them for `request.user`."""
+    items = request.data if isinstance(request.data, list) else [request.data]
+    # Anything but a list of objects, or too many of them, is a 400.
+    items = serializers.ListField(child=serializers.DictField(), max_length=settings.COMMENT_MAX_BATCH) \
+        .run_validation([item.dict() if hasattr(item, 'dict') else item for item in items])
+    for item in items:
+        # Older clients send the article as `id`.
+        item['article'] = article_id if article_id is not None else item.get('article', item.get('id'))
+    serializer = CommentCreateSerializer(data=items, many=True)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    article_ids = {item['article'] for item in serializer.validated_data}
+    # The comment count and latest comments of every further article.
+    add_to_budget(request, 3 * (len(article_ids) - 1))
+    if NewsArticle.objects.filter(pk__in=article_ids).count() != len(article_ids):
+        return Response({'detail': 'Article not found.'}, status=status.HTTP_404_NOT_FOUND)
+    comments.add_comments(request.user, serializer.validated_data)
+    return Response(status=status.HTTP_201_CREATED)
 
 
 class CommentView(viewsets.ModelViewSet):
     serializer_class = CommentSerializer
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('user')
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    query_budget = {'GET': 4, 'POST': 9}
 
     def create(self, request, *args, **kwargs):
-        user = request.user
-        article = NewsArticle.objects.get(id=request.data['id'])
-        Comment.objects.create(user=user, article=article, name=request.data['name'], text=request.data['text'])
-        return Response(status=status.HTTP_201_CREATED)
+        return create_comments(request)
+
+
+class ArticleCommentsView(generics.ListCreateAPIView):
+    serializer_class = CommentSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    query_budget = {'GET': 4, 'POST': 9}
+
+    def get_queryset(self):
+        return Comment.objects.filter(article_id=self.kwargs['article_id']).select_related('user')
+
+    def create(self, request, *args, **kwargs):
+        return create_comments(request, self.kwargs['article_id'])
 
 
-class PlayerListView(viewsets.ModelViewSet):
+class PlayerListView(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = PlayerSerializer
     queryset = Player.objects.all()
+    etag_collections = ('player', 'team')
+    etag_object = 'player'
+    query_budget = 6
 
 
-class TeamListView(viewsets.ModelViewSet):
+class TeamListView(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = TeamSerializer
     queryset = Team.objects.all()
+    etag_collections = ('team', 'player', 'league')
+    etag_object = 'team'
+    query_budget = 6
 
 
-class MatchListView(viewsets.ModelViewSet):
+class MatchListView(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, ArchiveMixin, viewsets.ModelViewSet):
     serializer_class = MatchSerializer
     queryset = Match.objects.all()
-    filter_backends = (filters.SearchFilter,)
+    etag_collections = ('match', 'team', 'player', 'league')
+    etag_object = 'match'
+    filter_backends = (filters.SearchFilter, SeasonFilterBackend)
     search_fields = ('team1__name', 'team2__name', 'league__name')
+    season_lookups = {'league': 'league_id', 'season': 'league__start_date__year'}
+    query_budget = 9
 
 
-class LeagueListView(viewsets.ModelViewSet):
+class LeagueListView(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, ArchiveMixin, viewsets.ModelViewSet):
     serializer_class = LeagueSerializer
     queryset = League.objects.all()
+    etag_collections = ('league', 'team')
+    etag_object = 'league'
+    filter_backends = (SeasonFilterBackend,)
+    season_lookups = {'season': 'start_date__year'}
+    archive_league_kwarg = 'pk'
+    query_budget = 4
 
 
 class UserCreate(viewsets.ViewSet):
@@ -66,8 +135,9 @@ class LoginView(viewsets.ModelViewSet):
     serializer_class = LoginSerializer
 
 
-class UserTeamView(viewsets.ModelViewSet):
+class UserTeamView(FetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = UserTeamSerializer
+    query_budget = 4
 
     def get_queryset(self):
         user = self.request.user
@@ -81,8 +151,9 @@ class UserTeamView(viewsets.ModelViewSet):
         return Response(status=status.HTTP_201_CREATED)
 
 
-class UserPlayerView(viewsets.ModelViewSet):
+class UserPlayerView(FetchPlanMixin, viewsets.ModelViewSet):
     serializer_class = UserPlayerSerializer
+    query_budget = 4
 
     def get_queryset(self):
         user = self.request.user
@@ -96,13 +167,16 @@ class UserPlayerView(viewsets.ModelViewSet):
         return Response(status=status.HTTP_201_CREATED)
 
 
-class TeamMatchList(generics.ListAPIView):
+class TeamMatchList(ConditionalGetMixin, CachedResponseMixin, FetchPlanMixin, generics.ListAPIView):
     serializer_class = MatchSerializer
-    filter_backends = (MatchOrderingFilterBackend,)
+    etag_collections = ('match', 'team', 'player', 'league')
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('date',)
+    query_budget = 9
 
     def get_queryset(self):
-        name = self.kwargs['name']
-        return Match.objects.filter(Q(team1__name=name) | Q(team2__name=name))
+        team_id = Team.resolve(self.kwargs['name'])
+        return Match.objects.filter(Q(team1_id=team_id) | Q(team2_id=team_id))
 
 
 class CurrentUserView(APIView):
@@ -110,3 +184,194 @@ class CurrentUserView(APIView):
     def get(self, request):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
+
+
+class FeedView(FetchPlanMixin, generics.ListAPIView):
+    serializer_class = FeedItemSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    query_budget = 6
+
+    def get_queryset(self):
+        return feed.user_feed(self.request.user)
+
+
+class LeaderboardView(APIView):
+    # Loading a season table is one query, plus one for ?team=.
+    query_budget = 4
+
+    def get(self, request):
+        season = request.GET.get('season')
+        stat = request.GET.get('stat')
+        if not season or not stat:
+            return Response({'detail': 'season and stat are required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 10)), 100))
+        except ValueError:
+            limit = 10
+
+        player_ids = None
+        if request.GET.get('team'):
+            team_id = Team.resolve(request.GET['team'])
+            player_ids = list(TeamPosition.objects.filter(team_id=team_id).values_list('player_id', flat=True))
+
+        rows = leaderboards.top(season, stat, limit, player_ids)
+        if rows is None:
+            return Response({'detail': 'Unknown season.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response([
+            {'rank': rank, 'player': {'id': player_id, 'name': name}, 'value': value}
+            for rank, (player_id, name, value) in enumerate(rows, 1)
+        ])
+
+
+class AutocompleteView(APIView):
+    # A (re)load of the index reads teams, players and leagues.
+    query_budget = 4
+
+    def get(self, request):
+        try:
+            limit = min(int(request.GET.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+        kinds = [kind for kind in request.GET.get('type', '').split(',') if kind in autocomplete.SOURCES]
+        return Response(autocomplete.index.lookup(request.GET.get('q', ''), kinds, limit))
+
+
+class IngestView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+    # Plus 12 per operation, a score recomputes the standings of the match.
+    query_budget = {'POST': 10}
+
+    def post(self, request):
+        serializer = IngestBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        feed = serializer.validated_data['feed']
+        operations = sorted(serializer.validated_data['operations'], key=lambda operation: operation['seq'])
+        add_to_budget(request, 12 * len(operations))
+        applied = skipped = 0
+        try:
+            with transaction.atomic():
+                sequence, _ = IngestSequence.objects.select_for_update().get_or_create(user=request.user, feed=feed)
+                last_seq = sequence.last_seq
+                for operation in operations:
+                    # Operations at or below the feed's high-water mark were
+                    # applied by an earlier delivery of the same batch.
+                    if operation['seq'] <= last_seq:
+                        skipped += 1
+                        continue
+                    apply_operation(operation)
+                    last_seq = operation['seq']
+                    applied += 1
+                if applied:
+                    IngestSequence.objects.filter(pk=sequence.pk).update(last_seq=last_seq)
+        except IngestError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'applied': applied, 'skipped': skipped, 'last_seq': last_seq})
+
+
+class ExportView(APIView):
+    """
+    NDJSON dump of matches with lineups, events and stats, one match per
+    line, filtered by ?league=<id>&season=<year> (both repeatable).
+    Compressed with gzip when the client accepts it.
+    """
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        try:
+            leagues = [int(value) for value in request.query_params.getlist('league')]
+            seasons = [int(value) for value in request.query_params.getlist('season')]
+        except ValueError:
+            return Response({'detail': 'league and season must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        chunks = export.export_matches(export.season_matches(leagues, seasons),
+                                       getattr(settings, 'EXPORT_CHUNK_SIZE', 500))
+        gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(export.gzip_stream(chunks) if gzipped else chunks,
+                                         content_type='application/x-ndjson; charset=utf-8')
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response['Content-Disposition'] = 'attachment; filename="matches.ndjson"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@query_budget(3)
+def match_live(request, match_id):
+    get_object_or_404(Match, pk=match_id)
+    try:
+        since = int(request.GET.get('since') or request.META.get('HTTP_LAST_EVENT_ID') or 0)
+        timeout = float(request.GET.get('timeout', 25))
+        if not math.isfinite(timeout):
+            raise ValueError(timeout)
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid since or timeout.'}, status=400)
+
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        response = StreamingHttpResponse(live.event_stream(match_id, since), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    # Long-poll fallback: block until there is something newer than `since`.
+    timeout = min(max(timeout, 0), getattr(settings, 'LIVE_POLL_MAX_SECONDS', 30))
+    deltas = live.get_broker().wait(match_id, since, timeout)
+    return JsonResponse({
+        'version': deltas[-1]['version'] if deltas else since,
+        'deltas': deltas,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def serve_media(request, path):
+    """
+    Media files with validators, long-lived caching for content-hashed names
+    and single byte ranges. With MEDIA_SENDFILE set the front server sends
+    the file, otherwise the WSGI server streams it.
+    """
+    full_path = media.resolve(path)
+    if full_path is None:
+        raise Http404('Media file not found.')
+    stat = os.stat(full_path)
+    etag = media.file_etag(stat)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        name = os.path.relpath(full_path, os.path.realpath(settings.MEDIA_ROOT)).replace(os.sep, '/')
+        offload = media.sendfile_headers(full_path, name)
+        if offload is not None:
+            # The front server answers ranges itself.
+            response = HttpResponse(content_type=content_type)
+            for header, value in offload.items():
+                response[header] = value
+        else:
+            byte_range = None
+            if_range = request.META.get('HTTP_IF_RANGE')
+            if not if_range or if_range == etag or parse_http_date_safe(if_range) == int(stat.st_mtime):
+                byte_range = media.parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % stat.st_size
+                return response
+            start, end = byte_range or (0, stat.st_size - 1)
+            response = FileResponse(media.RangeFile(open(full_path, 'rb'), start, end - start + 1),
+                                    content_type=content_type)
+            response['Content-Length'] = end - start + 1
+            if byte_range:
+                response.status_code = 206
+                response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, stat.st_size)
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = media.cache_control(path)
+    return response
+
+
+def metrics_view(request):
+    """Prometheus text format, for METRICS_ALLOWED_IPS and staff users."""
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ()) and \
+            not request.user.is_staff:
+        raise Http404()
+    metrics.registry.flush(force=True)
+    return HttpResponse(metrics.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
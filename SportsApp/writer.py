@@ -0,0 +1,75 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+
+class WriteQueue(object):
+    """
+    Runs writes one at a time on a single thread of this process, so
+    operators clicking in the admin never compete for SQLite's write lock.
+    The writes waiting in the queue are committed together, one transaction
+    and one WAL sync per batch, each inside its own savepoint so a failing
+    write is rolled back alone.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        future = Future()
+        self.queue.put((future, function, args, kwargs))
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.work, name='write-queue', daemon=True)
+                self.thread.start()
+        return future
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        while len(batch) < getattr(settings, 'WRITE_QUEUE_BATCH', 50):
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return [job for job in batch if job[0].set_running_or_notify_cancel()]
+
+    def work(self):
+        while True:
+            batch = self.next_batch()
+            close_old_connections()
+            results = []
+            try:
+                with transaction.atomic():
+                    for future, function, args, kwargs in batch:
+                        try:
+                            with transaction.atomic():
+                                results.append((future, function(*args, **kwargs), None))
+                        except Exception as error:
+                            results.append((future, None, error))
+            except Exception as error:
+                # The commit failed, nothing of the batch was written.
+                results = [(future, None, error) for future, function, args, kwargs in batch]
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+
+write_queue = WriteQueue()
+
+
+def run(function, *args, **kwargs):
+    """
+    Run a write through the queue and return its result. Inside a
+    transaction the write joins it instead, the writer thread could
+    neither see its rows nor get the lock it holds.
+    """
+    if not getattr(settings, 'WRITE_QUEUE', True) or connection.in_atomic_block:
+        return function(*args, **kwargs)
+    return write_queue.submit(function, *args, **kwargs).result(getattr(settings, 'WRITE_QUEUE_TIMEOUT', 30))
@@ -67,11 +67,15 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'SportsApp.metrics.MetricsMiddleware',
+    'SportsApp.traffic.TrafficCaptureMiddleware',
+    'SportsApp.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'SportsApp.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -106,22 +110,141 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
+    'DEFAULT_PAGINATION_CLASS': 'SportsApp.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 20,
 }
 
+# Upper bound for the `page_size` query parameter of the list endpoints.
+MAX_PAGE_SIZE = 100
+
 REST_USE_JWT = True
 
+# Pub/sub used by the live match channel (/api/matches/<id>/live/). The
+# in-process broker only reaches clients of the worker that saved the change.
+LIVE_BROKER = 'SportsApp.live.InProcessBroker'
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_STREAM_MAX_SECONDS = 300
+LIVE_POLL_MAX_SECONDS = 30
+
+# Number of newest comments embedded in every news article.
+LATEST_COMMENTS = 3
+
+# Largest batch of comments accepted in one POST.
+COMMENT_MAX_BATCH = 100
+
+# Teams and players with more followers than this get one shared feed row
+# that is merged in on read instead of a row per follower.
+FEED_FANOUT_LIMIT = 1000
+
+# Full reload interval of the in-memory name index behind /api/autocomplete/,
+# picks up teams, players and leagues saved by other worker processes.
+AUTOCOMPLETE_REFRESH_SECONDS = 300
+
+# Full reload interval of the in-memory season leaderboards (/api/leaderboard/).
+LEADERBOARD_REFRESH_SECONDS = 300
+
+# Bounding boxes of the derivatives made of every uploaded image, each in
+# the original format and as WebP, and the size of the worker pool making
+# them (0 makes them inline when the upload commits).
+IMAGE_DERIVATIVES = {
+    'thumbnail': (150, 150),
+    'medium': (600, 600),
+}
+IMAGE_WORKERS = 2
+
+# Largest batch accepted by the live data ingest endpoint (/api/ingest/).
+INGEST_MAX_OPERATIONS = 500
+
+# Per request query count, SQL, view and render time as a Server-Timing
+# header, and optionally in the SportsApp.querybudget log. Views declare
+# `query_budget`; going over it logs a warning, or raises with 'raise'.
+SERVER_TIMING = True
+QUERY_TIMING_LOG = False
+QUERY_BUDGET_ACTION = 'warn'
+
+# Metrics served at /metrics. Every worker process dumps its own values to
+# METRICS_DIR at most every METRICS_FLUSH_SECONDS and /metrics adds them up.
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_SECONDS = 5
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Writes of the live match admin actions go through one writer thread per
+# process, up to WRITE_QUEUE_BATCH of them per transaction.
+WRITE_QUEUE = True
+WRITE_QUEUE_BATCH = 50
+WRITE_QUEUE_TIMEOUT = 30
+
+# Staff requests with ?profile in their query string are profiled and kept
+# in the admin (Request profiles), the newest PROFILE_KEEP of them.
+PROFILE_PARAM = 'profile'
+PROFILE_KEEP = 200
+
+# Share of /api/ requests written to TRAFFIC_CAPTURE_DIR as JSON lines for
+# `manage.py replay_traffic` (0 disables the middleware). Files are
+# per process and rotated at TRAFFIC_CAPTURE_MAX_BYTES.
+TRAFFIC_CAPTURE_RATE = 0
+TRAFFIC_CAPTURE_PREFIX = '/api/'
+TRAFFIC_CAPTURE_DIR = os.path.join(BASE_DIR, 'traffic')
+TRAFFIC_CAPTURE_MAX_BYTES = 50 * 1024 * 1024
+TRAFFIC_CAPTURE_BACKUPS = 5
+
+# Matches loaded per query batch by the streaming export (/api/export/matches/).
+EXPORT_CHUNK_SIZE = 500
+
 WSGI_APPLICATION = 'WebProject.wsgi.application'
 
+# Caches
+# Version tokens behind the API ETags live in VERSION_CACHE. With several
+# worker processes it has to be a shared backend (memcached, redis, ...).
+# Rendered API responses live in API_CACHE; locmem evicts the least
+# recently used entries once MAX_ENTRIES is reached.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+VERSION_CACHE = 'default'
+API_CACHE = 'api'
+API_CACHE_TIMEOUT = 300
+API_CACHE_LOCK_WAIT = 5
+
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
 
+# SQLite with WAL, tuned pragmas and BEGIN IMMEDIATE transactions, see
+# SportsApp/backends/sqlite3. Connections are kept for CONN_MAX_AGE seconds
+# instead of being opened on every request.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'SportsApp.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'timeout': 5},
+    },
+    # Finished leagues moved out of 'default' by `manage.py archive_season`.
+    # Create its tables with `migrate --run-syncdb --database archive`.
+    'archive': {
+        'ENGINE': 'SportsApp.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-archive.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'timeout': 5},
+    },
 }
 
+# Requests for an archived league or season read from ARCHIVE_DATABASE,
+# see SportsApp/archive.py.
+DATABASE_ROUTERS = ['SportsApp.archive.ArchiveRouter']
+ARCHIVE_DATABASE = 'archive'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.0/ref/settings/#auth-password-validators
 
@@ -159,4 +282,16 @@ USE_TZ = True
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 
+# Uploads get a content hash in their name and are served with
+# "Cache-Control: immutable"; files without one are cached this long.
+DEFAULT_FILE_STORAGE = 'SportsApp.media.HashedFileSystemStorage'
+MEDIA_CACHE_SECONDS = 3600
+
+# Let the front server send media files: None (served by Django through
+# wsgi.file_wrapper), 'X-Sendfile' (Apache, lighttpd) or 'X-Accel-Redirect'
+# (nginx, with an internal location at MEDIA_ACCEL_REDIRECT_PREFIX aliased
+# to MEDIA_ROOT).
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
 CORS_ORIGIN_ALLOW_ALL = True
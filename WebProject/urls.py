@@ -13,8 +13,9 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf.urls import url
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, re_path
 from django.urls import path
@@ -39,8 +40,16 @@ router.register(r'comments', views.CommentView, 'comments')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    url('^api/matches/(?P<name>.+)/$', views.TeamMatchList.as_view()),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('api/matches/<int:match_id>/live/', views.match_live, name='match_live'),
+    url('^api/matches/(?P<name>.+)/$', views.TeamMatchList.as_view(), name='team_matches'),
     url('^api/users/current', views.CurrentUserView.as_view()),
+    path('api/ingest/', views.IngestView.as_view(), name='ingest'),
+    path('api/export/matches/', views.ExportView.as_view(), name='export_matches'),
+    path('api/news/<int:article_id>/comments/', views.ArticleCommentsView.as_view(), name='article_comments'),
+    path('api/feed/', views.FeedView.as_view(), name='feed'),
+    path('api/leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
+    path('api/autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
     path('api/', include(router.urls)),
     path('rest-auth/', include('rest_auth.urls')),
     path('rest-auth/login/', LoginView.as_view(), name='account_login'),
@@ -54,5 +63,6 @@ urlpatterns = [
             name='account_email_verification_sent'),
     re_path(r'^rest-auth/registration/account-confirm-email/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$', VerifyEmailView.as_view(),
             name='account_confirm_email'),
-    path('token-auth/', obtain_jwt_token)
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path('token-auth/', obtain_jwt_token),
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views.serve_media, name='media'),
+]